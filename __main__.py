@@ -5,25 +5,38 @@
 import sys
 import os.path as osp, os
 import argparse
-import lark
-import dill
-from icecream import ic
+import subprocess
 
-from core.transformer import ASTBuilder
 from core import utils
+from core.cache import ProgramCache, DEFAULT_CACHE_DIR
+from core.diagnostics import ResolutionError
+from core.modules import ModuleLoader
+from core.program import ENGINES, DEFAULT_ENGINE
+from core.visitors.passes import OPT_LEVELS, DEFAULT_OPT_LEVEL
 
 
 LANG_EXT = 'lang'
-PARSER_TYPE = 'earley'  # "lalr" or "earley"
-GRAMMAR_F_PATH = osp.join(osp.dirname(osp.realpath(__file__)), 'grammar', 'grammar.lark')
+PARSER_TYPE = 'lalr'  # "lalr" or "earley"
 
 
 def get_cmd_line_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('src_f', help='source language input file; use *.pickle to use cached version')
+    parser.add_argument('src_f', help='source language input file')
     parser.add_argument('--unparse', '-u', action='store_const', const=True, help='print unparsed code')
     parser.add_argument('--gen_ast', '-g', action='store_const', const=True, help='generate .dot and .png for AST')
-    parser.add_argument('--cache', '-c', action='store_const', const=True, help='saves state table and AST')
+    parser.add_argument('--no_cache', '-n', action='store_const', const=True, help='always parse and resolve, skipping the program cache')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help='where resolved programs are cached')
+    parser.add_argument('--parser', '-p', choices=('lalr', 'earley'), default=PARSER_TYPE, help='parsing algorithm')
+    parser.add_argument('--watch', '-w', action='store_const', const=True, help='rerun on every save, only reparsing the definitions that changed')
+    parser.add_argument('--import_profile', '--import-profile', action='store_const', const=True, help='run, then report the import cost per package on stderr')
+    parser.add_argument('--release', '-r', action='store_const', const=True, help='build the AST without debug metadata, nodes only keep where they start')
+    parser.add_argument('--strict', '-s', action='store_const', const=True, help='resolve every function before running, instead of on its first call')
+    parser.add_argument('--jobs', '-j', type=int, help='processes parsing imported modules, defaults to the number of cpus')
+    parser.add_argument('-O', dest='opt_level', type=int, choices=sorted(OPT_LEVELS), default=DEFAULT_OPT_LEVEL, help=f'optimization level, -O0 runs the program as resolved (default {DEFAULT_OPT_LEVEL})')
+    parser.add_argument('--opt_stats', action='store_const', const=True, help='report on stderr what the optimization passes did and how long they took, skips the program cache')
+    parser.add_argument('--verify_passes', action='store_const', const=True, help='check the tree after every optimization pass, skips the program cache')
+    parser.add_argument('--engine', '-e', choices=ENGINES, default=DEFAULT_ENGINE, help=f'how the program is run, "vm" and "closures" compile it to bytecode or closures first (default {DEFAULT_ENGINE})')
+    parser.add_argument('--no_standalone', action='store_const', const=True, help='build the lalr parser with lark even if grammar/lalr_standalone.py is up to date')
     return parser.parse_args()
 
 def unparse_ast(ast):
@@ -32,6 +45,8 @@ def unparse_ast(ast):
 def graph_ast(parse_tree, src_f):
     png_path = src_f.replace('.lang', '.png')
     if not osp.isfile(png_path) or osp.getmtime(src_f) > osp.getmtime(png_path):
+        import lark
+        from icecream import ic
         ic(png_path)
         input(parse_tree)
         lark.tree.pydot__tree_to_png(parse_tree, png_path, rankdir='TB')
@@ -42,64 +57,83 @@ def graph_ast(parse_tree, src_f):
     # utils.write_to_file(out_dot_path, ast.to_dot())
     # utils.run_in_shell(f'dot -Tpng {out_dot_path} -o {out_png_path}')
 
-def cache_ast(ast, src):
-    out_pickle_file = src.replace(f'.{LANG_EXT}', '.pickle')
-    with open(out_pickle_file, 'wb') as f:
-        dill.dump(ast, f)
-
-def sub_pass(raw_src):
-    # probably isn't super necessary
-    src = ''
-    for line in raw_src.split('\n'):
-        try:
-            filtered = line[:line.index('#')]
-        except:
-            filtered = line
-        src += filtered.replace(';', '\n')
-    return src
+def report_optimizations(prog):
+    # the optimized tree is all that's left, so its size before is what the passes removed on top
+    from core.nodes.node import count_nodes
+    num_nodes = count_nodes(prog.ast)
+    num_removed = sum(stats.num_removed for _, stats, _ in prog.pass_stats)
+    print(f'optimizations: {num_nodes + num_removed} -> {num_nodes} nodes', file = sys.stderr)
+    for name, stats, seconds in prog.pass_stats:
+        print(f'  {name}: {stats} ({1000 * seconds:.1f} ms)', file = sys.stderr)
+
+def import_profile(argv, top = 15):
+    # imports happen before main() runs, so rerun under -X importtime and summarize its report
+    argv = [arg for arg in argv if arg not in ('--import_profile', '--import-profile')]
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *argv], stderr = subprocess.PIPE, text = True)
+
+    self_us, cumulative_us = {}, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            print(line, file = sys.stderr)
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[0].strip().isdigit():
+            continue  # header
+        module = fields[2].strip()
+        package = module.split('.')[0]
+        self_us[package] = self_us.get(package, 0) + int(fields[0])
+        # the package's outermost import covers everything it pulled in
+        cumulative_us[package] = max(cumulative_us.get(package, 0), int(fields[1]))
+
+    print('\nIMPORT PROFILE (ms)', file = sys.stderr)
+    print('===================', file = sys.stderr)
+    print(f'{"package":<24}{"self":>10}{"cumulative":>12}', file = sys.stderr)
+    for package, us in sorted(self_us.items(), key = lambda item: -item[1])[:top]:
+        print(f'{package:<24}{us / 1000:>10.1f}{cumulative_us.get(package, 0) / 1000:>12.1f}', file = sys.stderr)
+    print(f'{"total":<24}{sum(self_us.values()) / 1000:>10.1f}', file = sys.stderr)
+    return proc.returncode
+
 
 def main():
     args = get_cmd_line_args()
-
-    # run cached version
-    if args.src_f.endswith('.pickle'):
-        with open(args.src_f, 'rb') as f:
-            sys.exit(dill.load(f).interpret())
+    if args.import_profile:
+        sys.exit(import_profile(sys.argv))
+    try:
+        run(args)
+    except ResolutionError as err:
+        print(err, file = sys.stderr)
+        sys.exit(1)
+
+
+def run(args):
+    # the parse tree is only needed for graphing, everything else can come from the cache
+    cache = None if args.no_cache or args.gen_ast or args.opt_stats or args.verify_passes else ProgramCache(args.cache_dir, release = bool(args.release), strict = bool(args.strict), opt_level = args.opt_level, parser_type = args.parser)
+    loader = ModuleLoader(args.parser, bool(args.release), not args.no_standalone, cache, args.jobs, bool(args.strict), args.opt_level, bool(args.verify_passes))
+
+    if args.watch:
+        from core.parser import make_parser
+        from core.watch import watch
+        watch(args.src_f, make_parser(args.parser, standalone = not args.no_standalone), unparse = args.unparse, loader = loader, engine = args.engine)
+        return
 
     raw_src = utils.read_file(args.src_f)
-    src = sub_pass(raw_src)
-
-    if PARSER_TYPE == 'earley':
-        parser = lark.Lark.open(
-            GRAMMAR_F_PATH,
-            start = 'root',
-            parser = PARSER_TYPE,
-            propagate_positions = True,
-            maybe_placeholders = True,
-        )
-        transformer = ASTBuilder()
-        parse_tree = parser.parse(src)
+    prog = cache.load(args.src_f, raw_src) if cache else None
+
+    if prog is None:
+        from core.parser import make_parser, build_ast, parse
+
+        parser = make_parser(args.parser, standalone = not args.no_standalone, release = args.release)
+        parse_tree = parse(parser, raw_src)
         if args.gen_ast: graph_ast(parse_tree, args.src_f)
-        prog = transformer.transform(parse_tree)
-
-    else:
-        parser = lark.Lark.open(
-            GRAMMAR_F_PATH,
-            start = 'root',
-            parser = PARSER_TYPE,
-            cache = osp.join('grammar', 'cached'),
-            transformer = ASTBuilder(),
-            propagate_positions = True,
-            keep_all_tokens = True,
-            maybe_placeholders = True,
-        )
-
-        prog = parser.parse(src)
+        prog = build_ast(parse_tree, release = args.release, strict = args.strict, opt_level = args.opt_level, verify = args.verify_passes)
+        if args.opt_stats: report_optimizations(prog)
+        if cache: cache.store(args.src_f, raw_src, prog)
+
+    prog.link(loader.load(prog, args.src_f))
 
     if args.unparse: unparse_ast(prog)
-    if args.cache: cache_ast(prog, args.src_f)
 
-    sys.exit(prog.interpret())
+    sys.exit(prog.interpret(args.engine))
 
 
 if __name__ == '__main__':
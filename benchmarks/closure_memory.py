@@ -0,0 +1,89 @@
+"""
+Measures the memory programs creating many closures hold on to. Every closure is made by a
+function with a large local it doesn't reference, and all of them are kept alive, so the peak
+shows what each closure retains. Flat closures only keep the variable they capture, so their
+cost shouldn't depend on the size of the locals around them.
+
+Parsing and building the Program aren't measured, only interpreting it.
+
+usage: python benchmarks/closure_memory.py [--closures 2000] [--sizes 0 100 1000]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program
+from core.transformer import ASTBuilder
+
+
+MANY_CLOSURES = '''
+([] -> num) make(num n) {{
+    let scratch = range({size})
+    let unused = n * 2
+    return () -> num {{
+        return n
+    }}
+}}
+
+num main() {{
+    let kept = range({closures})
+    for i : {closures} {{
+        kept[i] = make(i)
+    }}
+    let total = 0
+    for j : {closures} {{
+        total = total + kept[j]()
+    }}
+    print(total)
+    return 0
+}}
+'''
+
+
+def build(parse_tree):
+    # transforms the globals without the root rule, which would build the Program right away
+    builder = ASTBuilder()
+    root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+    return Program(root)
+
+
+def measure(parse_tree):
+    program = build(parse_tree)
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        program.interpret()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, seconds
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--closures', type=int, default=2000, help='closures kept alive at once')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 100, 1000], help='elements in the local each closure could pin')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print(f'{"local size":<12}{"peak":>12}{"per closure":>14}{"time":>10}')
+    for size in args.sizes:
+        peak, seconds = measure(parse(parser, MANY_CLOSURES.format(size = size, closures = args.closures)))
+        print(f'{size:<12}{peak / 2 ** 20:>10.1f}MB{peak / args.closures:>12.0f} B{1000 * seconds:>8.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
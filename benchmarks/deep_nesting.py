@@ -0,0 +1,97 @@
+"""
+Times the frontend passes on pathologically nested programs.
+
+Each shape is generated at increasing depths and run through parsing, transformation plus
+resolution, resolution alone and unparsing, with the default recursion limit. A pass that fails
+reports the exception instead of a time. Programs are built strict and unoptimized, so function
+bodies are resolved up front and keep their nesting for the later passes to walk.
+
+usage: python benchmarks/deep_nesting.py [--depths 100 1000 10000 50000] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse, build_ast
+from core.visitors import SemanticAnalyzer, Interpreter
+
+
+def nested_parens(depth: int) -> str:
+    return f'num main() {{\n    let x = {"(1 + " * depth}1{")" * depth}\n    return 0\n}}\n'
+
+
+def nested_blocks(depth: int) -> str:
+    return f'num main() {{\n{"if true { " * depth}print(1){" }" * depth}\n    return 0\n}}\n'
+
+
+def else_if_chain(depth: int) -> str:
+    chain = ' else '.join(f'if x == {i} {{ print({i}) }}' for i in range(depth))
+    return f'num main() {{\n    let x = 1\n    {chain}\n    return 0\n}}\n'
+
+
+def nested_unary(depth: int) -> str:
+    return f'num main() {{\n    let x = {"-" * depth}1\n    return 0\n}}\n'
+
+
+SHAPES = {
+    'parens': nested_parens,
+    'blocks': nested_blocks,
+    'else_if': else_if_chain,
+    'unary': nested_unary,
+}
+
+
+def time_it(fn, repeat):
+    best, res = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depths', type=int, nargs='+', default=[100, 1000, 10000, 50000], help='nesting depths to generate')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print(f'FRONTEND PASSES (ms, recursion limit {sys.getrecursionlimit()})')
+    print('========================================')
+    print(f'{"shape":<10}{"depth":>8}{"parse":>14}{"build":>14}{"resolve":>14}{"unparse":>14}')
+    for shape, make_src in SHAPES.items():
+        for depth in args.depths:
+            src = make_src(depth)
+            passes = [
+                lambda: parse(parser, src),
+                lambda: build_ast(results[0], strict = True, opt_level = 0),
+                lambda: SemanticAnalyzer(Interpreter()).resolve(results[1].ast),
+                lambda: results[1].unparsed(),
+            ]
+            results, cols = [], []
+            for run_pass in passes:
+                if len(results) < len(cols):
+                    cols.append('-')  # a pass it depends on failed
+                    continue
+                try:
+                    elapsed, res = time_it(run_pass, args.repeat)
+                except RecursionError as err:
+                    cols.append(type(err).__name__)
+                    continue
+                cols.append(f'{1000 * elapsed:.1f}')
+                results.append(res)
+            print(f'{shape:<10}{depth:>8}' + ''.join(f'{col:>14}' for col in cols))
+
+
+if __name__ == '__main__':
+    main()
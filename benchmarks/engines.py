@@ -0,0 +1,68 @@
+"""
+Times programs run by each engine: the Interpreter walking the AST, and the others, with their
+speedup over it. Functions are compiled on their first call, so that's part of the time of the
+engines compiling them.
+
+Parsing and building the Program aren't timed, only interpreting it.
+
+usage: python benchmarks/engines.py [programs ...] [--repeat 5]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core import utils
+from core.parser import make_parser, parse
+from core.program import Program, ENGINES
+from core.transformer import ASTBuilder
+
+
+PROGRAMS = [osp.join(ROOT_PATH, 'tests', 'fib.lang'), osp.join(ROOT_PATH, 'tests', 'triple_loop.lang')]
+
+
+def build(parse_tree):
+    # transforms the globals without the root rule, which would build the Program right away
+    builder = ASTBuilder()
+    root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+    return Program(root)
+
+
+def time_program(parse_tree, engine, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        program = build(parse_tree)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            program.interpret(engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('programs', nargs='*', default=PROGRAMS, help='source files to run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print(f'{"program":<20}' + ''.join(f'{engine:>12}' for engine in ENGINES) + ''.join(f'{engine + " speedup":>18}' for engine in ENGINES[1:]))
+    for src_f in args.programs:
+        parse_tree = parse(parser, utils.read_file(src_f))
+        times = [time_program(parse_tree, engine, args.repeat) for engine in ENGINES]
+        print(f'{osp.basename(src_f):<20}' + ''.join(f'{1000 * seconds:>10.1f}ms' for seconds in times)
+              + ''.join(f'{times[0] / seconds:>17.2f}x' for seconds in times[1:]))
+
+
+if __name__ == '__main__':
+    main()
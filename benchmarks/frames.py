@@ -0,0 +1,143 @@
+"""
+Measures what calls and variables cost each engine: the memory a call's frame holds on to, and
+the time of a program making many calls and of one reading and assigning locals in a loop.
+
+Frames are measured by recursing through a function with a given number of locals, the deepest
+call reads how much memory is allocated while every frame is alive. Recursing twice as deep,
+that grows by what that many more calls hold, what compiling the program costs stays the same.
+The programs aren't optimized, so what's measured is the calls and lookups as written rather
+than what the passes left of them.
+
+usage: python benchmarks/frames.py [--depth 200] [--locals 8] [--iterations 20000] [--repeat 5]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program, ENGINES
+from core.runtime.builtins import BuiltinCallable
+from core.transformer import ASTBuilder
+
+
+DEEP = '''
+num deep(num n) {{
+{lets}
+    if n <= 0 {{ return traced() }}
+    return deep(n - 1)
+}}
+
+num main() {{
+    print(deep({depth}))
+    return 0
+}}
+'''
+
+CALLS = '''
+num add(num a, num b) {{
+    let c = a + b
+    return c
+}}
+
+num main() {{
+    let total = 0
+    for i : {iterations} {{
+        total = add(total, i)
+    }}
+    print(total)
+    return 0
+}}
+'''
+
+LOOKUPS = '''
+num main() {{
+    let a = 1
+    let b = 2
+    let total = 0
+    for i : {iterations} {{
+        total = total + a * b - i
+        a = b
+        b = i
+    }}
+    print(total)
+    return 0
+}}
+'''
+
+
+class Traced(BuiltinCallable):
+    """traced(), the bytes allocated while tracemalloc traces, registered as a builtin like the others."""
+
+    def __init__(self) -> None:
+        super().__init__('traced', float, ())
+
+    def __call__(self, interp):
+        return float(tracemalloc.get_traced_memory()[0])
+
+
+def build(parse_tree):
+    # transforms the globals without the root rule, which would build the Program right away
+    builder = ASTBuilder()
+    root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+    return Program(root, opt_level = 0)
+
+
+def deepest_memory(parse_tree, engine):
+    program = build(parse_tree)
+    out = io.StringIO()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(out):
+        program.interpret(engine)
+    tracemalloc.stop()
+    return float(out.getvalue())
+
+
+def time_program(parse_tree, engine, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        program = build(parse_tree)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            program.interpret(engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=200, help='calls alive at once when measuring frames')
+    parser.add_argument('--locals', type=int, default=8, help='locals of the function recursing')
+    parser.add_argument('--iterations', type=int, default=20000, help='loop iterations of the timed programs')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100 * args.depth))  # the Interpreter recurses for every call
+    parser = make_parser('lalr')
+
+    lets = '\n'.join(f'    let v{i} = n + {i}' for i in range(args.locals))
+    deep = parse(parser, DEEP.format(lets = lets, depth = args.depth))
+    deeper = parse(parser, DEEP.format(lets = lets, depth = 2 * args.depth))
+    calls = parse(parser, CALLS.format(iterations = args.iterations))
+    lookups = parse(parser, LOOKUPS.format(iterations = args.iterations))
+
+    print(f'{"engine":<10}{"per frame":>12}{"calls":>12}{"lookups":>12}')
+    for engine in ENGINES:
+        size = (deepest_memory(deeper, engine) - deepest_memory(deep, engine)) / args.depth
+        call_time = time_program(calls, engine, args.repeat)
+        lookup_time = time_program(lookups, engine, args.repeat)
+        print(f'{engine:<10}{size:>10.0f} B{1000 * call_time:>10.1f}ms{1000 * lookup_time:>10.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
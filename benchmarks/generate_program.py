@@ -0,0 +1,137 @@
+"""
+Generates large valid programs for scaling benchmarks.
+
+Programs are made of functions and classes. Each function body has a number of statements,
+some of them inside blocks nested to the given depth, uses a couple of the classes and calls the
+functions below it in the call graph. The call graph's shape is one of
+- flat: main calls every function
+- tree: a balanced binary tree under main
+- random: a random tree under main, deterministic for a given seed
+- chain: main calls the first function, which calls the next and so on, so calls nest as deep
+  as there are functions
+
+Every function is called exactly once, so running a program costs about as much as its size.
+
+usage: python benchmarks/generate_program.py out.lang [--fns 100] [--classes 10] [--stmts 8]
+       [--depth 2] [--shape tree] [--seed 0]
+"""
+
+import sys
+import argparse
+import random
+
+
+SHAPES = ('flat', 'tree', 'random', 'chain')
+INDENT = '    '
+
+
+def call_graph(num_fns: int, shape: str, seed: int = 0):
+    """Returns the callees of every function and the functions main calls."""
+    callees = [[] for _ in range(num_fns)]
+    if shape == 'flat':
+        return callees, list(range(num_fns))
+    elif shape == 'chain':
+        for i in range(num_fns - 1):
+            callees[i].append(i + 1)
+    elif shape == 'tree':
+        for i in range(1, num_fns):
+            callees[(i - 1) // 2].append(i)
+    elif shape == 'random':
+        rng = random.Random(seed)
+        for i in range(1, num_fns):
+            callees[rng.randrange(i)].append(i)
+    else:
+        raise ValueError(f'unknown call graph shape "{shape}", expected one of {SHAPES}')
+    return callees, [0] if num_fns else []
+
+
+def gen_class(c: int) -> str:
+    return (
+        f'class Counter_{c} {{\n'
+        f'{INDENT}void init(num start) {{\n'
+        f'{INDENT * 2}this.count = start\n'
+        f'{INDENT}}}\n\n'
+        f'{INDENT}num add(num step) {{\n'
+        f'{INDENT * 2}this.count = this.count + step\n'
+        f'{INDENT * 2}return this.count\n'
+        f'{INDENT}}}\n'
+        f'}}\n'
+    )
+
+
+def gen_stmts(i: int, num_stmts: int, depth: int, num_classes: int):
+    """Yields (nesting, line) for a function body's statements, nesting every other block."""
+    for s in range(num_stmts):
+        kind = (i + s) % 5
+        if kind == 0:
+            yield 0, f'let v_{s} = total * 2 + a'
+            yield 0, f'total = v_{s} / 3'
+        elif kind == 1:
+            yield 0, 'if total > b {'
+            yield 1, 'total = total - b'
+            yield 0, '} else {'
+            yield 1, 'total = total + 1'
+            yield 0, '}'
+        elif kind == 2:
+            yield 0, 'while total > 1000 {'
+            yield 1, 'total = total / 2'
+            yield 0, '}'
+        elif kind == 3 and num_classes:
+            yield 0, f'let counter_{s} = Counter_{(i + s) % num_classes}(total)'
+            yield 0, f'total = counter_{s}.add(a)'
+        else:
+            # nested blocks, each level declaring a local the innermost one reads
+            for d in range(depth):
+                yield d, f'if a >= {-d - 1} {{'
+                yield d + 1, f'let n_{s}_{d} = total + {d}'
+            yield depth, 'total = total + ' + (' + '.join(f'n_{s}_{d}' for d in range(depth)) if depth else '1')
+            for d in reversed(range(depth)):
+                yield d, '}'
+
+
+def gen_function(i: int, callees, num_stmts: int, depth: int, num_classes: int) -> str:
+    lines = [f'num fn_{i}(num a, num b) {{', f'{INDENT}let total = a']
+    for nesting, line in gen_stmts(i, num_stmts, depth, num_classes):
+        lines.append(INDENT * (nesting + 1) + line)
+    for callee in callees:
+        lines.append(f'{INDENT}total = total + fn_{callee}(b, {callee % 7 + 1})')
+    lines.append(f'{INDENT}return total')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def generate(num_fns: int = 100, num_classes: int = 10, num_stmts: int = 8, depth: int = 2, shape: str = 'tree', seed: int = 0) -> str:
+    callees, roots = call_graph(num_fns, shape, seed)
+    parts = [gen_class(c) for c in range(num_classes)]
+    parts += [gen_function(i, callees[i], num_stmts, depth, num_classes) for i in range(num_fns)]
+    main_lines = ['num main() {', f'{INDENT}let total = 0']
+    main_lines += [f'{INDENT}total = total + fn_{root}({root % 5}, 3)' for root in roots]
+    main_lines += [f'{INDENT}print(total)', f'{INDENT}return 0', '}']
+    parts.append('\n'.join(main_lines) + '\n')
+    return '\n'.join(parts)
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out_f', help='where to write the program, "-" for stdout')
+    parser.add_argument('--fns', type=int, default=100, help='number of functions')
+    parser.add_argument('--classes', type=int, default=10, help='number of classes')
+    parser.add_argument('--stmts', type=int, default=8, help='statements per function body')
+    parser.add_argument('--depth', type=int, default=2, help='nesting depth of the nested statements')
+    parser.add_argument('--shape', choices=SHAPES, default='tree', help='shape of the call graph')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random call graph')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    src = generate(args.fns, args.classes, args.stmts, args.depth, args.shape, args.seed)
+    if args.out_f == '-':
+        sys.stdout.write(src)
+    else:
+        with open(args.out_f, 'w') as f:
+            f.write(src)
+
+
+if __name__ == '__main__':
+    main()
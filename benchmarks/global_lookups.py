@@ -0,0 +1,95 @@
+"""
+Times code reading globals in a loop on each engine: recursion, where every call looks the
+function up by name, and a loop calling a builtin and a global function and reading a global
+constant. Lookups are cached on the Var reading them, so this is what a cached lookup costs.
+
+The programs aren't optimized, so the lookups run as written rather than folded or hoisted.
+
+usage: python benchmarks/global_lookups.py [--iterations 20000] [--depth 18] [--repeat 5]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program, ENGINES
+from core.transformer import ASTBuilder
+
+
+RECURSION = '''
+num fib(num n) {{
+    if n < 2 {{ return n }}
+    return fib(n - 1) + fib(n - 2)
+}}
+
+num main() {{
+    print(fib({depth}))
+    return 0
+}}
+'''
+
+BUILTINS = '''
+let scale = 3
+
+num half(num x) {{
+    return x / 2
+}}
+
+num main() {{
+    let total = 0
+    for i : {iterations} {{
+        total = total + int(half(i)) * scale
+    }}
+    print(total)
+    return 0
+}}
+'''
+
+
+def build(parse_tree):
+    # transforms the globals without the root rule, which would build the Program right away
+    builder = ASTBuilder()
+    root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+    return Program(root, opt_level = 0)
+
+
+def time_program(parse_tree, engine, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        program = build(parse_tree)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            program.interpret(engine)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000, help='loop iterations calling the builtin')
+    parser.add_argument('--depth', type=int, default=18, help='fib of what to recurse for')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+    recursion = parse(parser, RECURSION.format(depth = args.depth))
+    builtins = parse(parser, BUILTINS.format(iterations = args.iterations))
+
+    print(f'{"engine":<10}{"recursion":>12}{"builtins":>12}')
+    for engine in ENGINES:
+        print(f'{engine:<10}{1000 * time_program(recursion, engine, args.repeat):>10.1f}ms'
+              f'{1000 * time_program(builtins, engine, args.repeat):>10.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Times call-heavy programs built at -O0 and -O2, where what matters for these is inlining: the
+helpers they call in their loops are one-expression functions and methods.
+
+Parsing and building the Program aren't timed, only interpreting it. "calls inlined" is what the
+inliner reported for the optimized build.
+
+usage: python benchmarks/inlining.py [--iterations 20000] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program
+from core.transformer import ASTBuilder
+
+
+HELPER_LOOP = '''
+num sq(num x) {{
+    return x * x
+}}
+
+num add(num a, num b) {{
+    return a + b
+}}
+
+num wrap(num x, num m) {{
+    return x - m * int(x / m)
+}}
+
+num main() {{
+    let total = 0
+    let i = 0
+    while i < {iterations} {{
+        let d = sq(i) + sq(i + 1)
+        total = wrap(add(total, d), 1000000)
+        i = add(i, 1)
+    }}
+    print(total)
+    return 0
+}}
+'''
+
+METHOD_LOOP = '''
+class Rect {{
+    void init(num w, num h) {{
+        this.w = w
+        this.h = h
+    }}
+
+    num area() {{
+        return this.w * this.h
+    }}
+
+    num scaled(num k) {{
+        return k * this.area()
+    }}
+
+    num total(num n) {{
+        let sum = 0
+        let i = 0
+        while i < n {{
+            sum = sum + this.scaled(i) - this.area()
+            i = i + 1
+        }}
+        return sum
+    }}
+}}
+
+num main() {{
+    print(Rect(2, 3).total({iterations}))
+    return 0
+}}
+'''
+
+
+def build(parse_tree, opt_level):
+    # transforms the globals without the root rule, which would build the Program right away
+    builder = ASTBuilder()
+    root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+    return Program(root, opt_level = opt_level)
+
+
+def time_program(parse_tree, opt_level, repeat):
+    best, program = float('inf'), None
+    for _ in range(repeat):
+        program = build(parse_tree, opt_level)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            program.interpret()
+        best = min(best, time.perf_counter() - start)
+    return best, program
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000, help='loop iterations per program')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print(f'{"program":<16}{"calls inlined":>15}{"unoptimized":>14}{"optimized":>12}{"speedup":>10}')
+    for name, template in (('helper loop', HELPER_LOOP), ('method loop', METHOD_LOOP)):
+        parse_tree = parse(parser, template.format(iterations = args.iterations))
+        baseline, _ = time_program(parse_tree, 0, args.repeat)
+        optimized, program = time_program(parse_tree, 2, args.repeat)
+        num_calls = next(stats.num_calls for name, stats, _ in program.pass_stats if name == 'inlining')
+        print(f'{name:<16}{num_calls:>15}{1000 * baseline:>12.1f}ms{1000 * optimized:>10.1f}ms{baseline / optimized:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
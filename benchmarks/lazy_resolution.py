@@ -0,0 +1,70 @@
+"""
+Compares resolving every function up front (--strict) with resolving them on their first call,
+for synthetic libraries whose main only calls one of their functions.
+
+Parsing is the same in both modes and isn't timed, "resolve" is building the Program from the
+AST and "first output" adds running main up to its print.
+
+usage: python benchmarks/lazy_resolution.py [--sizes 200 800 3200] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program
+from core.transformer import ASTBuilder
+from benchmarks.parse_modes import SYNTHETIC_FN
+
+
+def make_library_src(num_fns: int) -> str:
+    fns = ''.join(SYNTHETIC_FN.format(i = i) for i in range(num_fns))
+    return fns + '\nnum main() {\n    helper_0(3, 2)\n    return 0\n}\n'
+
+
+def time_modes(parse_tree, strict, repeat):
+    best_resolve, best_total = float('inf'), float('inf')
+    for _ in range(repeat):
+        # transforms the globals without the root rule, which would build the Program right away
+        builder = ASTBuilder()
+        root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+        start = time.perf_counter()
+        program = Program(root, strict = strict)
+        resolved = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            program.interpret()
+        best_resolve = min(best_resolve, resolved - start)
+        best_total = min(best_total, time.perf_counter() - start)
+    return best_resolve, best_total
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 800, 3200], help='functions per synthetic library')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print('STRICT VS LAZY RESOLUTION (ms)')
+    print('==============================')
+    print(f'{"functions":<12}{"strict resolve":>16}{"lazy resolve":>14}{"strict first output":>21}{"lazy first output":>19}')
+    for size in args.sizes:
+        parse_tree = parse(parser, make_library_src(size))
+        strict_resolve, strict_total = time_modes(parse_tree, True, args.repeat)
+        lazy_resolve, lazy_total = time_modes(parse_tree, False, args.repeat)
+        print(f'{size:<12}{1000 * strict_resolve:>16.1f}{1000 * lazy_resolve:>14.1f}{1000 * strict_total:>21.1f}{1000 * lazy_total:>19.1f}')
+
+
+if __name__ == '__main__':
+    main()
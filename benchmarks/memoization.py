@@ -0,0 +1,79 @@
+"""
+Times the recursive Fibonacci of tests/fib.lang with and without @cache, for growing n. Without
+it the number of calls, and the time, grows exponentially with n, with it every n is computed
+once, the rest are cache hits.
+
+Parsing and building the Program aren't timed, only interpreting it.
+
+usage: python benchmarks/memoization.py [--sizes 10 15 20 22] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program
+from core.transformer import ASTBuilder
+
+
+FIB = '''
+{decorator}
+num fib(num n) {{
+    if n < 2 {{
+        return n
+    }}
+    return fib(n - 1) + fib(n - 2)
+}}
+
+num main() {{
+    print(fib({n}))
+    return 0
+}}
+'''
+
+
+def build(parse_tree):
+    # transforms the globals without the root rule, which would build the Program right away
+    builder = ASTBuilder()
+    root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+    return Program(root)
+
+
+def time_program(parse_tree, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        program = build(parse_tree)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            program.interpret()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 15, 20, 22], help='arguments of fib')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print(f'{"n":<6}{"uncached":>14}{"cached":>12}{"speedup":>10}')
+    for n in args.sizes:
+        uncached = time_program(parse(parser, FIB.format(decorator = '', n = n)), args.repeat)
+        cached = time_program(parse(parser, FIB.format(decorator = '@cache', n = n)), args.repeat)
+        print(f'{n:<6}{1000 * uncached:>12.1f}ms{1000 * cached:>10.1f}ms{uncached / cached:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
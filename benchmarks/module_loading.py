@@ -0,0 +1,84 @@
+"""
+Times loading a synthetic multi-file project: every module parsed serially, in a process pool,
+all of them from the program cache, and after editing a single module.
+
+usage: python benchmarks/module_loading.py [--modules 16] [--fns 100] [--jobs 4] [--repeat 3]
+"""
+
+import sys
+import os.path as osp, os
+import argparse
+import tempfile
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.cache import ProgramCache
+from core.modules import ModuleLoader
+from core.parser import make_parser, parse, build_ast
+from benchmarks.parse_modes import SYNTHETIC_FN
+
+
+def write_project(dir_path: str, num_modules: int, num_fns: int) -> str:
+    for m in range(num_modules):
+        with open(osp.join(dir_path, f'module_{m}.lang'), 'w') as f:
+            f.write(''.join(SYNTHETIC_FN.format(i = i) for i in range(num_fns)))
+    imports = '\n'.join(f'import module_{m}' for m in range(num_modules))
+    main_f = osp.join(dir_path, 'main.lang')
+    with open(main_f, 'w') as f:
+        f.write(f'{imports}\n\nnum main() {{\n    return 0\n}}\n')
+    return main_f
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules', type=int, default=16, help='modules the program imports')
+    parser.add_argument('--fns', type=int, default=100, help='functions per module')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='processes for the parallel run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    with tempfile.TemporaryDirectory() as dir_path:
+        main_f = write_project(dir_path, args.modules, args.fns)
+        with open(main_f) as f:
+            program = build_ast(parse(parser, f.read()))
+        cache_dir = osp.join(dir_path, 'cache')
+
+        def run(jobs, cache = None, edit = None):
+            best = float('inf')
+            for i in range(args.repeat):
+                if cache is None:
+                    run_cache = None
+                else:
+                    run_cache = ProgramCache(cache_dir)
+                    if i == 0 and cache == 'cold':
+                        run_cache.clear()
+                if edit is not None:
+                    with open(osp.join(dir_path, 'module_0.lang'), 'a') as f:
+                        f.write(f'\nnum edit_{edit}_{i}() {{ return {i} }}\n')
+                loader = ModuleLoader(jobs = jobs, cache = run_cache)
+                start = time.perf_counter()
+                loader.load(program, main_f)
+                best = min(best, time.perf_counter() - start)
+            return best, loader.num_built
+
+        print(f'MODULE LOADING ({args.modules} modules x {args.fns} functions, ms)')
+        print('=================================================')
+        for label, jobs, cache, edit in [
+                ('serial, no cache', 1, None, None),
+                (f'{args.jobs} processes, no cache', args.jobs, None, None),
+                ('all cached', args.jobs, 'cold', None),
+                ('one module edited', args.jobs, 'warm', 'a'),
+            ]:
+            elapsed, num_built = run(jobs, cache, edit)
+            print(f'{label:<28}{1000 * elapsed:>10.1f}   ({num_built} built)')
+
+
+if __name__ == '__main__':
+    main()
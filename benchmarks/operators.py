@@ -0,0 +1,156 @@
+"""
+Times evaluating operators with the evaluators specialized per operand types against casting
+every operand and the result, which is how every evaluation used to go.
+
+"per operation" evaluates a single operator on values of the given types, "programs" interprets
+arithmetic and string heavy loops, with the interpreter's binary operators swapped for the baseline
+for the "cast all" column. Operand types are only known statically for literals and
+other ops, reads of variables are specialized on the types seen when they run.
+
+usage: python benchmarks/operators.py [--iterations 200000] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+import timeit
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core import nodes
+from core.parser import make_parser, parse, build_ast
+from core.visitors import Interpreter
+
+
+OPERATIONS = [
+    ('+', 1.5, 2.5),
+    ('*', 1.5, 2.5),
+    ('<', 1.5, 2.5),
+    ('+', 3, 2.5),
+    ('+', 'n=', 2.5),
+    ('+', 'a', 'b'),
+    ('and', True, False),
+]
+
+ARITHMETIC_LOOP = '''
+num main() {{
+    let total = 0
+    let i = 0
+    while i < {iterations} {{
+        total = total + i * 2 - i / 4
+        if total > 1000000 {{
+            total = total - 1000000
+        }}
+        i = i + 1
+    }}
+    print(total)
+    return 0
+}}
+'''
+
+CONCATENATION_LOOP = '''
+num main() {{
+    let label = ""
+    let i = 0
+    while i < {iterations} {{
+        label = "n=" + i + ", half=" + i / 2
+        i = i + 1
+    }}
+    print(label)
+    return 0
+}}
+'''
+
+
+# evaluation before specialization, kept here as the baseline
+LAMBDA_OPS = {
+    '+': lambda lhs, rhs: lhs + rhs,
+    '*': lambda lhs, rhs: lhs * rhs,
+    '-': lambda lhs, rhs: lhs - rhs,
+    '/': lambda lhs, rhs: lhs / rhs,
+    '<': lambda lhs, rhs: lhs < rhs,
+    '>': lambda lhs, rhs: lhs > rhs,
+    'and': lambda lhs, rhs: lhs and rhs,
+}
+
+def cast_all(bin_op_node, lhs, rhs):
+    lhs_cast, rhs_cast, res_cast = bin_op_node.resolve_casts(bin_op_node.op_str, type(lhs), type(rhs))
+    return res_cast(LAMBDA_OPS[bin_op_node.op_str](lhs_cast(lhs), rhs_cast(rhs)))
+
+
+def visit_cast_all(interpreter, bin_op_node):
+    return cast_all(bin_op_node, interpreter.interpret(bin_op_node.lhs), interpreter.interpret(bin_op_node.rhs))
+
+
+def specialized(bin_op_node, lhs, rhs):
+    # same as Interpreter.visitBinOp once the operands are evaluated
+    evaluate = bin_op_node.evaluate
+    if evaluate is None:
+        lhs_type, rhs_type, evaluate = bin_op_node.seen
+        if type(lhs) is not lhs_type or type(rhs) is not rhs_type:
+            evaluate = bin_op_node.respecialize(type(lhs), type(rhs))
+    return evaluate(lhs, rhs)
+
+
+def time_operation(fn, bin_op_node, lhs, rhs, number, repeat):
+    return min(timeit.repeat(lambda: fn(bin_op_node, lhs, rhs), number = number, repeat = repeat)) / number
+
+
+def time_program(parser, src, repeat, visit_bin_op = Interpreter.visitBinOp):
+    specialized_visit, Interpreter.visitBinOp = Interpreter.visitBinOp, visit_bin_op
+    try:
+        best = float('inf')
+        for _ in range(repeat):
+            program = build_ast(parse(parser, src))
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                program.interpret()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        Interpreter.visitBinOp = specialized_visit
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=200000, help='loop iterations per program')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+
+    print('PER OPERATION (ns)')
+    print('==================')
+    print(f'{"operation":<22}{"cast all":>10}{"dynamic":>10}{"static":>10}')
+    for op_str, lhs, rhs in OPERATIONS:
+        dynamic = nodes.BinOp(None, None, op_str, None)
+        static = nodes.BinOp(None, None, op_str, None)
+        static_types = tuple(float if type(val) is int else type(val) for val in (lhs, rhs))
+        static.set_operand_types(*static_types)
+        times = [
+            time_operation(cast_all, dynamic, lhs, rhs, args.iterations, args.repeat),
+            time_operation(specialized, dynamic, lhs, rhs, args.iterations, args.repeat),
+            # static types are what the resolver would know, ints never show up statically
+            time_operation(specialized, static, *(static_type(val) for static_type, val in zip(static_types, (lhs, rhs))), args.iterations, args.repeat),
+        ]
+        operation = f'{type(lhs).__name__} {op_str} {type(rhs).__name__}'
+        print(f'{operation:<22}' + ''.join(f'{1e9 * t:>10.0f}' for t in times))
+
+    parser = make_parser('lalr')
+    print('\nPROGRAMS (ms)')
+    print('=============')
+    print(f'{"program":<22}{"cast all":>10}{"specialized":>13}')
+    for name, template in (('arithmetic loop', ARITHMETIC_LOOP), ('concatenation loop', CONCATENATION_LOOP)):
+        src = template.format(iterations = args.iterations // 10)
+        baseline = time_program(parser, src, args.repeat, visit_cast_all)
+        print(f'{name:<22}{1000 * baseline:>10.1f}{1000 * time_program(parser, src, args.repeat):>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Compares LALR and Earley parse times over the tests/ corpus and synthetic large files.
+
+usage: python benchmarks/parse_modes.py [--sizes 50 200 800] [--repeat 3]
+"""
+
+import sys
+import os.path as osp, os
+import argparse
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+TEST_PATH = osp.join(ROOT_PATH, 'tests')
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, Source
+from core import utils
+
+
+SYNTHETIC_FN = """
+num helper_{i}(num a, num b) {{
+    let total = 0
+    for k in a {{
+        if k < b {{ total = total + k * 2 }}
+        else if k == b {{ total = total - 1 }}
+        else {{ total = total + (k - b) / 2 }}
+    }}
+    until total < 100 {{
+        total = total / 2
+    }}
+    print('helper ' + total)
+    return total
+}}
+"""
+
+SYNTHETIC_MAIN = """
+num main() {{
+{calls}
+    return 0
+}}
+"""
+
+
+def make_synthetic_src(num_fns: int) -> str:
+    fns = ''.join(SYNTHETIC_FN.format(i = i) for i in range(num_fns))
+    calls = '\n'.join(f'    helper_{i}({i}, 3)' for i in range(num_fns))
+    return fns + SYNTHETIC_MAIN.format(calls = calls)
+
+
+def time_it(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 800], help='functions per synthetic file')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+
+    print('PARSER CONSTRUCTION')
+    print('===================')
+    print(f' - lalr (no cache): {1000 * time_it(lambda: make_parser("lalr", cache = False), 1):.1f} ms')
+    make_parser('lalr')  # make sure the cache exists
+    print(f' - lalr (cached):   {1000 * time_it(lambda: make_parser("lalr"), args.repeat):.1f} ms')
+    print(f' - earley:          {1000 * time_it(lambda: make_parser("earley"), args.repeat):.1f} ms')
+
+    parsers = {parser_type: make_parser(parser_type) for parser_type in ('lalr', 'earley')}
+
+    sources = []
+    for test in sorted(f for f in os.listdir(TEST_PATH) if f.endswith('.lang')):
+        sources.append((test, Source(utils.read_file(osp.join(TEST_PATH, test))).text))
+    for size in args.sizes:
+        sources.append((f'synthetic_{size}', Source(make_synthetic_src(size)).text))
+
+    print('\n')
+    print('PARSE TIMES (ms)')
+    print('================')
+    print(f'{"source":<24}{"lines":>8}{"lalr":>12}{"earley":>12}{"speedup":>10}')
+    for name, src in sources:
+        times = {}
+        for parser_type, parser in parsers.items():
+            try:
+                parser.parse(src)
+            except Exception:
+                times[parser_type] = None
+                continue
+            times[parser_type] = time_it(lambda: parser.parse(src), args.repeat)
+
+        if None in times.values():
+            print(f'{name:<24}{src.count(chr(10)):>8}{"parse error":>34}')
+            continue
+        lalr, earley = times['lalr'], times['earley']
+        print(f'{name:<24}{src.count(chr(10)):>8}{1000 * lalr:>12.2f}{1000 * earley:>12.2f}{earley / lalr:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
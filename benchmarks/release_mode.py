@@ -0,0 +1,99 @@
+"""
+Compares debug and release builds of synthetic large files.
+
+For each size it times parsing plus building the AST, measures the memory the finished AST
+retains once the parse tree is dropped, and the peak resident memory of a fresh process that
+builds it (so lark's caches and the previous sizes don't count).
+
+usage: python benchmarks/release_mode.py [--sizes 50 200 800 1600] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import subprocess
+import resource
+import time
+import gc
+import tracemalloc
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse, build_ast
+from benchmarks.parse_modes import make_synthetic_src
+
+
+MODES = {'debug': False, 'release': True}
+
+
+def build(parser, src, release):
+    return build_ast(parse(parser, src), release = release)
+
+
+def time_build(parser, src, release, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(parser, src, release)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def retained_bytes(parser, src, release):
+    gc.collect()
+    tracemalloc.start()
+    program = build(parser, src, release)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del program
+    return size
+
+
+def peak_rss_kib(size, release):
+    cmd = [sys.executable, __file__, '--child', str(size)] + (['--release'] if release else [])
+    return int(subprocess.run(cmd, check = True, stdout = subprocess.PIPE, text = True).stdout)
+
+
+def child(size, release):
+    program = build(make_parser('lalr', release = release), make_synthetic_src(size), release)
+    # a child's ru_maxrss can include the high water mark of the process it was forked from,
+    # linux resets VmHWM on exec
+    try:
+        with open('/proc/self/status') as f:
+            print(next(line.split()[1] for line in f if line.startswith('VmHWM:')))
+    except OSError:
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)  # KiB on linux
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 800, 1600], help='functions per synthetic file')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, best is reported')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--release', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    if args.child is not None:
+        return child(args.child, args.release)
+
+    parsers = {mode: make_parser('lalr', release = release) for mode, release in MODES.items()}
+
+    print('DEBUG VS RELEASE BUILDS')
+    print('=======================')
+    print(f'{"functions":<12}{"mode":<10}{"parse+build ms":>16}{"AST MiB":>10}{"peak RSS MiB":>14}')
+    for size in args.sizes:
+        src = make_synthetic_src(size)
+        for mode, release in MODES.items():
+            elapsed = time_build(parsers[mode], src, release, args.repeat)
+            ast_mib = retained_bytes(parsers[mode], src, release) / 2 ** 20
+            rss_mib = peak_rss_kib(size, release) / 2 ** 10
+            print(f'{size:<12}{mode:<10}{1000 * elapsed:>16.1f}{ast_mib:>10.2f}{rss_mib:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
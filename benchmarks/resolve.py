@@ -0,0 +1,68 @@
+"""
+Times the resolver on large generated programs at increasing nesting depths.
+
+Each program is generated to about --lines lines, parsed and transformed once, then resolved
+strictly, so every function body is resolved. With resolution linear in the size of the AST the
+time per line should stay flat as references get nested deeper.
+
+usage: python benchmarks/resolve.py [--lines 100000] [--depths 2 16 64] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import gc
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program
+from core.transformer import ASTBuilder
+from benchmarks.generate_program import generate
+
+
+def generate_lines(num_lines: int, depth: int) -> str:
+    # functions are about the same size at a given depth, so size the program from two samples
+    small, large = (generate(num_fns, num_classes = 10, depth = depth).count('\n') for num_fns in (10, 20))
+    return generate(max(1, 10 + 10 * (num_lines - small) // (large - small)), num_classes = 10, depth = depth)
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=100000, help='approximate lines per generated program')
+    parser.add_argument('--depths', type=int, nargs='+', default=[2, 16, 64], help='nesting depths inside function bodies')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print('RESOLVER')
+    print('========')
+    print(f'{"depth":<8}{"lines":>10}{"resolve ms":>14}{"us/line":>10}')
+    for depth in args.depths:
+        src = generate_lines(args.lines, depth)
+        parse_tree = parse(parser, src)
+        builder = ASTBuilder()
+        global_nodes = [builder.transform(global_tree) for global_tree in parse_tree.children]
+        # the AST is long-lived, keeps collections during resolution from rescanning it
+        gc.collect()
+        gc.freeze()
+
+        best = float('inf')
+        for _ in range(args.repeat):
+            root = builder.make_root(parse_tree.meta, global_nodes)
+            start = time.perf_counter()
+            Program(root, strict = True)
+            best = min(best, time.perf_counter() - start)
+        gc.unfreeze()
+        num_lines = src.count('\n')
+        print(f'{depth:<8}{num_lines:>10}{1000 * best:>14.1f}{1e6 * best / num_lines:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
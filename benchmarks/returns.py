@@ -0,0 +1,122 @@
+"""
+Times call-heavy code on the Interpreter, where every call to a function ends in a return:
+recursion, a loop calling a function returning from inside a loop and a branch, and one calling
+methods. Returns complete the statements around them rather than raising, so that's what this
+measures, along with the calls themselves.
+
+The programs aren't optimized, so the small functions are called rather than inlined.
+
+usage: python benchmarks/returns.py [--depth 18] [--iterations 5000] [--repeat 5]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program
+from core.transformer import ASTBuilder
+
+
+PROGRAMS = {
+    'recursion': '''
+num fib(num n) {{
+    if n < 2 {{ return n }}
+    return fib(n - 1) + fib(n - 2)
+}}
+
+num main() {{
+    print(fib({depth}))
+    return 0
+}}
+''',
+    'nested returns': '''
+num find(num limit) {{
+    let i = 0
+    while i < 10 {{
+        if i >= limit {{
+            return i
+        }}
+        i = i + 1
+    }}
+    return 0 - 1
+}}
+
+num main() {{
+    let total = 0
+    for j : {iterations} {{
+        total = total + find(2)
+    }}
+    print(total)
+    return 0
+}}
+''',
+    'methods': '''
+class Counter {{
+    void init() {{
+        this.n = 0
+    }}
+
+    num next() {{
+        this.n = this.n + 1
+        return this.n
+    }}
+}}
+
+num main() {{
+    let counter = Counter()
+    let total = 0
+    for j : {iterations} {{
+        total = total + counter.next()
+    }}
+    print(total)
+    return 0
+}}
+''',
+}
+
+
+def build(parse_tree):
+    # transforms the globals without the root rule, which would build the Program right away
+    builder = ASTBuilder()
+    root = builder.make_root(parse_tree.meta, [builder.transform(global_tree) for global_tree in parse_tree.children])
+    return Program(root, opt_level = 0)
+
+
+def time_program(parse_tree, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        program = build(parse_tree)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            program.interpret()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=18, help='fib of what to recurse for')
+    parser.add_argument('--iterations', type=int, default=5000, help='calls made by the loops')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print(f'{"program":<18}{"time":>10}')
+    for name, src in PROGRAMS.items():
+        parse_tree = parse(parser, src.format(depth = args.depth, iterations = args.iterations))
+        print(f'{name:<18}{1000 * time_program(parse_tree, args.repeat):>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Measures how each phase scales with program size on generated programs.
+
+Every size is run through parsing, building the AST, resolving (strict, so every body is
+resolved), interpreting and unparsing. Times are the best of a few runs, memory is the peak
+allocated during the phase, measured on a separate run since tracing slows everything down.
+A phase is flagged as superlinear when its time grows faster than size ** --threshold, fitted
+over all sizes on a log-log scale.
+
+usage: python benchmarks/scaling.py [--sizes 100 200 400 800] [--shape tree] [--repeat 3]
+       [--classes 10] [--stmts 8] [--depth 2] [--threshold 1.15]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import contextlib
+import io
+import math
+import time
+import tracemalloc
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse
+from core.program import Program
+from core.transformer import ASTBuilder
+from benchmarks.generate_program import SHAPES, generate
+
+
+PHASES = ('parse', 'build', 'resolve', 'interpret', 'unparse')
+
+
+def run_phases(parser, src):
+    """Yields (phase, fn) in order, each fn's result feeds the phases after it."""
+    state = {}
+
+    def build():
+        # the root rule would build and resolve the Program, so globals are transformed on their own
+        builder = ASTBuilder()
+        tree = state['parse']
+        state['build'] = builder.make_root(tree.meta, [builder.transform(global_tree) for global_tree in tree.children])
+
+    def interpret():
+        with contextlib.redirect_stdout(io.StringIO()):
+            state['resolve'].interpret()
+
+    yield 'parse', lambda: state.__setitem__('parse', parse(parser, src))
+    yield 'build', build
+    yield 'resolve', lambda: state.__setitem__('resolve', Program(state['build'], strict = True))
+    yield 'interpret', interpret
+    yield 'unparse', lambda: state['resolve'].unparsed()
+
+
+def measure(parser, src, repeat):
+    seconds = dict.fromkeys(PHASES, float('inf'))
+    for _ in range(repeat):
+        for phase, fn in run_phases(parser, src):
+            start = time.perf_counter()
+            fn()
+            seconds[phase] = min(seconds[phase], time.perf_counter() - start)
+
+    peaks = {}
+    tracemalloc.start()
+    for phase, fn in run_phases(parser, src):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        fn()
+        peaks[phase] = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return seconds, peaks
+
+
+def growth_exponent(sizes, times):
+    # least squares slope of log(time) over log(size)
+    xs, ys = [math.log(size) for size in sizes], [math.log(max(t, 1e-9)) for t in times]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x if var_x else float('nan')
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 200, 400, 800], help='functions per generated program')
+    parser.add_argument('--shape', choices=SHAPES, default='tree', help='shape of the call graph')
+    parser.add_argument('--classes', type=int, default=10, help='classes per generated program')
+    parser.add_argument('--stmts', type=int, default=8, help='statements per function body')
+    parser.add_argument('--depth', type=int, default=2, help='nesting depth inside function bodies')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is reported')
+    parser.add_argument('--threshold', type=float, default=1.15, help='growth exponent above which a phase is flagged')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print(f'SCALING ({args.shape} call graph, {args.stmts} statements per function, depth {args.depth})')
+    print('=====================================================================')
+    print(f'{"functions":<11}{"lines":>8}' + ''.join(f'{phase + " ms":>14}' for phase in PHASES))
+    times = {phase: [] for phase in PHASES}
+    peaks = {phase: [] for phase in PHASES}
+    for size in args.sizes:
+        src = generate(size, args.classes, args.stmts, args.depth, args.shape)
+        seconds, peak_bytes = measure(parser, src, args.repeat)
+        for phase in PHASES:
+            times[phase].append(seconds[phase])
+            peaks[phase].append(peak_bytes[phase])
+        print(f'{size:<11}{src.count(chr(10)):>8}' + ''.join(f'{1000 * seconds[phase]:>14.1f}' for phase in PHASES))
+
+    print(f'\n{"peak MiB":<19}' + ''.join(f'{phase:>14}' for phase in PHASES))
+    for i, size in enumerate(args.sizes):
+        print(f'{size:<19}' + ''.join(f'{peaks[phase][i] / 2 ** 20:>14.2f}' for phase in PHASES))
+
+    if len(args.sizes) < 2:
+        return
+    print(f'\n{"growth":<19}' + ''.join(f'{phase:>14}' for phase in PHASES))
+    exponents = {phase: growth_exponent(args.sizes, times[phase]) for phase in PHASES}
+    print(f'{"time ~ size^k, k":<19}' + ''.join(f'{exponents[phase]:>14.2f}' for phase in PHASES))
+    flagged = [phase for phase in PHASES if exponents[phase] > args.threshold]
+    print(f'superlinear: {", ".join(flagged) if flagged else "none"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures cold-start time, each sample is a fresh interpreter process.
+
+Parser construction is timed for lark without its table cache, lark with it and the
+standalone module from build_parser.py, followed by full runs of a short script through
+the CLI with the program cache disabled.
+
+usage: python benchmarks/startup.py [--src tests/fib.lang] [--repeat 5]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import subprocess
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import load_standalone_parser
+
+
+PARSER_SNIPPET = 'from core.parser import make_parser; make_parser("lalr", cache = {cache}, standalone = {standalone})'
+
+
+def time_process(cmd, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd = ROOT_PATH, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', default=osp.join(ROOT_PATH, 'tests', 'fib.lang'), help='script for the full runs')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+
+    if load_standalone_parser() is None:
+        print('grammar/lalr_standalone.py is missing or stale, run build_parser.py first')
+        sys.exit(1)
+
+    # only parser construction is attributed to a mode, the interpreter's own imports are not
+    baseline = time_process([sys.executable, '-c', 'import core.parser'], args.repeat)
+    modes = {
+        'lark (no cache)': dict(cache = False, standalone = False),
+        'lark (cached)': dict(cache = True, standalone = False),
+        'standalone': dict(cache = True, standalone = True),
+    }
+    # make sure lark's table cache exists before timing the cached mode
+    subprocess.run([sys.executable, '-c', PARSER_SNIPPET.format(**modes['lark (cached)'])], cwd = ROOT_PATH, check = True)
+
+    print(f'PARSER CONSTRUCTION (ms, startup and imports of {1000 * baseline:.1f} ms subtracted)')
+    print('==================================================================')
+    times = {}
+    for name, options in modes.items():
+        cmd = [sys.executable, '-c', PARSER_SNIPPET.format(**options)]
+        times[name] = time_process(cmd, args.repeat) - baseline
+        print(f'{name:<20}{1000 * times[name]:>10.1f}{times["lark (no cache)"] / times[name]:>9.1f}x')
+
+    print('\n')
+    print(f'FULL RUN OF {osp.relpath(args.src, ROOT_PATH)} (ms, program cache disabled)')
+    print('==========================================================')
+    cli = [sys.executable, ROOT_PATH, args.src, '--no_cache']
+    lark_run = time_process(cli + ['--no_standalone'], args.repeat)
+    standalone_run = time_process(cli, args.repeat)
+    print(f'{"lark (cached)":<20}{1000 * lark_run:>10.1f}')
+    print(f'{"standalone":<20}{1000 * standalone_run:>10.1f}{lark_run / standalone_run:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Compares edit-to-program latency of --watch against a full parse as files grow.
+
+Each measurement edits one function in the middle of a synthetic file, then times getting a
+resolved program for it, either from a WatchSession that saw the previous version or from scratch.
+
+usage: python benchmarks/watch_latency.py [--sizes 50 200 800 3200] [--repeat 3]
+"""
+
+import sys
+import os.path as osp
+import argparse
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.realpath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from core.parser import make_parser, parse, build_ast
+from core.watch import WatchSession
+from benchmarks.parse_modes import make_synthetic_src
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 800, 3200], help='functions per synthetic file')
+    parser.add_argument('--repeat', type=int, default=3, help='edits per measurement, best is reported')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+    parser = make_parser('lalr')
+
+    print('EDIT-TO-PROGRAM LATENCY (ms)')
+    print('============================')
+    print(f'{"functions":<12}{"lines":>8}{"full":>12}{"watch":>12}{"speedup":>10}')
+    for size in args.sizes:
+        src = make_synthetic_src(size)
+        session = WatchSession(parser)
+        session.update(src)
+
+        full, incremental = float('inf'), float('inf')
+        for i in range(args.repeat):
+            # a different edit every time so the session can't reuse the previous one
+            edited = src.replace(f'helper_{size // 2}(num a, num b) {{', f'helper_{size // 2}(num a, num b) {{\n    let edit_{i} = {i}', 1)
+
+            start = time.perf_counter()
+            build_ast(parse(parser, edited))
+            full = min(full, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            session.update(edited)
+            incremental = min(incremental, time.perf_counter() - start)
+            assert session.num_reparsed == 1
+
+        print(f'{size:<12}{edited.count(chr(10)):>8}{1000 * full:>12.1f}{1000 * incremental:>12.1f}{full / incremental:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
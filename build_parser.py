@@ -0,0 +1,46 @@
+"""
+Generates the standalone LALR parser module for grammar/grammar.lark.
+
+The generated module embeds lark's runtime and the serialized parse tables, so loading it
+neither imports lark nor compiles the grammar. It records the digest of the grammar it was
+built from and core.parser ignores it once the grammar changes, so rerun this after
+editing the grammar.
+
+usage: python build_parser.py [--check]
+"""
+
+import sys
+import argparse
+import io
+
+from core.parser import make_parser, grammar_digest, load_standalone_parser, STANDALONE_F_PATH
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--check', action='store_const', const=True, help='only report whether the module is up to date')
+    return parser.parse_args()
+
+
+def main():
+    args = get_cmd_line_args()
+
+    if args.check:
+        up_to_date = load_standalone_parser() is not None
+        print(f'{STANDALONE_F_PATH} is {"up to date" if up_to_date else "missing or stale"}')
+        sys.exit(0 if up_to_date else 1)
+
+    from lark.tools.standalone import gen_standalone
+
+    lark_inst = make_parser('lalr', cache = False, standalone = False)
+    out = io.StringIO()
+    gen_standalone(lark_inst, out = out, compress = True)
+    out.write(f'\nGRAMMAR_SHA256 = {grammar_digest()!r}\n')
+
+    with open(STANDALONE_F_PATH, 'w') as f:
+        f.write(out.getvalue())
+    print(f'wrote {STANDALONE_F_PATH}')
+
+
+if __name__ == '__main__':
+    main()
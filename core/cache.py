@@ -0,0 +1,148 @@
+"""
+On-disk cache of resolved programs.
+
+Entries are keyed on the source text, the grammar, the interpreter (version and core
+sources) and the build options (--parser, --release, --strict, -O), so any change to one of them is a miss.
+Each entry stores the AST in its compact pickled form (see ASTNode.__getstate__) together with
+the resolver's variable depths and the functions it deferred, which is everything Program needs
+to run without lark.
+
+Entries are named "<source path digest>-<content key>.ast". Storing a new entry for a
+source drops its older, now stale, entries, and the cache as a whole is bounded by
+evicting least recently used entries.
+"""
+
+import os.path as osp, os
+import sys
+import hashlib
+import pickle
+
+import core
+from core.program import Program
+from core.visitors.passes import DEFAULT_OPT_LEVEL
+
+
+CORE_DIR = osp.dirname(osp.realpath(__file__))
+GRAMMAR_F_PATH = osp.join(osp.dirname(CORE_DIR), 'grammar', 'grammar.lark')
+DEFAULT_CACHE_DIR = os.environ.get('SECRET_LANG_CACHE_DIR', osp.join(osp.expanduser('~'), '.cache', 'secret-language'))
+CACHE_EXT = '.ast'
+CACHE_FORMAT = 2
+
+
+def digest(*chunks: bytes) -> str:
+    hasher = hashlib.sha256()
+    for chunk in chunks:
+        hasher.update(chunk)
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+def interpreter_digest() -> str:
+    # hashing the sources means editing the interpreter can never leave a stale entry behind
+    chunks = [str(CACHE_FORMAT).encode(), core.__version__.encode()]
+    for dir_path, dir_names, f_names in os.walk(CORE_DIR):
+        dir_names.sort()
+        for f_name in sorted(f_names):
+            if f_name.endswith('.py'):
+                with open(osp.join(dir_path, f_name), 'rb') as f:
+                    chunks.append(f.read())
+    with open(GRAMMAR_F_PATH, 'rb') as f:
+        chunks.append(f.read())
+    return digest(*chunks)
+
+
+class ProgramCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 64 * 2 ** 20, max_entries: int = 256, release: bool = False, strict: bool = False, opt_level: int = DEFAULT_OPT_LEVEL, parser_type: str = 'lalr') -> None:
+        self.cache_dir = cache_dir
+        self.parser_type = parser_type
+        self.release = release
+        self.strict = strict
+        self.opt_level = opt_level
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._interpreter_digest = None
+
+    @staticmethod
+    def path_key(src_f: str) -> str:
+        return digest(osp.realpath(src_f).encode())[:16]
+
+    def entry_path(self, src_f: str, src: str) -> str:
+        if self._interpreter_digest is None:
+            self._interpreter_digest = interpreter_digest()
+        build = f'{self.parser_type}-{"release" if self.release else "debug"}-{"strict" if self.strict else "lazy"}-O{self.opt_level}'.encode()
+        content_key = digest(self._interpreter_digest.encode(), build, src.encode())[:32]
+        return osp.join(self.cache_dir, f'{self.path_key(src_f)}-{content_key}{CACHE_EXT}')
+
+    def load(self, src_f: str, src: str, module: bool = False):
+        entry_path = self.entry_path(src_f, src)
+        try:
+            with open(entry_path, 'rb') as f:
+                ast, resolutions, deferred = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:  # corrupt or unreadable entry, treat as a miss
+            self.remove(entry_path)
+            return None
+        try:
+            os.utime(entry_path)  # mtime tracks recency for eviction
+        except OSError:
+            pass
+        return Program(ast, resolutions, deferred, strict = self.strict, module = module, opt_level = self.opt_level)
+
+    def store(self, src_f: str, src: str, program: Program) -> None:
+        entry_path = self.entry_path(src_f, src)
+        tmp_path = f'{entry_path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok = True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((program.ast, program.interpreter.locals, program.interpreter.deferred), f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except (OSError, RecursionError):
+            self.remove(tmp_path)  # caching is best effort
+            return
+        except (pickle.PicklingError, TypeError, AttributeError) as err:
+            # something in the AST doesn't pickle, that's a bug rather than a full disk
+            self.remove(tmp_path)
+            print(f'[cache] not caching {src_f}: {type(err).__name__}: {err}', file = sys.stderr)
+            return
+        self.invalidate(src_f, keep = entry_path)
+        self.evict()
+
+    def entries(self):
+        try:
+            f_names = os.listdir(self.cache_dir)
+        except OSError:
+            return []
+        return [osp.join(self.cache_dir, f_name) for f_name in f_names if f_name.endswith(CACHE_EXT)]
+
+    def invalidate(self, src_f: str, keep: str = None) -> None:
+        prefix = self.path_key(src_f) + '-'
+        for entry_path in self.entries():
+            if osp.basename(entry_path).startswith(prefix) and entry_path != keep:
+                self.remove(entry_path)
+
+    def evict(self) -> None:
+        stats = []
+        for entry_path in self.entries():
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+            stats.append((stat.st_mtime, stat.st_size, entry_path))
+        stats.sort()
+        total_bytes = sum(size for _, size, _ in stats)
+        while stats and (total_bytes > self.max_bytes or len(stats) > self.max_entries):
+            _, size, entry_path = stats.pop(0)
+            self.remove(entry_path)
+            total_bytes -= size
+
+    def clear(self) -> None:
+        for entry_path in self.entries():
+            self.remove(entry_path)
+
+    @staticmethod
+    def remove(f_path: str) -> None:
+        try:
+            os.remove(f_path)
+        except OSError:
+            pass
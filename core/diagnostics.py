@@ -0,0 +1,38 @@
+"""
+Diagnostics reported by the passes over the AST.
+
+Passes collect Diagnostics instead of printing or asserting, so one run reports every problem
+it finds, with where it is, and callers decide how to show them. Errors are raised together as
+a ResolutionError once the pass is done.
+"""
+
+
+ERROR = 'error'
+WARNING = 'warning'
+
+
+class Diagnostic:
+    __slots__ = ('severity', 'code', 'message', 'line', 'column', 'scope')
+
+    def __init__(self, severity: str, code: str, message: str, node = None, scope: str = None) -> None:
+        self.severity = severity
+        self.code = code  # stable identifier, i.e. for filtering
+        self.message = message
+        meta = getattr(node, 'meta', None)
+        self.line = getattr(meta, 'line', None)
+        self.column = getattr(meta, 'column', None)
+        self.scope = scope  # name of the enclosing function or class, None at the top level
+
+    def __str__(self) -> str:
+        where = f'{self.line}:{self.column}: ' if self.line is not None else ''
+        scope = f' (in "{self.scope}")' if self.scope else ''
+        return f'{where}{self.severity}: {self.message}{scope} [{self.code}]'
+
+    def __repr__(self) -> str:
+        return f'<Diagnostic {self}>'
+
+
+class ResolutionError(Exception):
+    def __init__(self, diagnostics) -> None:
+        super().__init__('\n'.join(str(diagnostic) for diagnostic in diagnostics))
+        self.diagnostics = diagnostics
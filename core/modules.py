@@ -0,0 +1,109 @@
+"""
+Loads the modules a program imports.
+
+"import a.b" binds the module a/b.lang as "b" (or its alias), "from a.b import f, g as h" binds
+names the module defines. Module paths are relative to the importing file's directory, then to
+the entry program's. A module runs once, on its first import, in its own global scope.
+
+The loader follows imports breadth first from the entry program. Every module is a program of
+its own: the resolver never records globals, so resolving a module doesn't depend on who imports
+it and each module gets its own entry in the program cache. Modules that miss the cache are
+parsed and resolved in a process pool, so in a multi-file project only the edited modules are
+reprocessed and independent ones are processed in parallel.
+"""
+
+import os.path as osp, os
+
+from core import nodes
+from core.program import Program
+from core.visitors.passes import DEFAULT_OPT_LEVEL
+
+
+MODULE_EXT = '.lang'
+
+_parser = None  # per worker process
+
+
+def build_module(src_f: str, src: str, parser_type: str, release: bool, standalone: bool, strict: bool, opt_level: int, verify: bool):
+    """Parses and resolves a module, returning what the program cache stores for it."""
+    global _parser
+    from core.parser import make_parser, build_ast, parse
+
+    if _parser is None:
+        _parser = make_parser(parser_type, standalone = standalone, release = release)
+    program = build_ast(parse(_parser, src), release = release, module = True, strict = strict, opt_level = opt_level, verify = verify)
+    return program.ast, program.interpreter.locals, program.interpreter.deferred
+
+
+def imports(program: Program):
+    # imports are only allowed at the top level
+    return [node for node in program.ast.globals if isinstance(node, (nodes.Import, nodes.ImportFrom))]
+
+
+class ModuleLoader:
+    def __init__(self, parser_type: str = 'lalr', release: bool = False, standalone: bool = True, cache = None, jobs: int = None, strict: bool = False,
+                 opt_level: int = DEFAULT_OPT_LEVEL, verify: bool = False) -> None:
+        self.parser_type = parser_type
+        self.release = release
+        self.standalone = standalone
+        self.strict = strict
+        self.opt_level = opt_level
+        self.verify = verify
+        self.cache = cache
+        self.jobs = jobs or os.cpu_count() or 1
+        self.num_built = 0
+
+    def find(self, import_node, importer_f: str, entry_f: str) -> str:
+        rel_path = osp.join(*import_node.module) + MODULE_EXT
+        for dir_path in dict.fromkeys((osp.dirname(importer_f), osp.dirname(entry_f))):
+            f_path = osp.realpath(osp.join(dir_path, rel_path))
+            if osp.isfile(f_path):
+                return f_path
+        raise ImportError(f'Can not find module "{".".join(import_node.module)}" imported from "{importer_f}".')
+
+    def load(self, program: Program, src_f: str):
+        """Returns {file: Program} for every module program imports, directly or not."""
+        modules = {}
+        importers = [(program, src_f)]
+        pool = None
+        try:
+            while importers:
+                # files imported by the last layer that aren't loaded yet
+                pending = {}
+                for importer, importer_f in importers:
+                    for import_node in imports(importer):
+                        import_node.file = self.find(import_node, importer_f, src_f)
+                        if import_node.file not in modules:
+                            pending.setdefault(import_node.file, None)
+
+                misses = []
+                for f_path in pending:
+                    with open(f_path, 'r') as f:
+                        src = f.read()
+                    module = self.cache.load(f_path, src, module = True) if self.cache else None
+                    if module is None:
+                        misses.append((f_path, src))
+                    else:
+                        modules[f_path] = module
+
+                if len(misses) > 1 and self.jobs > 1 and pool is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    pool = ProcessPoolExecutor(min(self.jobs, len(misses)))
+                args = (self.parser_type, self.release, self.standalone, self.strict, self.opt_level, self.verify)
+                futures = [pool.submit(build_module, f_path, src, *args) for f_path, src in misses] if len(misses) > 1 and pool else None
+                for i, (f_path, src) in enumerate(misses):
+                    try:
+                        ast, resolutions, deferred = futures[i].result() if futures else build_module(f_path, src, *args)
+                    except Exception as err:
+                        raise ImportError(f'Can not load module "{f_path}": {type(err).__name__}: {err}') from err
+                    module = Program(ast, resolutions, deferred, strict = self.strict, module = True, opt_level = self.opt_level, verify = self.verify)
+                    if self.cache:
+                        self.cache.store(f_path, src, module)
+                    modules[f_path] = module
+                self.num_built += len(misses)
+
+                importers = [(modules[f_path], f_path) for f_path in pending]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return modules
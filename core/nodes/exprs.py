@@ -2,9 +2,7 @@
 
 """
 
-import lark
-from icecream import ic
-from pydot import Node
+import operator
 
 from core.nodes.node import ASTNode, NodeList
 from core.nodes.types import ClassType, FuncType, ObjectType
@@ -37,8 +35,8 @@ class Expr(ASTNode):
 # operations
 class UnaryOp(Expr):
     ops = {
-        '!': (lambda opd: not opd, 'l_not'),
-        '-': (lambda opd: -opd, 'negate'),
+        '!': (operator.not_, 'l_not'),
+        '-': (operator.neg, 'negate'),
     }
 
     type_resolutions = {
@@ -46,28 +44,76 @@ class UnaryOp(Expr):
         ('-', float): (float, float)
     }
 
+    evaluators = {}  # (op, operand type) -> specialized evaluator, see specialize
+
     def __init__(self, meta, operation, operand) -> None:
         super().__init__(meta)
         self.op_str = operation
         self.operand = operand
         self.op, self.name = UnaryOp.ops[operation]
-        self.opd_cast, self.res_cast = None, None
+        self.operand_type = None  # only set when known statically
+        self.evaluate = None
+        self.seen = (None, None)  # last operand type seen at runtime and its evaluator, when not known statically
+
+    @classmethod
+    def resolve_casts(cls, op_str, opd_type):
+        # ints only show up at runtime (i.e. from range), they behave like nums
+        opd_type = float if opd_type is int else opd_type
+        try:
+            return cls.type_resolutions[op_str, opd_type]
+        except KeyError:
+            raise TypeError(f'unsupported operand type for "{op_str}": {opd_type}')
+
+    @classmethod
+    def specialize(cls, op_str, opd_type):
+        """Returns a function applying op_str to values of exactly opd_type, casting only if the op needs another type."""
+        try:
+            return cls.evaluators[op_str, opd_type]
+        except KeyError:
+            pass
+        opd_cast, _ = cls.resolve_casts(op_str, opd_type)
+        op = cls.ops[op_str][0]
+        evaluate = op if opd_cast is opd_type else lambda opd: op(opd_cast(opd))
+        cls.evaluators[op_str, opd_type] = evaluate
+        return evaluate
+
+    def set_operand_type(self, opd_type):
+        """Fixes the evaluator when the operand's type is known statically."""
+        self.operand_type = opd_type
+        self.evaluate = self.specialize(self.op_str, opd_type)
+        self.type = self.type_resolutions[self.op_str, opd_type][1]
+
+    def respecialize(self, opd_type):
+        evaluate = self.specialize(self.op_str, opd_type)
+        self.seen = (opd_type, evaluate)
+        return evaluate
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['op'], state['evaluate'], state['seen']  # functions can't all be pickled, restored from the ops table
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.op = UnaryOp.ops[self.op_str][0]
+        self.evaluate = self.specialize(self.op_str, self.operand_type) if self.operand_type else None
+        self.seen = (None, None)
     
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitUnaryOp(self, *args, **kwargs)
 
 class BinOp(Expr):
     ops = {
-        '+': (lambda lhs, rhs: lhs + rhs, 'addition'),
-        '-': (lambda lhs, rhs: lhs - rhs, 'subtraction'),
-        '*': (lambda lhs, rhs: lhs * rhs, 'multiplication'),
-        '/': (lambda lhs, rhs: lhs / rhs, 'division'),
-        '==': (lambda lhs, rhs: lhs == rhs, 'eq'),
-        '!=': (lambda lhs, rhs: lhs != rhs, 'neq'),
-        '<': (lambda lhs, rhs: lhs < rhs, 'lt'),
-        '<=': (lambda lhs, rhs: lhs <= rhs, 'lte'),
-        '>': (lambda lhs, rhs: lhs > rhs, 'gt'),
-        '>=': (lambda lhs, rhs: lhs >= rhs, 'gte'),
+        '+': (operator.add, 'addition'),
+        '-': (operator.sub, 'subtraction'),
+        '*': (operator.mul, 'multiplication'),
+        '/': (operator.truediv, 'division'),
+        '==': (operator.eq, 'eq'),
+        '!=': (operator.ne, 'neq'),
+        '<': (operator.lt, 'lt'),
+        '<=': (operator.le, 'lte'),
+        '>': (operator.gt, 'gt'),
+        '>=': (operator.ge, 'gte'),
         'and': (lambda lhs, rhs: lhs and rhs, 'l_and'),
         'or': (lambda lhs, rhs: lhs or rhs, 'l_or'),
     }
@@ -92,13 +138,72 @@ class BinOp(Expr):
         ('or', bool, bool): (bool, bool, bool),
     }
 
+    evaluators = {}  # (op, lhs type, rhs type) -> specialized evaluator, see specialize
+
     def __init__(self, meta, lhs, op_str, rhs) -> None:
         super().__init__(meta)
         self.op_str = str(op_str)
         self.lhs, self.rhs = lhs, rhs
         self.op, self.op_name = BinOp.ops[op_str]
-        self.lhs_cast, self.rhs_cast, self.res_cast = None, None, None
-
+        self.operand_types = None  # only set when known statically
+        self.evaluate = None
+        self.seen = (None, None, None)  # last operand types seen at runtime and their evaluator, when not known statically
+
+    @classmethod
+    def resolve_casts(cls, op_str, lhs_type, rhs_type):
+        # ints only show up at runtime (i.e. from range), they behave like nums
+        lhs_type = float if lhs_type is int else lhs_type
+        rhs_type = float if rhs_type is int else rhs_type
+        try:
+            return cls.type_resolutions[op_str, lhs_type, rhs_type]
+        except KeyError:
+            raise TypeError(f'unsupported operand types for "{op_str}": {lhs_type} and {rhs_type}')
+
+    @classmethod
+    def specialize(cls, op_str, lhs_type, rhs_type):
+        """
+        Returns a function applying op_str to values of exactly these types. Only operands of
+        another type than the op works on are cast, i.e. the num in a str concatenation, and
+        the op already returns the result type, so the result never is.
+        """
+        try:
+            return cls.evaluators[op_str, lhs_type, rhs_type]
+        except KeyError:
+            pass
+        lhs_cast, rhs_cast, _ = cls.resolve_casts(op_str, lhs_type, rhs_type)
+        op = cls.ops[op_str][0]
+        if lhs_cast is lhs_type and rhs_cast is rhs_type:
+            evaluate = op
+        elif rhs_cast is rhs_type:
+            evaluate = lambda lhs, rhs: op(lhs_cast(lhs), rhs)
+        elif lhs_cast is lhs_type:
+            evaluate = lambda lhs, rhs: op(lhs, rhs_cast(rhs))
+        else:
+            evaluate = lambda lhs, rhs: op(lhs_cast(lhs), rhs_cast(rhs))
+        cls.evaluators[op_str, lhs_type, rhs_type] = evaluate
+        return evaluate
+
+    def set_operand_types(self, lhs_type, rhs_type):
+        """Fixes the evaluator when the operands' types are known statically."""
+        self.operand_types = (lhs_type, rhs_type)
+        self.evaluate = self.specialize(self.op_str, lhs_type, rhs_type)
+        self.type = self.type_resolutions[self.op_str, lhs_type, rhs_type][2]
+
+    def respecialize(self, lhs_type, rhs_type):
+        evaluate = self.specialize(self.op_str, lhs_type, rhs_type)
+        self.seen = (lhs_type, rhs_type, evaluate)
+        return evaluate
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['op'], state['evaluate'], state['seen']  # functions can't all be pickled, restored from the ops table
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.op = BinOp.ops[self.op_str][0]
+        self.evaluate = self.specialize(self.op_str, *self.operand_types) if self.operand_types else None
+        self.seen = (None, None, None)
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitBinOp(self, *args, **kwargs)
@@ -123,13 +228,45 @@ class Var(Expr):
     def __init__(self, meta, ident_token) -> None:
         super().__init__(meta)
         self.ident_token = ident_token
+        self.cached = (None, None)  # version of the globals and what they bound the name to, when it was last looked up there
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state['cached']  # runtime values, only good for the globals they came from
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.cached = (None, None)
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitVar(self, *args, **kwargs)
 
+    @property
+    def name(self):
+        return self.ident_token
+
     def __repr__(self) -> str:
         return f'<Var "{self.ident_token}" at {self.id}>'
 
+
+class ID(Expr):
+    def __init__(self, meta, name, type = None, mutability = None, scope = None, execution = None) -> None:
+        super().__init__(meta)
+        self.name = str(name)
+        self.type = type
+        self.mods = {
+            'mutability': mutability,
+            'scope': scope,
+            'execution': execution,
+        }
+
+    def accept(self, visitor, *args, **kwargs):
+        return visitor.visitID(self, *args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f'<ID "{self.name}" at {self.id}>'
+
 class ScopedID(Expr):
     def __init__(self, meta, name, object, id_tokens) -> None:
         super().__init__(meta)
@@ -182,37 +319,40 @@ class Object(Expr):
 
 
 class FuncObj(Object):  # inherit from new Obj (differentiate primative from obj maybe)
-    def __init__(self, meta, ident, formals, ret_type, body) -> None:
+    def __init__(self, meta, ident, formals, ret_type, body, decorator = None) -> None:
         assert formals is not None
         super().__init__(meta, FuncType(meta, [formal.type for formal in formals], ret_type))
         self.ident = ident
         self.formals = formals
         self.ret_type = ret_type
         self.body = body
+        self.decorator = decorator  # expression, what it evaluates to is called with the function
+        self.captures = None  # (name, depth) of the variables a closure captures, set by the resolver, (name, depth, slot) once laid out, None for other functions
+        self.frame_size = 0  # slots of the frame it's called in, set by the SlotAllocator, see core.visitors.slots
+
+    @property
+    def name(self):
+        return self.ident.ident_token if self.ident else 'anon'
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitFuncObj(self, *args, **kwargs)
 
     def __repr__(self) -> str:
-        return f'<FuncObj: "{self.ident}" - ([{", ".join(self.formals)}] -> {self.ret_type}) {{...}} at {self.id}>'
+        return f'<FuncObj: "{self.name}" - ([{", ".join(formal.name for formal in self.formals)}] -> {self.ret_type}) {{...}} at {self.id}>'
 
 
-class MethodObj(Object):
-    def __init__(self, meta, decorator, generics, mutability_mod, scope_mod, ret_type, formals, body) -> None:
-        super().__init__(meta, FuncType(meta, mutability_mod, scope_mod, ret_type, [formal.type for formal in (formals or [])]))
-        self.identifier = str(id(self))
+class MethodObj(FuncObj):
+    def __init__(self, meta, decorator, generics, mutability_mod, scope_mod, ret_type, ident, formals, body) -> None:
+        super().__init__(meta, ident, formals, ret_type, body, decorator)
         self.generics = generics
         self.mutability_mod = mutability_mod
         self.scope_mod = scope_mod
-        self.decorator = decorator
-        self.formals = formals or []
-        self.body = body
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitMethodObj(self, *args, **kwargs)
 
     def __repr__(self) -> str:
-        return f'<"method_obj" at {id(self)}>'
+        return f'<MethodObj "{self.name}" at {self.id}>'
 
 class ClassObj(Object):
     def __init__(self, meta, decorator, generics, id_, inheritance, cls_assignments):
@@ -238,7 +378,7 @@ class Literal(Expr):
         return visitor.visitLiteral(self, *args, **kwargs)
 
     def __repr__(self):
-        return f'<{self.type.__name__.upper()} = {self.value}>'
+        return f'<{type(self).__name__.upper()} = {self.value}>'
 
 # literals
 class Float(Literal):
@@ -257,8 +397,8 @@ class Int(Literal):
 
 
 class StrLit(Literal):
-    def __init__(self, token: lark.Token) -> None:
-        super().__init__(token, token.value[1:-1], str)
+    def __init__(self, meta, token) -> None:
+        super().__init__(meta, token, token[1:-1], str)
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitStrLit(self, *args, **kwargs)
@@ -266,15 +406,15 @@ class StrLit(Literal):
 
 class BoolLit(Literal):
     token_to_bool = {'true': True, 'false': False}
-    def __init__(self, token) -> None:
-        super().__init__(token, BoolLit.token_to_bool[token], bool)
+    def __init__(self, meta, token) -> None:
+        super().__init__(meta, token, BoolLit.token_to_bool[token], bool)
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitBoolLit(self, *args, **kwargs)
 
 class None_(Literal):
-    def __init__(self, token) -> None:
-        super().__init__(token, token, None)
+    def __init__(self, meta, token = 'none') -> None:
+        super().__init__(meta, token, None, None)
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitNone(self, *args, **kwargs)
@@ -286,8 +426,8 @@ class Container(Expr):
 class Array(Container):
     def __init__(self, meta, values) -> None:
         super().__init__(meta)
-        self.values = [val.value for val in values]
-        self.type = type(self.values[0]) if self.values else None  # this will need to be changed later
+        self.values = values
+        self.type = values[0].type if len(values) else None  # this will need to be changed later
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visitArray(self, *args, **kwargs)
@@ -296,7 +436,6 @@ class Index(Expr):
     def __init__(self, meta, base, idx) -> None:
         super().__init__(meta)
         self.base = base
-        self.name = base.name
         self.idx = idx
 
     def accept(self, visitor, *args, **kwargs):
@@ -4,23 +4,93 @@
 
 
 from abc import ABCMeta, abstractmethod
-import pydot
-from icecream import ic
+
+def compact(val):
+    # lark tokens are str subclasses, plain strs keep pickled ASTs small and lark-free
+    if isinstance(val, str) and type(val) is not str:
+        return str(val)
+    elif type(val) in (tuple, list):
+        return type(val)(compact(v) for v in val)
+    elif type(val) is dict:
+        return {compact(k): compact(v) for k, v in val.items()}
+    return val
+
+
+def iter_nodes(root, skip = ()):
+    """Yields the distinct nodes reachable from root, without recursing, but not the ones in skip nor what's below them."""
+    seen, stack = {id(node) for node in skip}, [root]
+    while stack:
+        val = stack.pop()
+        if isinstance(val, ASTNode):
+            if id(val) not in seen:
+                seen.add(id(val))
+                yield val
+                stack.extend(val.__dict__.values())
+        elif type(val) in (tuple, list):
+            stack.extend(val)
+
+
+def count_nodes(root) -> int:
+    return sum(1 for _ in iter_nodes(root))
+
+
+class Position:
+    """
+    Compact stand-in for lark's meta, keeps only what errors need. Release builds only know
+    where a node starts, their end_line and end_column are None.
+    """
+    __slots__ = ('line', 'column', 'end_line', 'end_column')
+
+    def __init__(self, line, column, end_line, end_column) -> None:
+        self.line = line
+        self.column = column
+        self.end_line = end_line
+        self.end_column = end_column
+
+    @classmethod
+    def from_meta(cls, meta):
+        if meta is None or isinstance(meta, Position):
+            return meta
+        return cls(*(getattr(meta, attr, None) for attr in cls.__slots__))
+
+    def __getstate__(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __setstate__(self, state):
+        for attr, val in zip(self.__slots__, state):
+            setattr(self, attr, val)
+
+    def __repr__(self) -> str:
+        return f'<Position {self.line}:{self.column}>'
+
 
 # abstractions
 class ASTNode(metaclass = ABCMeta):
     dot_node_kwargs = dict()
     def __init__(self, meta) -> None:
         self.meta = meta
-        self.id = hex(id(self))
         # ic(meta.type, meta.value)
         # input('\n\n\n')
 
+    @property
+    def id(self):
+        # only reprs and graphs need it, so it isn't stored on every node
+        return hex(id(self))
+
     @abstractmethod
     def accept(self, visitor, *args, **kwargs):
         raise NotImplementedError
 
+    def __getstate__(self):
+        state = {attr: compact(val) for attr, val in self.__dict__.items()}
+        state['meta'] = Position.from_meta(self.meta)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
     def make_pydot_node(self, *args, **kwargs):
+        import pydot  # only needed for graphing, keep it off the startup path
         print(__class__)
         print(self.dot_node_kwargs)
         return pydot.Node(str(hash(self)), *args, **(self.dot_node_kwargs | kwargs))
@@ -2,8 +2,6 @@
 
 """
 
-from icecream import ic
-
 from core.nodes.node import ASTNode
 
 # stmts
@@ -125,4 +123,29 @@ class Throw(Stmt):
         self.exception = exception
 
     def accept(self, visitor, *args, **kwargs):
-        return visitor.visitThrow(self, *args, **kwargs)
\ No newline at end of file
+        return visitor.visitThrow(self, *args, **kwargs)
+
+# imports
+class Import(Stmt):
+    def __init__(self, meta, module, alias) -> None:
+        super().__init__(meta)
+        self.module = module  # names of the dotted module path
+        self.alias = alias
+        self.file = None  # set by the ModuleLoader
+
+    @property
+    def name(self):
+        return self.alias or self.module[-1]
+
+    def accept(self, visitor, *args, **kwargs):
+        return visitor.visitImport(self, *args, **kwargs)
+
+class ImportFrom(Stmt):
+    def __init__(self, meta, module, names) -> None:
+        super().__init__(meta)
+        self.module = module
+        self.names = names  # (name, alias) pairs
+        self.file = None
+
+    def accept(self, visitor, *args, **kwargs):
+        return visitor.visitImportFrom(self, *args, **kwargs)
@@ -2,8 +2,6 @@
 
 """
 
-from icecream import ic
-
 from core.nodes.node import ASTNode
 
 class ObjectType(ASTNode):
@@ -21,6 +19,8 @@ class PrimitiveType(ObjectType):
         'bool': bool,
         'none': None,
         'void': 'void',
+        'num': float,
+        'nonetype': None,
     }
 
     inv_data_types = {v: k for k, v in data_types.items()}
@@ -55,4 +55,4 @@ class ClassType(ObjectType):
         self.ret_type = cls_name
 
     def accept(self, visitor, *args, **kwargs):
-        return visitor.visitFnType(self, *args, **kwargs)
\ No newline at end of file
+        return visitor.visitClassType(self, *args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Builds the parsers for the language grammar.
+
+"lalr" is the default mode. When build_parser.py has generated a standalone parser module
+for the current grammar it is used, which skips importing lark and compiling the grammar.
+Otherwise lark builds the parser, persisting its parse tables next to the grammar so only
+the first run pays for the grammar analysis; lark rebuilds that cache whenever the grammar,
+the options or the lark version change. "earley" parses the same grammar and is kept
+around for comparison and for debugging grammar changes.
+"""
+
+import os.path as osp
+import re
+import bisect
+import hashlib
+import importlib.util
+
+from core.transformer import ASTBuilder
+from core.visitors.passes import DEFAULT_OPT_LEVEL
+
+
+GRAMMAR_DIR = osp.join(osp.dirname(osp.dirname(osp.realpath(__file__))), 'grammar')
+GRAMMAR_F_PATH = osp.join(GRAMMAR_DIR, 'grammar.lark')
+LALR_CACHE_F_PATH = osp.join(GRAMMAR_DIR, 'cached')
+STANDALONE_F_PATH = osp.join(GRAMMAR_DIR, 'lalr_standalone.py')
+PARSER_TYPES = ('lalr', 'earley')
+
+# options shared by every parser, the standalone module is generated with the same ones
+PARSER_OPTIONS = dict(
+    start = 'root',
+    propagate_positions = True,
+    maybe_placeholders = True,
+)
+
+
+def grammar_digest() -> str:
+    with open(GRAMMAR_F_PATH, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_standalone_parser(propagate_positions: bool = True):
+    """Returns the generated standalone parser, or None if it is missing or stale."""
+    if not osp.isfile(STANDALONE_F_PATH):
+        return None
+    spec = importlib.util.spec_from_file_location('lalr_standalone', STANDALONE_F_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if getattr(module, 'GRAMMAR_SHA256', None) != grammar_digest():
+        return None  # grammar changed since the last build, fall back to lark
+    return module.Lark_StandAlone(propagate_positions = propagate_positions)
+
+
+def make_parser(parser_type: str = 'lalr', cache: bool = True, standalone: bool = True, release: bool = False):
+    """
+    Release parsers don't propagate positions to the trees' metas, build_ast(release=True) takes
+    the positions it keeps from the tokens instead.
+    """
+    options = dict(PARSER_OPTIONS, propagate_positions = not release)
+    if parser_type == 'lalr':
+        parser = load_standalone_parser(options['propagate_positions']) if standalone else None
+        if parser is not None:
+            return parser
+
+        import lark
+        return lark.Lark.open(
+            GRAMMAR_F_PATH,
+            parser = 'lalr',
+            lexer = 'contextual',
+            cache = LALR_CACHE_F_PATH if cache else False,
+            **options,
+        )
+    elif parser_type == 'earley':
+        import lark
+        return lark.Lark.open(
+            GRAMMAR_F_PATH,
+            parser = 'earley',
+            **options,
+        )
+    raise ValueError(f'unknown parser type "{parser_type}", expected one of {PARSER_TYPES}')
+
+
+def build_ast(parse_tree, release: bool = False, module: bool = False, strict: bool = False, opt_level: int = DEFAULT_OPT_LEVEL, verify: bool = False):
+    # the transformer isn't handed to the parser bc inline lalr transformers don't get meta
+    return ASTBuilder(release, module, strict, opt_level, verify).transform(parse_tree)
+
+
+# same patterns as STRING and COMMENT in the grammar, scanners match these whole so they only
+# act on what's outside of strings and comments
+STRING_OR_COMMENT = r'''"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|#[^\n]*'''
+SEPARATOR_RE = re.compile(STRING_OR_COMMENT + '|;')
+
+
+class Source:
+    """
+    Source text as handed to the parser. Statement separators (";") become line breaks, which the
+    grammar needs (see _LINE_LPAR), and everything else is kept as is, so offsets are the same in
+    both texts and only lines and columns have to be mapped back to the original file.
+    """
+
+    def __init__(self, raw_src: str) -> None:
+        self.raw = raw_src
+        self.num_separators = 0
+        self.text = SEPARATOR_RE.sub(self._sub_separator, raw_src)
+        self._line_starts = None
+
+    def _sub_separator(self, match):
+        if match.group() != ';':
+            return match.group()
+        self.num_separators += 1
+        return '\n'
+
+    def position(self, offset: int):
+        """Maps an offset to its 1-based (line, column) in the original file."""
+        if self._line_starts is None:
+            self._line_starts = [0] + [match.end() for match in re.finditer('\n', self.raw)]
+        line = bisect.bisect_right(self._line_starts, offset)
+        return line, offset - self._line_starts[line - 1] + 1
+
+    def remap(self, parse_tree):
+        """Points the positions in the parse tree at the original file, in place."""
+        if not self.num_separators:
+            return parse_tree  # no line breaks were added, positions already match
+
+        for subtree in parse_tree.iter_subtrees():
+            meta = subtree.meta
+            if not getattr(meta, 'empty', True):
+                meta.line, meta.column = self.position(meta.start_pos)
+                meta.end_line, meta.end_column = self.position(meta.end_pos)
+            for child in subtree.children:
+                if getattr(child, 'start_pos', None) is not None:  # token
+                    child.line, child.column = self.position(child.start_pos)
+                    child.end_line, child.end_column = self.position(child.end_pos)
+        return parse_tree
+
+    def remap_error(self, err):
+        # the contextual lexer reraises from its own error, so the chained one is remapped as well
+        for exc in (err, err.__context__):
+            pos = getattr(exc, 'pos_in_stream', None)
+            if self.num_separators and isinstance(pos, int) and pos >= 0:
+                exc.line, exc.column = self.position(pos)
+                if hasattr(exc, '_context'):
+                    exc._context = exc.get_context(self.raw)
+        return err
+
+
+def parse(parser, raw_src: str):
+    """Preprocesses and parses the source, positions in the tree and in errors refer to raw_src."""
+    src = Source(raw_src)
+    try:
+        parse_tree = parser.parse(src.text)
+    except Exception as err:
+        src.remap_error(err)
+        raise
+    return src.remap(parse_tree)
@@ -13,27 +13,72 @@
 
 
 from core.visitors.semantics import SemanticAnalyzer as SA
-from core.visitors import Unparser, GraphManager, Interpreter
-from core.runtime.callables import ReturnInterrupt
+from core.visitors import Unparser, Interpreter
+from core.visitors.passes import PassManager, DeferredPasses, OPT_LEVELS, DEFAULT_OPT_LEVEL
+from core.visitors.slots import SlotAllocator
+
+
+ENGINES = ('tree', 'vm', 'closures')  # walking the AST with the Interpreter, or running it compiled to bytecode or to closures
+DEFAULT_ENGINE = 'tree'
 
 
 class Program:
-    def __init__(self, ast) -> None:
+    def __init__(self, ast, resolutions = None, deferred = None, strict: bool = False, module: bool = False, opt_level: int = DEFAULT_OPT_LEVEL, verify: bool = False) -> None:
+        """
+        Global functions and methods are only resolved when they're first called, unless strict,
+        so errors in their bodies only show up then. deferred lists the ones that still aren't.
+        Modules keep the globals their own code doesn't use, for the programs importing them, and
+        nothing is inlined into them. opt_level picks the optimization passes, see PassManager,
+        verify checks the tree after each one. Deferred bodies are optimized once they're
+        resolved, loaded programs need the opt_level and module they were built with for that.
+        """
         self.ast = ast
         # print(self.unparsed())
         self.interpreter = Interpreter()
-        SA(self.interpreter).resolve(self.ast)
+        self.interpreter.root = ast
+        self.pass_stats = None  # (pass, stats, seconds) of the optimizations, only known when the program was built rather than loaded
+        if resolutions is None:
+            SA(self.interpreter, lazy = not strict).resolve(self.ast)
+            self.pass_stats = PassManager(self.interpreter, opt_level, module, strict, verify).run(self.ast)
+            SlotAllocator(self.interpreter.locals, self.interpreter.deferred).allocate(self.ast)
+        else:  # already resolved and laid out, i.e. loaded from the program cache
+            self.interpreter.locals = resolutions
+            self.interpreter.deferred = deferred or {}
+        if self.interpreter.deferred and OPT_LEVELS[opt_level]:
+            optimizer = DeferredPasses(self.ast, opt_level, module, verify)
+            self.interpreter.optimizers = dict.fromkeys(self.interpreter.deferred, optimizer)
+
+    def link(self, modules):
+        """Makes the modules the program imports, as loaded by the ModuleLoader, available to it."""
+        if not modules:
+            return
+        # copied, so the program's own resolutions can still be cached or reused on their own
+        self.interpreter.locals = dict(self.interpreter.locals)
+        self.interpreter.deferred = dict(self.interpreter.deferred)
+        self.interpreter.optimizers = dict(self.interpreter.optimizers)
+        for file, module in modules.items():
+            self.interpreter.locals.update(module.interpreter.locals)
+            self.interpreter.deferred.update(module.interpreter.deferred)
+            self.interpreter.optimizers.update(module.interpreter.optimizers)
+            self.interpreter.modules[file] = module.ast
 
     def unparsed(self):
-        return self.ast.accept(Unparser(), 0)
+        return Unparser().unparse(self.ast)
 
     def to_dot(self):
+        from core.visitors import GraphManager
         graph_manager = GraphManager()
         self.ast.accept(graph_manager, graph_manager.graph)
         return graph_manager.graph.to_string()
 
-    def interpret(self):
+    def interpret(self, engine: str = DEFAULT_ENGINE):
         try:
+            if engine == 'vm':
+                from core.runtime.vm import VirtualMachine
+                return VirtualMachine(self.interpreter)(self.ast)
+            if engine == 'closures':
+                from core.runtime.closures import ClosureEngine
+                return ClosureEngine(self.interpreter)(self.ast)
             return self.interpreter(self.ast)
         except RuntimeError as err:
             return err.args[0]
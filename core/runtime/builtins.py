@@ -7,8 +7,7 @@ from abc import abstractmethod
 import time
 import subprocess
 import sys
-import requests
-from core.runtime.callables import InternalCallable
+from core.runtime.callables import InternalCallable, InternalFunction, CachedFunction
 
 
 """
@@ -26,7 +25,8 @@ class Outer:
 # TODO add support for different arg types
 # get a list of all subclasses and register them?
 class BuiltinCallable(InternalCallable):
-    registered = set()
+    registered = {}  # name -> builtin
+    pure = False  # same result for the same arguments and no side effects, so calls on constants can be folded
 
     def __init__(self, name, ret_type, arg_type) -> None:
         super().__init__()
@@ -35,7 +35,8 @@ class BuiltinCallable(InternalCallable):
         self.ret_type = ret_type
 
     def __init_subclass__(cls):
-        BuiltinCallable.registered.add(cls())
+        builtin = cls()
+        BuiltinCallable.registered[builtin.name] = builtin
 
     @abstractmethod
     def __call__(self, interpreter, *args):
@@ -61,6 +62,8 @@ class Shell(BuiltinCallable):
         ).stdout.decode(encoding='utf-8').strip()
 
 class Int(BuiltinCallable):
+    pure = True
+
     def __init__(self) -> None:
         super().__init__('int', float, (float,))
 
@@ -103,6 +106,8 @@ class Range(BuiltinCallable):
         return list(range(int(length)))
 
 class Hex(BuiltinCallable):
+    pure = True
+
     def __init__(self) -> None:
         super().__init__('hex', str, (float,))
 
@@ -112,6 +117,8 @@ class Hex(BuiltinCallable):
         return hex(int_val)
 
 class Bin(BuiltinCallable):
+    pure = True
+
     def __init__(self) -> None:
         super().__init__('bin', str, (float,))
 
@@ -121,6 +128,8 @@ class Bin(BuiltinCallable):
         return bin(int_val)
 
 class Dec(BuiltinCallable):
+    pure = True
+
     def __init__(self) -> None:
         super().__init__('dec', str, (float,))
 
@@ -134,9 +143,46 @@ class Dec(BuiltinCallable):
         else:
             raise RuntimeError(1, f'can not convert "{val}" to decimal')
 
+class CacheDecorator(InternalCallable):
+    """What cache(maxsize) returns, it memoizes the function it decorates."""
+
+    def __init__(self, maxsize) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __call__(self, interp, fn):
+        if not isinstance(fn, InternalFunction):
+            raise RuntimeError(1, f'can not cache "{fn}", only pure functions can be cached')
+        impurity = interp.impurity(fn.fn_obj)
+        if impurity is not None:
+            raise RuntimeError(1, f'can not cache "{fn.fn_obj.name}", it {impurity}')
+        return CachedFunction(fn, self.maxsize)
+
+class Cache(BuiltinCallable):
+    def __init__(self) -> None:
+        super().__init__('cache', 'void', (float,))
+
+    def __call__(self, interp, arg):
+        # @cache keeps every result, @cache(maxsize) the ones for the maxsize latest arguments
+        if isinstance(arg, InternalCallable):
+            return CacheDecorator(None)(interp, arg)
+        if arg < 0 or arg != int(arg):
+            raise RuntimeError(1, f'cache size has to be a whole number, not "{arg}"')
+        return CacheDecorator(int(arg))
+
+class CacheInfo(BuiltinCallable):
+    def __init__(self) -> None:
+        super().__init__('cache_info', str, ('void',))
+
+    def __call__(self, interp, fn):
+        if not isinstance(fn, CachedFunction):
+            raise RuntimeError(1, f'"{fn}" is not cached')
+        return fn.info()
+
 class Ping(BuiltinCallable):
     def __init__(self) -> None:
         super().__init__('ping', str, (str,))
 
     def __call__(self, interp, url):
+        import requests  # slow to import and only ping needs it
         return float(requests.get(url).status_code)
\ No newline at end of file
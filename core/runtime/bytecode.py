@@ -0,0 +1,71 @@
+"""
+Instruction set of the VirtualMachine, see core.visitors.compile for how the AST maps onto it.
+
+Code is a flat list alternating opcodes and their argument, every instruction has exactly one,
+None when it doesn't need it, so the VM decodes them without looking up their size. Jump targets
+are indices into that list. Instructions work on the frame's value stack, the comments below say
+what they pop and push.
+"""
+
+# variables, locals are resolved to how many frames out they're declared and their slot there like
+# for the Interpreter, globals are looked up by name
+LOAD_LOCAL = 0  # slot in the frame's own environment -> value
+LOAD_AT = 1  # (distance, slot) -> value
+LOAD_GLOBAL = 2  # -> value, argument is the Var, whose inline cache the lookup goes through
+STORE_LOCAL = 3  # value ->, assigns slot in the frame's own environment
+STORE_AT = 4  # value ->, assigns (distance, slot)
+STORE_GLOBAL = 5  # value ->, assigns name
+DEFINE = 6  # value ->, declares name in the globals the code runs in
+
+# values
+CONST = 7  # -> value
+POP = 8  # value ->
+BINARY = 9  # lhs, rhs -> result, argument is the BinOp, specialized on the operand types it sees
+BINARY_STATIC = 10  # lhs, rhs -> result, argument is the evaluator for operand types known statically
+UNARY = 11  # operand -> result, argument is the UnaryOp
+UNARY_STATIC = 12  # operand -> result, argument is the evaluator
+BUILD_ARRAY = 13  # values -> array, argument is (number of values, type)
+INDEX = 14  # array, index -> element
+STORE_INDEX = 15  # value, array, index ->
+GET_FIELD = 16  # instance -> what name is on it
+SET_FIELD = 17  # instance, value ->, sets name
+LOAD_SUPER = 18  # -> method, argument is ((distance, slot) of super, (distance, slot) of this, name)
+
+# control
+JUMP = 19  # jumps to the argument
+JUMP_IF_FALSE = 20  # condition ->, jumps to the argument when it's falsy
+CALL = 21  # callee, arguments -> result, argument is the number of arguments
+RETURN = 22  # value ->, returns it to the caller
+SETUP_TRY = 23  # until POP_TRY, raising jumps to the argument with the stack as it is now
+POP_TRY = 24
+THROW = 25  # raises the argument
+
+# definitions
+MAKE_FUNCTION = 26  # -> function, argument is the FuncObj
+DECORATE = 27  # function, decorator -> what the decorator returned
+MAKE_CLASS = 28  # superclass or none ->, argument is the ClassObj
+IMPORT = 29  # argument is the Import
+IMPORT_FROM = 30  # argument is the ImportFrom
+
+OPNAMES = {op: name for name, op in globals().items() if name.isupper() and isinstance(op, int)}
+
+
+class Code:
+    """Compiled body of a function or of a module's globals."""
+    __slots__ = ('name', 'instructions', 'params', 'frame_size')
+
+    def __init__(self, name: str, instructions: list, params: tuple = (), frame_size: int = 0) -> None:
+        self.name = name
+        self.instructions = instructions
+        self.params = params  # names of the formals, bound in order to the arguments, the frame's first slots
+        self.frame_size = frame_size
+
+    def disassemble(self) -> str:
+        lines = [f'{self.name}({", ".join(self.params)}):']
+        for pc in range(0, len(self.instructions), 2):
+            op, arg = self.instructions[pc], self.instructions[pc + 1]
+            lines.append(f'{pc:>6} {OPNAMES[op]:<14}{"" if arg is None else arg!r}')
+        return '\n'.join(lines)
+
+    def __repr__(self) -> str:
+        return f'<Code "{self.name}", {len(self.instructions) // 2} instructions>'
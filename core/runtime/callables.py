@@ -6,13 +6,27 @@ Contains:
 """
 
 from abc import ABCMeta, abstractmethod
-from icecream import ic
+from collections import OrderedDict
+from itertools import count
 
 # internals
-class ReturnInterrupt(Exception):
-    def __init__(self, val) -> None:
-        super().__init__()
-        self.val = val
+class Completion:
+    """
+    How a statement finished when it didn't just run to its end, returned by it and passed on by
+    every statement around it until the one it's for: the call for a return, or the loop for a
+    break or a continue, once there are any. Nothing is raised, so a return costs no more than
+    the statements it leaves.
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f'<Completion "{self.name}">'
+
+
+RETURN = Completion('return')  # what was returned is the Interpreter's returned
 
 
 class InternalCallable(metaclass = ABCMeta):
@@ -72,40 +86,141 @@ class InternalFunction(InternalCallable):
         self.is_initializer = is_initializer
 
     def bind(self, instance):
-        env = Environment('binding', self.closure)
-        env.define('this', instance)
-        return InternalFunction(self.fn_obj, env, self.is_initializer)
+        return InternalFunction(self.fn_obj, Frame('binding', self.closure, [instance]), self.is_initializer)
+
+    def __call__(self, interpreter, *args):
+        fn_obj = self.fn_obj
+        assert len(args) == len(fn_obj.formals)
+        if interpreter.deferred and fn_obj in interpreter.deferred:
+            interpreter.resolve_deferred(fn_obj)
+
+        # the formals are the first slots, the rest are its locals, none until they're declared
+        values = list(args)
+        values += [None] * (fn_obj.frame_size - len(args))
+        with interpreter.enter_scope(fn_obj.name, self.closure, values):
+            if interpreter.interpret(fn_obj.body) is RETURN:
+                return interpreter.returned
+        if self.is_initializer:
+            return self.closure.values[0]  # this, the binding's only slot
+        return None
+
+    def __repr__(self):
+        return f'<Internal Function, "{self.fn_obj.name}">'
+
+
+class CachedFunction(InternalCallable):
+    """
+    A pure function memoized by @cache, keeping the results of its maxsize most recently used
+    arguments, or of all of them when maxsize is None. Only calls with numbers, strings, bools
+    and none are looked up, what a result read from arrays and instances could have changed,
+    and only results of those types are kept, callers could change an array or instance given
+    to every one of them.
+    """
+    KEY_TYPES = frozenset((float, int, str, bool, type(None)))
+
+    def __init__(self, fn, maxsize) -> None:
+        super().__init__()
+        self.fn = fn
+        self.maxsize = maxsize
+        self.results = OrderedDict()  # (type, value) of each arg -> result, least recently used first
+        self.hits = 0
+        self.misses = 0
 
     def __call__(self, interpreter, *args):
-        assert len(args) == len(self.fn_obj.formals)
-
-        with interpreter.enter_scope(self.fn_obj.ident.ident_token, self.closure):
-            for arg, formal in zip(args, self.fn_obj.formals):
-                interpreter.env.define(formal.name, arg)
-            try:
-                interpreter.interpret(self.fn_obj.body)
-            except ReturnInterrupt as RI:
-                    return RI.val
-            else:
-                if self.is_initializer:
-                    return self.closure.getAt(0, 'this')
-                return None
+        if not all(type(arg) in self.KEY_TYPES for arg in args):
+            self.misses += 1
+            return self.fn(interpreter, *args)
+        key = tuple((type(arg), arg) for arg in args)  # true == 1.0, but show(true) isn't show(1)
+        try:
+            result = self.results[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return result
+
+        self.misses += 1
+        result = self.fn(interpreter, *args)
+        if type(result) not in self.KEY_TYPES:
+            return result
+        self.results[key] = result
+        if self.maxsize is not None and len(self.results) > self.maxsize:
+            self.results.popitem(last = False)
+        return result
+
+    def info(self) -> str:
+        return f'hits={self.hits} misses={self.misses} maxsize={self.maxsize} currsize={len(self.results)}'
 
     def __repr__(self):
-        return f'<Internal Function, "{self.fn_obj.ident.ident_token}">'
+        return f'<Cached Function, "{self.fn.fn_obj.name}">'
+
+
+
+class InternalModule:
+    def __init__(self, name, env) -> None:
+        self.name = name
+        self.env = env  # the module's globals
+
+    def get(self, name):
+        try:
+            return self.env.scope[name]
+        except KeyError:
+            builtin = self.env.get_builtin(name)
+            if builtin is None:
+                raise AttributeError(f'Module "{self.name}" has no "{name}".')
+            return builtin
+
+    def set(self, name, val):
+        self.env.assign(name, val)
+
+    def __repr__(self):
+        return f'<Internal Module "{self.name}">'
 
 
 
 # environment
+class Cell:
+    """
+    Holds a variable closures capture, so the frame declaring it and the closures share it.
+    Frames hold the cell in the variable's slot, getting and setting it go through it.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value = None) -> None:
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f'<Cell {self.value!r}>'
+
+
+VERSIONS = count()  # shared by every Environment, so no two of them are ever at the same version
+
+
 class Environment:
-    from core.runtime.builtins import BuiltinCallable
+    """
+    Globals of a program or a module, looked up by name. What functions declare is in Frames.
+
+    Global lookups are cached on the Var looking them up, with the version of the globals they
+    were made at. Rebinding a global moves them to a new version, so every cached lookup is
+    stale, defining a new one doesn't, no lookup could have found it before.
+
+    Builtins are defined the first time the globals look them up, a program only pays for the
+    ones it uses.
+    """
+    values = None  # no slots, see Frame
+
     def __init__(self, name, enclosing = None) -> None:
         self.scope = {}
+        self.version = next(VERSIONS)
         self.name = name
         self.enclosing = enclosing
+        # globals of the module the scope is in, unresolved names are looked up there
+        self.globals = enclosing.globals if enclosing else self
         if not enclosing:
-            for builtin in Environment.BuiltinCallable.registered:
-                self.define(builtin.name, builtin)
+            # builtins register when their module is first imported, which waits for the first global scope
+            from core.runtime.builtins import BuiltinCallable
+            self.builtins = BuiltinCallable.registered
 
     def print(self):
         print(f'Env "{self.name}" -> {self.enclosing}:')
@@ -116,6 +231,8 @@ class Environment:
         #if name in self.scope:
         #    raise ValueError(f'"{name}" is already defined with value "{val}".')  # might want to enable this but wld break mult for loop
         #ic(self.name, name, val)
+        if name in self.scope:  # i.e. a class, declared before it's made
+            self.version = next(VERSIONS)
         self.scope[name] = val
 
     def get(self, name):
@@ -124,29 +241,74 @@ class Environment:
         except KeyError:
             if self.enclosing:
                 return self.enclosing.get(name)
-            raise AttributeError(f'Undefined variable "{name}".')
-        
-    def getAt(self, dist, name):
-        curr_env = self
-        for _ in range(dist):
-            curr_env = curr_env.enclosing
+            builtin = self.get_builtin(name)
+            if builtin is None:
+                raise AttributeError(f'Undefined variable "{name}".')
+            return builtin
 
-        return curr_env.scope[name]
-
-    def assignAt(self, dist, name, val):
-        curr_env = self
-        for _ in range(dist):
-            curr_env = curr_env.enclosing
-
-        curr_env.scope[name] = val
+    def get_builtin(self, name):
+        """Defines the builtin called name in the globals, returns it, None if there's no such builtin."""
+        builtin = self.builtins.get(name)
+        if builtin is not None:
+            self.scope[name] = builtin
+        return builtin
 
     def assign(self, name, val):
         if name in self.scope:
+            self.version = next(VERSIONS)
             self.scope[name] = val
         elif self.enclosing:
             return self.enclosing.assign(name, val)
+        elif self.get_builtin(name) is not None:  # never looked up, so nothing cached it
+            self.scope[name] = val
         else:
             raise AttributeError(f'Undefined variable "{name}".')
 
     def __repr__(self) -> str:
-        return f'<env object "{self.name}" at {id(self)}>'
\ No newline at end of file
+        return f'<env object "{self.name}" at {id(self)}>'
+
+
+class Frame:
+    """
+    Variables of a function's call, in the slots the SlotAllocator laid out for them, so they're
+    looked up by indexing a list rather than by name. The variables a closure captured, the this
+    of a bound method and the super of a subclass's methods are in frames of their own, between
+    the ones of the calls and the globals, see SemanticAnalyzer for which frames there are.
+    """
+    __slots__ = ('name', 'values', 'enclosing', 'globals')
+
+    def __init__(self, name, enclosing, values) -> None:
+        self.name = name
+        self.values = values  # slot -> value, or the Cell holding it once a closure captured it
+        self.enclosing = enclosing
+        self.globals = enclosing.globals
+
+    def ancestor(self, dist):
+        frame = self
+        for _ in range(dist):
+            frame = frame.enclosing
+        return frame
+
+    def getAt(self, dist, slot):
+        val = self.ancestor(dist).values[slot]
+        return val.value if type(val) is Cell else val
+
+    def assignAt(self, dist, slot, val):
+        values = self.ancestor(dist).values
+        cell = values[slot]
+        if type(cell) is Cell:  # captured before, i.e. by a closure declared before it or in a loop
+            cell.value = val
+        else:
+            values[slot] = val
+
+    def cell(self, dist, slot):
+        """Returns the cell holding the variable, replacing the variable with one the first time it's captured."""
+        values = self.ancestor(dist).values
+        cell = values[slot]
+        if type(cell) is not Cell:
+            # not set yet when it's a function capturing itself
+            cell = values[slot] = Cell(cell)
+        return cell
+
+    def __repr__(self) -> str:
+        return f'<frame "{self.name}" at {id(self)}>'
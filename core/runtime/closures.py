@@ -0,0 +1,20 @@
+"""
+Runs programs compiled to Python closures, the engine --engine=closures picks instead of the
+Interpreter, see core.visitors.closures for how nodes are compiled. It's lighter than the
+VirtualMachine: there's no dispatch at all, the closures call each other, but calls nest on
+Python's stack like the Interpreter's do.
+"""
+
+from core.runtime.engine import Engine
+from core.visitors.closures import ClosureCompiler
+
+
+class ClosureEngine(Engine):
+    def compile_function(self, fn_obj):
+        return ClosureCompiler(self).compile_function(fn_obj)
+
+    def compile_globals(self, root_node, main: bool):
+        return ClosureCompiler(self).compile_globals(root_node, main)
+
+    def run(self, code, env):
+        return code.run(env)
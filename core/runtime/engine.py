@@ -0,0 +1,112 @@
+"""
+What the engines compiling programs before running them share, the VirtualMachine and the
+ClosureEngine: functions whose code is compiled on their first call, once the resolver is done
+with their body, so lazily resolved programs stay lazy, and how functions, classes and modules
+are made.
+
+Frames, closures, instances and resolutions are the Interpreter's, only how bodies are
+run differs, so every engine prints the same.
+"""
+
+from abc import ABCMeta, abstractmethod
+
+from core import nodes
+from core.runtime.callables import Environment, Frame, InternalClass, InternalFunction, InternalModule
+
+
+class CompiledFunction(InternalFunction):
+    """A function an engine runs, its code is compiled on its first call and shared from then on."""
+
+    def __init__(self, fn_obj, closure, is_initializer, code = None) -> None:
+        super().__init__(fn_obj, closure, is_initializer)
+        self.code = code
+
+    def bind(self, instance):
+        return CompiledFunction(self.fn_obj, Frame('binding', self.closure, [instance]), self.is_initializer, self.code)
+
+    def __call__(self, engine, *args):
+        return engine.call(self, args)
+
+
+class Engine(metaclass = ABCMeta):
+    def __init__(self, interpreter) -> None:
+        # the interpreter has the resolutions, the bodies left to resolve and the imported modules
+        self.interpreter = interpreter
+        self.globals = Environment('globals')
+        self.codes = {}  # FuncObj -> its code, shared by every function made from it
+        self.loaded = {}  # file -> InternalModule, modules run once, on their first import
+
+    def __call__(self, root_node):
+        # like the Interpreter, main has to return something, but what isn't the exit code
+        if self.run(self.compile_globals(root_node, True), self.globals) is None:
+            print('Error: did not recieve exit code from "main"')
+            raise RuntimeError(1)
+
+    @abstractmethod
+    def compile_function(self, fn_obj):
+        """Returns the code of the function's body, with its name, params and frame size."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def compile_globals(self, root_node, main: bool):
+        """Returns the code of a program's globals, returning what its call to main does, or of a module's."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def run(self, code, env):
+        """Runs code in env, returning what it returns."""
+        raise NotImplementedError
+
+    def impurity(self, fn_obj):
+        return self.interpreter.impurity(fn_obj)
+
+    def function_code(self, fn):
+        fn_obj = fn.fn_obj
+        code = self.codes.get(fn_obj)
+        if code is None:
+            if self.interpreter.deferred and fn_obj in self.interpreter.deferred:
+                self.interpreter.resolve_deferred(fn_obj)
+            code = self.codes[fn_obj] = self.compile_function(fn_obj)
+        fn.code = code
+        return code
+
+    def call(self, fn, args):
+        code = fn.code or self.function_code(fn)
+        assert len(args) == len(code.params)
+        values = list(args)
+        values += [None] * (code.frame_size - len(args))
+        return self.run(code, Frame(code.name, fn.closure, values))
+
+    def make_function(self, fn_obj, env):
+        closure = env
+        if fn_obj.captures is not None:
+            # a closure only keeps what it captures, see SemanticAnalyzer.capture
+            closure = Frame('closure', env.globals, [env.cell(depth, slot) for _, depth, slot in fn_obj.captures])
+        return CompiledFunction(fn_obj, closure, False, self.codes.get(fn_obj))
+
+    def make_class(self, cls_obj, superclass, env):
+        if cls_obj.inheritance:
+            assert isinstance(superclass, InternalClass)
+        resolution = self.interpreter.locals.get(cls_obj)  # its slot, unless it's a global
+        if resolution is None:
+            env.define(cls_obj.name, None)
+        methods_env = env
+        if cls_obj.inheritance:
+            methods_env = Frame('base', env, [superclass])
+        methods = {}
+        for method in cls_obj.body:
+            if isinstance(method, nodes.MethodObj):  # static cls vars aren't supported yet
+                methods[method.name] = CompiledFunction(method, methods_env, method.name == 'init', self.codes.get(method))
+        klass = InternalClass(cls_obj.name, superclass, methods)
+        if resolution is None:
+            env.assign(cls_obj.name, klass)
+        else:
+            env.assignAt(*resolution, klass)
+
+    def import_module(self, import_node):
+        if import_node.file in self.loaded:
+            return self.loaded[import_node.file]
+        module = InternalModule('.'.join(import_node.module), Environment(import_node.file))
+        self.loaded[import_node.file] = module  # before running it, so import cycles terminate
+        self.run(self.compile_globals(self.interpreter.modules[import_node.file], False), module.env)
+        return module
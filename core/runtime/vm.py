@@ -0,0 +1,174 @@
+"""
+Runs programs compiled to bytecode, the engine --engine=vm picks instead of the Interpreter.
+
+The VirtualMachine is a single dispatch loop over the instructions of the code being run, with
+its value stack in a local list. Calls to functions it compiled don't recurse: the caller's
+code, position, stack and environment are saved and the callee runs in the same loop, so
+neither calls nor returns go through Python calls or exceptions. Everything else it calls,
+builtins, classes and what decorators return, is called like the Interpreter calls it, with the
+VM in its place, and runs its own loop when it calls back into compiled functions.
+
+Raising unwinds to the innermost try of the frame, and out of frames without one to their
+callers. How functions, classes and modules are made is shared with the other engines, see
+core.runtime.engine.
+"""
+
+from core.runtime.bytecode import *
+from core.runtime.callables import Cell, Frame, InternalCallable
+from core.runtime.engine import CompiledFunction, Engine
+from core.runtime.literals import InternalArray
+from core.visitors.compile import Compiler
+
+
+class VirtualMachine(Engine):
+    def compile_function(self, fn_obj):
+        return Compiler(self.interpreter.locals).compile_function(fn_obj)
+
+    def compile_globals(self, root_node, main: bool):
+        return Compiler(self.interpreter.locals).compile_globals(root_node, main)
+
+    def run(self, code, env):
+        """Runs code in env until it returns, returning what it does."""
+        instructions = code.instructions
+        values = env.values  # slots of the frame, none for globals
+        stack = []
+        handlers = []  # (handler, stack height) of the frame's trys, innermost last
+        frames = []  # (code, pc, stack, env, handlers) of the callers of the frame, up to the one run was called with
+        pc = 0
+        while True:
+            try:
+                while True:
+                    op = instructions[pc]
+                    arg = instructions[pc + 1]
+                    pc += 2
+
+                    if op == LOAD_LOCAL:
+                        val = values[arg]
+                        stack.append(val.value if type(val) is Cell else val)
+                    elif op == CONST:
+                        stack.append(arg)
+                    elif op == BINARY_STATIC:
+                        rhs = stack.pop()
+                        stack[-1] = arg(stack[-1], rhs)
+                    elif op == LOAD_GLOBAL:
+                        globals_ = env.globals
+                        version, val = arg.cached
+                        if version != globals_.version:  # see Environment
+                            val = globals_.get(arg.ident_token)
+                            arg.cached = (globals_.version, val)
+                        stack.append(val)
+                    elif op == JUMP_IF_FALSE:
+                        if not stack.pop():
+                            pc = arg
+                    elif op == JUMP:
+                        pc = arg
+                    elif op == CALL:
+                        if arg:
+                            args = stack[-arg:]
+                            del stack[-arg:]
+                        else:
+                            args = []
+                        fn = stack.pop()
+                        if type(fn) is not CompiledFunction:
+                            assert isinstance(fn, InternalCallable)
+                            stack.append(fn(self, *args))
+                            continue
+                        callee = fn.code or self.function_code(fn)
+                        assert len(args) == len(callee.params)
+                        frames.append((code, pc, stack, env, handlers))
+                        values = args  # the formals are the first slots
+                        values += [None] * (callee.frame_size - arg)
+                        env = Frame(callee.name, fn.closure, values)
+                        code, instructions, pc, stack, handlers = callee, callee.instructions, 0, [], []
+                    elif op == RETURN:
+                        val = stack.pop()
+                        if not frames:
+                            return val
+                        code, pc, stack, env, handlers = frames.pop()
+                        instructions = code.instructions
+                        values = env.values
+                        stack.append(val)
+                    elif op == BINARY:
+                        rhs = stack.pop()
+                        lhs = stack[-1]
+                        lhs_type, rhs_type, evaluate = arg.seen
+                        if type(lhs) is not lhs_type or type(rhs) is not rhs_type:
+                            evaluate = arg.respecialize(type(lhs), type(rhs))
+                        stack[-1] = evaluate(lhs, rhs)
+                    elif op == STORE_LOCAL:
+                        cell = values[arg]
+                        if type(cell) is Cell:  # captured by a closure
+                            cell.value = stack.pop()
+                        else:
+                            values[arg] = stack.pop()
+                    elif op == LOAD_AT:
+                        stack.append(env.getAt(*arg))
+                    elif op == STORE_AT:
+                        env.assignAt(arg[0], arg[1], stack.pop())
+                    elif op == STORE_GLOBAL:
+                        env.globals.assign(arg, stack.pop())
+                    elif op == POP:
+                        stack.pop()
+                    elif op == DEFINE:
+                        env.define(arg, stack.pop())
+                    elif op == GET_FIELD:
+                        stack[-1] = stack[-1].get(arg)
+                    elif op == SET_FIELD:
+                        val = stack.pop()
+                        stack.pop().set(arg, val)
+                    elif op == INDEX:
+                        idx = stack.pop()
+                        stack[-1] = stack[-1][int(idx)]
+                    elif op == STORE_INDEX:
+                        idx = stack.pop()
+                        array = stack.pop()
+                        array[int(idx)] = stack.pop()
+                    elif op == UNARY_STATIC:
+                        stack[-1] = arg(stack[-1])
+                    elif op == UNARY:
+                        opd = stack[-1]
+                        opd_type, evaluate = arg.seen
+                        if type(opd) is not opd_type:
+                            evaluate = arg.respecialize(type(opd))
+                        stack[-1] = evaluate(opd)
+                    elif op == BUILD_ARRAY:
+                        size, type_ = arg
+                        elements = stack[len(stack) - size:]
+                        del stack[len(stack) - size:]
+                        stack.append(InternalArray(elements, type_))
+                    elif op == LOAD_SUPER:
+                        super_at, this_at, name = arg
+                        method = env.getAt(*super_at).find_method(name)
+                        stack.append(method.bind(env.getAt(*this_at)))
+                    elif op == MAKE_FUNCTION:
+                        stack.append(self.make_function(arg, env))
+                    elif op == DECORATE:
+                        decorator = stack.pop()
+                        assert isinstance(decorator, InternalCallable)
+                        stack[-1] = decorator(self, stack[-1])
+                    elif op == MAKE_CLASS:
+                        self.make_class(arg, stack.pop(), env)
+                    elif op == SETUP_TRY:
+                        handlers.append((arg, len(stack)))
+                    elif op == POP_TRY:
+                        handlers.pop()
+                    elif op == THROW:
+                        raise arg
+                    elif op == IMPORT:
+                        env.define(arg.name, self.import_module(arg))
+                    elif op == IMPORT_FROM:
+                        module = self.import_module(arg)
+                        for name, alias in arg.names:
+                            env.define(alias or name, module.get(name))
+                    else:
+                        raise ValueError(f'unknown opcode {op}')
+            except Exception:
+                # unwinds to the innermost try, of this frame or of its callers'
+                while not handlers:
+                    if not frames:
+                        raise
+                    code, pc, stack, env, handlers = frames.pop()
+                pc, height = handlers.pop()
+                del stack[height:]
+                instructions = code.instructions
+                values = env.values
@@ -1,6 +1,8 @@
 """
 Transforms lark tokens and trees into desugared components.
-When used as a lark transformer, this class defines how the AST nodes are built.
+Each grammar rule maps to the ASTBuilder method of the same name, called with the rule's meta and
+transformed children. Trees are only duck-typed (data, children, meta), so trees from lark and from
+the generated standalone parser can both be transformed without importing lark.
 
 // RECOGNIZES TRUE LVALS (DFA PROOF):
 // lval: identifier | index
@@ -21,25 +23,96 @@ When used as a lark transformer, this class defines how the AST nodes are built.
 
 # in python mode, make it so can import python files which then bind to builtins
 
-import lark
-from icecream import ic
-from numpy import isin
-
 from core.program import Program
+from core.visitors.passes import DEFAULT_OPT_LEVEL
 from core.nodes import *
+from core.nodes.node import Position
 
 
 def make_collector(*args, type_ = NodeList):
     return lambda _, meta, *items: type_(meta, items, *args)
 
 
-@lark.v_args(wrapper = lambda fn, rule_token, children, meta: fn(meta, *children))
-class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
-    def __init__(self) -> None:
-        super().__init__()
+class ASTBuilder:
+    def __init__(self, release: bool = False, module: bool = False, strict: bool = False, opt_level: int = DEFAULT_OPT_LEVEL, verify: bool = False) -> None:
+        # release builds come from parsers that don't propagate positions, nodes get a Position
+        # made from their first token instead of lark's meta and tokens become plain strs
+        self.release = release
+        self.module = module  # imported modules don't need, and don't run, a main
+        self.strict = strict  # resolve every function up front, see Program
+        self.opt_level = opt_level
+        self.verify = verify
+
+    def transform(self, tree):
+        if self.release:
+            return self.transform_release(tree)
+        tree_type = type(tree)
+
+        # post-order over an explicit stack of (subtree, its transformed children so far), so
+        # nesting depth isn't bounded by the recursion limit
+        stack = [(tree, [])]
+        while True:
+            subtree, children = stack[-1]
+            if len(children) < len(subtree.children):
+                child = subtree.children[len(children)]
+                if isinstance(child, tree_type):
+                    stack.append((child, []))
+                else:
+                    children.append(child)  # tokens and placeholders
+                continue
+
+            stack.pop()
+            callback = getattr(self, subtree.data, None)
+            if callback is None:  # rules without a node yet, i.e. generics
+                node = tree_type(subtree.data, children, subtree.meta)
+            else:
+                node = callback(subtree.meta, *children)
+            if not stack:
+                return node
+            stack[-1][1].append(node)
+
+    def transform_release(self, tree):
+        tree_type = type(tree)
+
+        # same traversal, each frame also carries the position of its first token so far
+        stack = [[tree, [], None]]
+        while True:
+            frame = stack[-1]
+            subtree, children, pos = frame
+            if len(children) < len(subtree.children):
+                child = subtree.children[len(children)]
+                if isinstance(child, tree_type):
+                    stack.append([child, [], None])
+                    continue
+                if child is not None:  # token
+                    if pos is None:
+                        frame[2] = Position(child.line, child.column, None, None)
+                    child = str(child)
+                children.append(child)
+                continue
+
+            stack.pop()
+            callback = getattr(self, subtree.data, None)
+            if callback is None:
+                node = tree_type(subtree.data, children, pos)
+            else:
+                node = callback(pos, *children)
+            if not stack:
+                return node
+            parent = stack[-1]
+            parent[1].append(node)
+            if parent[2] is None:
+                parent[2] = pos
 
     # GLOBALS
     def root(self, meta, *globals):
+        return Program(self.make_root(meta, globals, main = not self.module), strict = self.strict, module = self.module,
+                       opt_level = self.opt_level, verify = self.verify)
+
+    @staticmethod
+    def make_root(meta, globals, main: bool = True):
+        if not main:
+            return Root(meta, NodeList(meta, tuple(globals), 'globals'))
         main_id = None
         for global_stmt in globals:
             if isinstance(global_stmt, FuncObj) and global_stmt.ident.ident_token == 'main':
@@ -47,11 +120,23 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
                 break
         else:
             raise ValueError('Can not find main!')
-        globals += (Call(meta, main_id, ()),)
-        return Program(Root(meta, NodeList(meta, globals, 'globals')))
+        globals = tuple(globals) + (Call(meta, main_id, ()),)
+        return Root(meta, NodeList(meta, globals, 'globals'))
 
     globals = make_collector('globals')
 
+    def import_name(self, meta, module, alias):
+        return Import(meta, module, alias and str(alias))
+
+    def import_from(self, meta, module, *imported):
+        return ImportFrom(meta, module, imported)
+
+    def imported(self, meta, name, alias):
+        return (str(name), alias and str(alias))
+
+    def module_path(self, meta, *names):
+        return tuple(str(name) for name in names)
+
     # STATEMENTS
     # control
     branch = make_collector(type_ = If)
@@ -62,10 +147,12 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
         else:
             assert supposition_kw == "if"
             true_cond = cond
-        meta.supposition_kw = supposition_kw
         return Branch(meta, true_cond, block, supposition_kw)
 
-    secondary_branch = lambda self, *args: self.primary_branch(*args)
+    secondary_branch = primary_branch
+
+    def else_branch(self, meta, block):
+        return Branch(meta, BoolLit(meta, 'true'), block, 'else')
 
     def loop(self, meta, loop_type, cond, body, else_block):
         if loop_type == 'until':
@@ -73,21 +160,26 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
         else:
             assert loop_type == 'while'
             true_cond = cond
-        meta.loop_type = loop_type
         return While(meta, true_cond, body, else_block)
 
+    def loop_else(self, meta, block):
+        return block
+
     def for_(self, meta, identifier, iterable, body, else_block):
         # need to implement else_block
-        assign_node = AssignDecl(meta, identifier, NumLit('0'), None, None, None)
-        cond = BinOp(meta, identifier, '!=', iterable)
-        inc = BinOp(meta, identifier, '+', NumLit('1'))
-        assign_node2 = Assign(meta, identifier, inc)
+        assign_node = AssignDecl(meta, ID(meta, identifier), Float(meta, '0'), None, None, None)
+        cond = BinOp(meta, Var(meta, identifier), '!=', iterable)
+        inc = BinOp(meta, Var(meta, identifier), '+', Float(meta, '1'))
+        assign_node2 = Assign(meta, Var(meta, identifier), inc)
         body.nodes += (assign_node2,)
         while_node = While(meta, cond, body, None)  # incorporate else_block some how
         return NodeList(meta, [assign_node, while_node], 'while')
 
     def return_stmt(self, meta, expr):
-        return ReturnStmt(meta, expr or None_(None))
+        return ReturnStmt(meta, expr)
+
+    def bare_return(self, meta):
+        return ReturnStmt(meta, None_(meta))
 
     # assignment
     def assign_decl(self, meta, declarations, exprs):
@@ -118,9 +210,12 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
             )
 
     # definition
-    def func_def(self, meta, ident, formals, ret_type, body):
-        #ic(ident, formals, ret_type, body)
-        return FuncObj(meta, ident, formals or NodeList(None, [], 'formals'), ret_type, body)
+    def func_def(self, meta, decorator, ret_type, ident, formals, body):
+        return FuncObj(meta, ident, formals or NodeList(meta, [], 'formals'), ret_type, body, decorator)
+
+    def decorator(self, meta, expr):
+        # the decorator's value is called with the definition, see Interpreter.visitFuncObj
+        return expr
 
     def float_num(self, meta, float_token):
         return Float(meta, float_token)
@@ -129,17 +224,25 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
         return Int(meta, int_token)
 
     def string(self, meta, str_token):
-        raise NotImplementedError
+        return StrLit(meta, str_token)
+
+    def true_lit(self, meta):
+        return BoolLit(meta, 'true')
+
+    def false_lit(self, meta):
+        return BoolLit(meta, 'false')
+
+    def none_lit(self, meta):
+        return None_(meta)
 
     def var(self, meta, ident_token):
         return Var(meta, ident_token)
 
     formals = make_collector('formals')
 
-    def formal(self, meta, type_node, id_node):
-        id_node.type = type_node.type
-        id_node.meta = meta
-        return id_node
+    def formal(self, meta, type_node, name):
+        # primitives are typed by their python type, everything else by its type node
+        return ID(meta, name, type = getattr(type_node, 'type', type_node))
 
     # scoping
     def block(self, meta, body):
@@ -156,30 +259,22 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
             obj_type.meta = meta
         return obj_type
 
-    def fn_type(self, meta, mutability_mod, scope_mod, formal_types, ret_type):
-        return FnType(meta, mutability_mod, scope_mod, ret_type, formal_types or [])
+    def fn_type(self, meta, formal_types, ret_type):
+        return FuncType(meta, list(formal_types or []), ret_type)
 
-    def anon_fn(self, meta, formals, ret_type, body):
-        fn = FnObj(
-            meta,
-            None,
-            None,
-            None,
-            None,
-            ret_type,
-            formals or NodeList(meta, [], 'formals'),
-            body
-        )
+    types = make_collector('types')
+
+    def class_type(self, meta, cls_name):
+        return ClassType(meta, str(cls_name))
 
-        fn.name = id(fn)  # this may be un-ideal
-        
-        return fn
+    def anon_fn(self, meta, formals, ret_type, body):
+        return FuncObj(meta, None, formals or NodeList(meta, [], 'formals'), ret_type, body)
 
     def cls_def(self, meta, decorator, generics, id_, inheritance, cls_assignments):
         # should prob break up static vars from methods
         for a in cls_assignments:
-            a.belongs_to = id_.name
-        return ClassObj(meta, decorator, generics, id_.name, inheritance, cls_assignments)
+            a.belongs_to = str(id_)
+        return ClassObj(meta, decorator, generics, str(id_), inheritance, cls_assignments)
 
     cls_stmts = make_collector('cls_stmts')
 
@@ -192,22 +287,17 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
         return SuperID(meta, '', ID(meta, args[0]), args)
 
     def method(self, meta, decorator, generics, mutability_mod, scope_mod, ret_type, identifier, formals, body):
-        method_obj = MethodObj(
+        return MethodObj(
             meta,
             decorator,
             generics,
             mutability_mod,
             scope_mod,
             ret_type,
+            identifier,
             formals or NodeList(meta, [], 'formals'),
             body
         )
-        method_obj.name = identifier.name
-        return method_obj # AssignDecl(meta, identifier, method_obj, None, None, None)
-
-    # TYPING
-    def var(self, meta, ident_token):
-        return Var(meta, ident_token)
 
     # EXPRESSIONS
     exprs = make_collector('exprs')
@@ -218,29 +308,19 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
         return inner
 
     # identifiers
-    def scoped_id(self, meta, *args):
-        # could compose this as chain of ID nodes..
-        joined = '.'.join(args[1:])
-        object = args[0]
+    def scoped_id(self, meta, object, name):
         if isinstance(object, (ThisID, SuperID)):
-            object.name = joined
-        else:
-            object = ID(meta, args[0])
-        return ScopedID(meta, joined, object, args)
+            object.name = str(name)
+        return ScopedID(meta, str(name), object, (object, name))
 
     def list_(self, meta, vals):
-        return Array(meta, vals)
-
-    def index(self, meta, idx):
-        raise NotImplementedError
-        # return Index(meta, idx)
+        return Array(meta, vals or NodeList(meta, [], 'values'))
 
-    def lval(self, meta, base, indexes):
-        return Index(meta, base, indexes)  # will need to adapt for calls later
+    def index(self, meta, base, idx):
+        return Index(meta, base, idx)
 
     # call
     def call(self, meta, ident, *actuals):
-        assert isinstance(ident, Var), ic(ident)
         return Call(meta, ident, actuals)
 
     arguments = make_collector('arguments')
@@ -261,5 +341,8 @@ class ASTBuilder(lark.visitors.Transformer_InPlaceRecursive):
     def negate(self, meta, val):
         return UnaryOp(meta, '-', val)
 
+    def l_not(self, meta, val):
+        return UnaryOp(meta, '!', val)
+
     def throw(self, meta, exception):
         return Throw(meta, exception)
\ No newline at end of file
@@ -1,4 +1,11 @@
 from core.visitors.semantics import SemanticAnalyzer
-from core.visitors.graph import GraphManager
 from core.visitors.unparse import Unparser
-from core.visitors.interpret import Interpreter
\ No newline at end of file
+from core.visitors.interpret import Interpreter
+
+
+def __getattr__(name):
+    # the graph visitor pulls in pydot, so it's only imported once something asks for it
+    if name == 'GraphManager':
+        from core.visitors.graph import GraphManager
+        return GraphManager
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,414 @@
+"""
+Compiles resolved ASTs to Python closures, which the ClosureEngine runs by calling them. Every
+node is turned into a closure once, specialized for its shape: what's known statically, like
+literals, the variables' depths and slots and the operators' evaluators, is captured, so running it doesn't
+dispatch on node types or look up resolutions, i.e. a BinOp of a local variable and a literal is
+a single closure reading the variable and applying the evaluator to it and the literal's value.
+
+Expressions are closures taking the environment they run in and returning their value.
+Statements return NEXT for the next statement to run, anything else is what a return in them
+returned, which every statement around them passes on to the function, so returning doesn't
+raise. Like for the bytecode compiler, functions are compiled on their first call.
+"""
+
+from core import nodes
+from core.runtime.callables import Cell, Frame, InternalCallable
+from core.runtime.engine import CompiledFunction
+from core.runtime.literals import InternalArray
+from core.visitors.compile import global_var, leaves_value
+from core.visitors.visitor import Visitor
+
+
+NEXT = object()  # what statements complete with when the statement after them runs next
+
+
+class Body:
+    """Compiled body of a function or of a module's globals."""
+    __slots__ = ('name', 'params', 'frame_size', 'run')
+
+    def __init__(self, name: str, params: tuple, frame_size: int, run) -> None:
+        self.name = name
+        self.params = params  # names of the formals, bound in order to the arguments, the frame's first slots
+        self.frame_size = frame_size
+        self.run = run  # environment -> what the body returned
+
+    def __repr__(self) -> str:
+        return f'<Body "{self.name}">'
+
+
+def block(stmts):
+    """Returns the statement running stmts in order, until one of them returns."""
+    if not stmts:
+        return lambda env: NEXT
+    if len(stmts) == 1:
+        return stmts[0]
+    if len(stmts) == 2:
+        first, second = stmts
+        def run_two(env):
+            result = first(env)
+            return second(env) if result is NEXT else result
+        return run_two
+
+    stmts = tuple(stmts)
+    def run_block(env):
+        for stmt in stmts:
+            result = stmt(env)
+            if result is not NEXT:
+                return result
+        return NEXT
+    return run_block
+
+
+class ClosureCompiler(Visitor):
+    def __init__(self, engine) -> None:
+        super().__init__()
+        self.engine = engine  # called by the closures, to call and make functions
+        self.locals = engine.interpreter.locals  # node -> (depth, slot), the resolutions of the Interpreter
+
+    def compile_function(self, fn_obj_node) -> Body:
+        body = self.walk(fn_obj_node.body)
+        params = tuple(formal.name for formal in fn_obj_node.formals)
+        if isinstance(fn_obj_node, nodes.MethodObj) and fn_obj_node.name == 'init':
+            def run_initializer(env):
+                result = body(env)
+                return env.enclosing.values[0] if result is NEXT else result  # this, the binding is one out
+            return Body(fn_obj_node.name, params, fn_obj_node.frame_size, run_initializer)
+
+        def run_function(env):
+            result = body(env)
+            return None if result is NEXT else result
+        return Body(fn_obj_node.name, params, fn_obj_node.frame_size, run_function)
+
+    def compile_globals(self, root_node, main: bool = True) -> Body:
+        return Body('globals', (), 0, self.walk(root_node, main))
+
+    def statement(self, node):
+        run = yield node
+        if not leaves_value(node):
+            return run
+        expr = run
+        def run_expr(env):
+            expr(env)
+            return NEXT
+        return run_expr
+
+    def local(self, node):
+        """Returns the slot of the variable node reads, when it's declared in the function reading it."""
+        if isinstance(node, nodes.Var):
+            resolution = self.locals.get(node)
+            if resolution is not None and resolution[0] == 0:
+                return resolution[1]
+        return None
+
+    def load(self, node, name: str):
+        resolution = self.locals.get(node)
+        if resolution is None:
+            var = global_var(node, name)
+            def load_global(env):
+                globals_ = env.globals
+                version, val = var.cached
+                if version != globals_.version:  # see Environment
+                    val = globals_.get(name)
+                    var.cached = (globals_.version, val)
+                return val
+            return load_global
+        depth, slot = resolution
+        if depth == 0:
+            def load_local(env):
+                val = env.values[slot]
+                return val.value if type(val) is Cell else val
+            return load_local
+        return lambda env: env.getAt(depth, slot)
+
+    def store_local(self, slot: int, rhs):
+        """Returns the statement setting a variable of the function running it, like Frame.assignAt."""
+        def store_local(env):
+            val = rhs(env)  # before looking at the variable, it could make a closure capturing it
+            values = env.values
+            cell = values[slot]
+            if type(cell) is Cell:
+                cell.value = val
+            else:
+                values[slot] = val
+            return NEXT
+        return store_local
+
+    def store(self, node, name: str, rhs):
+        resolution = self.locals.get(node)
+        if resolution is None:
+            def store_global(env):
+                env.globals.assign(name, rhs(env))
+                return NEXT
+            return store_global
+        depth, slot = resolution
+        if depth == 0:
+            return self.store_local(slot, rhs)
+        def store_at(env):
+            env.assignAt(depth, slot, rhs(env))
+            return NEXT
+        return store_at
+
+    def declare(self, node, name: str, rhs):
+        """Returns the statement setting what node declares, in its slot unless it's a global."""
+        resolution = self.locals.get(node)
+        if resolution is not None:
+            return self.store_local(resolution[1], rhs)
+        def define_global(env):
+            env.define(name, rhs(env))
+            return NEXT
+        return define_global
+
+    def visitRoot(self, root_node, main: bool = True):
+        *stmts, last = root_node.globals or (None,)
+        if not main or not isinstance(last, nodes.Call):
+            body = yield root_node.globals
+            def run_module(env):
+                body(env)
+                return None
+            return run_module
+        # the call to main the ASTBuilder appended, its result is the program's
+        compiled = []
+        for stmt in stmts:
+            compiled.append((yield from self.statement(stmt)))
+        body, call_main = block(compiled), (yield last)
+        def run_program(env):
+            body(env)
+            return call_main(env)
+        return run_program
+
+    def visitNodeList(self, node_list_node):
+        stmts = []
+        for node in node_list_node:
+            stmts.append((yield from self.statement(node)))
+        return block(stmts)
+
+    def visitLiteral(self, literal_node):
+        value = literal_node.value
+        return lambda env: value
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitVar(self, id_node):
+        return self.load(id_node, id_node.ident_token)
+
+    def visitThisID(self, this_id_node):
+        return self.load(this_id_node.object, 'this')
+
+    def visitSuperID(self, super_node):
+        super_at, this_at, name = self.locals[super_node.object], self.locals[super_node], super_node.name
+        return lambda env: env.getAt(*super_at).find_method(name).bind(env.getAt(*this_at))
+
+    def visitScopedID(self, id_node):
+        instance = yield id_node.object
+        if isinstance(id_node.object, nodes.SuperID):  # that already is the method
+            return instance
+        name = id_node.name
+        return lambda env: instance(env).get(name)
+
+    def visitUnaryOp(self, unary_node):
+        operand = yield unary_node.operand
+        evaluate = unary_node.evaluate
+        if evaluate is not None:
+            return lambda env: evaluate(operand(env))
+
+        def unary_op(env):
+            value = operand(env)
+            opd_type, evaluate = unary_node.seen
+            if type(value) is not opd_type:
+                evaluate = unary_node.respecialize(type(value))
+            return evaluate(value)
+        return unary_op
+
+    def visitBinOp(self, bin_op_node):
+        lhs = yield bin_op_node.lhs
+        rhs = yield bin_op_node.rhs
+        evaluate = bin_op_node.evaluate
+        if evaluate is None:
+            def bin_op(env):
+                lhs_value, rhs_value = lhs(env), rhs(env)
+                lhs_type, rhs_type, evaluate = bin_op_node.seen
+                if type(lhs_value) is not lhs_type or type(rhs_value) is not rhs_type:
+                    evaluate = bin_op_node.respecialize(type(lhs_value), type(rhs_value))
+                return evaluate(lhs_value, rhs_value)
+            return bin_op
+
+        slot = self.local(bin_op_node.lhs)
+        if isinstance(bin_op_node.rhs, nodes.Literal):
+            const = bin_op_node.rhs.value
+            if slot is not None:
+                def local_op_const(env):
+                    val = env.values[slot]
+                    return evaluate(val.value if type(val) is Cell else val, const)
+                return local_op_const
+            return lambda env: evaluate(lhs(env), const)
+        if isinstance(bin_op_node.lhs, nodes.Literal):
+            const = bin_op_node.lhs.value
+            return lambda env: evaluate(const, rhs(env))
+        return lambda env: evaluate(lhs(env), rhs(env))
+
+    def visitCall(self, call_node):
+        callee = yield call_node.ident
+        actuals = []
+        for actual in call_node.actuals:
+            actuals.append((yield actual))
+        engine = self.engine
+        function_code = engine.function_code
+
+        # compiled functions are run right away, the rest are called like the Interpreter calls them
+        if len(actuals) == 1:
+            actual, = actuals
+            def call_one(env):
+                fn, arg = callee(env), actual(env)
+                if type(fn) is not CompiledFunction:
+                    return fn(engine, arg)
+                code = fn.code or function_code(fn)
+                assert len(code.params) == 1
+                values = [arg]
+                values += [None] * (code.frame_size - 1)
+                return code.run(Frame(code.name, fn.closure, values))
+            return call_one
+
+        actuals = tuple(actuals)
+        def call(env):
+            fn = callee(env)
+            args = [actual(env) for actual in actuals]
+            if type(fn) is not CompiledFunction:
+                assert isinstance(fn, InternalCallable)
+                return fn(engine, *args)
+            code = fn.code or function_code(fn)
+            assert len(args) == len(code.params)
+            args += [None] * (code.frame_size - len(args))  # the formals are the first slots
+            return code.run(Frame(code.name, fn.closure, args))
+        return call
+
+    def visitArray(self, array_node):
+        values = []
+        for value in array_node.values:
+            values.append((yield value))
+        type_ = array_node.type
+        return lambda env: InternalArray([value(env) for value in values], type_)
+
+    def visitIndex(self, index_node):
+        base = yield index_node.base
+        idx = yield index_node.idx
+        return lambda env: base(env)[int(idx(env))]
+
+    def visitAssignDecl(self, ad_node):
+        rhs = yield ad_node.rhs
+        return self.declare(ad_node.lhs, ad_node.lhs.name, rhs)
+
+    def visitAssign(self, assign_node):
+        rhs = yield assign_node.rhs
+        if not isinstance(assign_node.lhs, nodes.Index):
+            return self.store(assign_node.lhs, assign_node.lhs.name, rhs)
+        base = yield assign_node.lhs.base
+        idx = yield assign_node.lhs.idx
+        def store_index(env):
+            val = rhs(env)
+            base(env)[int(idx(env))] = val
+            return NEXT
+        return store_index
+
+    def visitSetStmt(self, set_node):
+        instance = yield set_node.lhs.object
+        rhs = yield set_node.rhs
+        name = set_node.lhs.name
+        def set_field(env):
+            obj = instance(env)
+            obj.set(name, rhs(env))
+            return NEXT
+        return set_field
+
+    def visitIf(self, if_node):
+        branches = []
+        for branch in if_node.branch_seq:
+            cond = yield branch.cond
+            body = yield from self.statement(branch.body)
+            branches.append((cond, body))
+
+        if len(branches) == 1:
+            (cond, body), = branches
+            return lambda env: body(env) if cond(env) else NEXT
+
+        branches = tuple(branches)
+        def run_if(env):
+            for cond, body in branches:
+                if cond(env):
+                    return body(env)
+            return NEXT
+        return run_if
+
+    def visitWhile(self, while_node):
+        cond = yield while_node.condition
+        body = yield from self.statement(while_node.body)
+        def run_while(env):
+            while cond(env):
+                result = body(env)
+                if result is not NEXT:
+                    return result
+            return NEXT
+        return run_while
+
+    def visitReturn(self, return_node):
+        return (yield return_node.expr)  # what the statements around it pass on
+
+    def visitFuncObj(self, fn_def_node):
+        decorator = (yield fn_def_node.decorator) if fn_def_node.decorator is not None else None
+        name = fn_def_node.ident.ident_token if fn_def_node.ident else None
+        engine = self.engine
+
+        def make_function(env):
+            fn = engine.make_function(fn_def_node, env)
+            if decorator is not None:
+                decorate = decorator(env)
+                assert isinstance(decorate, InternalCallable)
+                fn = decorate(engine, fn)
+            return fn
+        return make_function if name is None else self.declare(fn_def_node.ident, name, make_function)
+
+    def visitClassObj(self, cls_obj_node):
+        inheritance = (yield cls_obj_node.inheritance) if cls_obj_node.inheritance else None
+        engine = self.engine
+        def make_class(env):
+            engine.make_class(cls_obj_node, inheritance(env) if inheritance else None, env)
+            return NEXT
+        return make_class
+
+    def visitImport(self, import_node):
+        engine = self.engine
+        def run_import(env):
+            env.define(import_node.name, engine.import_module(import_node))
+            return NEXT
+        return run_import
+
+    def visitImportFrom(self, import_node):
+        engine = self.engine
+        def run_import(env):
+            module = engine.import_module(import_node)
+            for name, alias in import_node.names:
+                env.define(alias or name, module.get(name))
+            return NEXT
+        return run_import
+
+    def visitTryCatch(self, try_catch):
+        try_body = yield from self.statement(try_catch.try_.body)
+        catch_body = yield from self.statement(try_catch.catch.body)
+        exception = try_catch.catch.exception
+        def run_try(env):
+            try:
+                return try_body(env)
+            except exception:
+                return catch_body(env)
+        return run_try
+
+    def visitThrow(self, throw_node):
+        exception = throw_node.exception
+        def throw(env):
+            raise exception
+        return throw
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
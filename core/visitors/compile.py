@@ -0,0 +1,240 @@
+"""
+Compiles resolved ASTs to the bytecode the VirtualMachine runs, see core.runtime.bytecode.
+
+Functions are compiled one at a time, on their first call, once the resolver is done with their
+body, so lazily resolved programs stay lazy. Nested functions aren't part of the code of the one
+they're in, it only makes them, their own code is compiled when they're first called too.
+
+Variables are looked up the way the Interpreter does, by the number of frames out the resolver
+found them and their slot there, so both run the same frames and closures. Globals are looked up
+through the inline cache of the Var reading them, shared with the Interpreter. Only statements leave
+nothing on the stack, expressions used as statements, i.e. calls, are popped.
+"""
+
+from core import nodes
+from core.runtime.bytecode import *
+from core.visitors.visitor import Visitor
+
+
+def global_var(node, name: str):
+    """Returns the Var whose inline cache looking name up in the globals goes through."""
+    # this outside of a method is looked up as a global too, which it never is
+    return node if isinstance(node, nodes.Var) else nodes.Var(node.meta, name)
+
+
+def leaves_value(node) -> bool:
+    """Returns if compiling node pushes a value, rather than only defining something."""
+    if isinstance(node, nodes.FuncObj):
+        return not node.ident
+    return isinstance(node, nodes.Expr) and not isinstance(node, nodes.ClassObj)
+
+
+class Compiler(Visitor):
+    def __init__(self, locals) -> None:
+        super().__init__()
+        self.locals = locals  # node -> (depth, slot), the resolutions of the Interpreter
+        self.instructions = []
+
+    def compile_function(self, fn_obj_node) -> Code:
+        self.instructions = []
+        self.walk(fn_obj_node.body)
+        # falling off the end returns none, or this from initializers, whose binding is one out
+        if isinstance(fn_obj_node, nodes.MethodObj) and fn_obj_node.name == 'init':
+            self.emit(LOAD_AT, (1, 0))
+        else:
+            self.emit(CONST, None)
+        self.emit(RETURN)
+        return Code(fn_obj_node.name, self.instructions, tuple(formal.name for formal in fn_obj_node.formals), fn_obj_node.frame_size)
+
+    def compile_globals(self, root_node, main: bool = True) -> Code:
+        """Compiles the globals of a program, returning what its call to main does, or of a module."""
+        self.instructions = []
+        self.walk(root_node, main)
+        self.emit(RETURN)
+        return Code('globals', self.instructions)
+
+    def emit(self, op: int, arg = None) -> int:
+        self.instructions += (op, arg)
+        return len(self.instructions) - 2
+
+    def label(self) -> int:
+        return len(self.instructions)
+
+    def patch(self, pc: int, target: int = None):
+        """Points the jump at pc to target, by default to the next instruction emitted."""
+        self.instructions[pc + 1] = self.label() if target is None else target
+
+    def statement(self, node):
+        yield node
+        if leaves_value(node):
+            self.emit(POP)
+
+    def load(self, node, name: str):
+        resolution = self.locals.get(node)
+        if resolution is None:
+            self.emit(LOAD_GLOBAL, global_var(node, name))
+        elif resolution[0] == 0:
+            self.emit(LOAD_LOCAL, resolution[1])
+        else:
+            self.emit(LOAD_AT, resolution)
+
+    def store(self, node, name: str):
+        resolution = self.locals.get(node)
+        if resolution is None:
+            self.emit(STORE_GLOBAL, name)
+        elif resolution[0] == 0:
+            self.emit(STORE_LOCAL, resolution[1])
+        else:
+            self.emit(STORE_AT, resolution)
+
+    def declare(self, node, name: str):
+        resolution = self.locals.get(node)
+        if resolution is None:  # a global
+            self.emit(DEFINE, name)
+        else:
+            self.emit(STORE_LOCAL, resolution[1])
+
+    def visitRoot(self, root_node, main: bool = True):
+        *stmts, last = root_node.globals or (None,)
+        if not main or not isinstance(last, nodes.Call):
+            yield root_node.globals
+            self.emit(CONST, None)
+            return
+        # the call to main the ASTBuilder appended, its result is the program's
+        for stmt in stmts:
+            yield from self.statement(stmt)
+        yield last
+
+    def visitNodeList(self, node_list_node):
+        for node in node_list_node:
+            yield from self.statement(node)
+
+    def visitLiteral(self, literal_node):
+        self.emit(CONST, literal_node.value)
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitVar(self, id_node):
+        self.load(id_node, id_node.ident_token)
+
+    def visitThisID(self, this_id_node):
+        self.load(this_id_node.object, 'this')
+
+    def visitSuperID(self, super_node):
+        self.emit(LOAD_SUPER, (self.locals[super_node.object], self.locals[super_node], super_node.name))
+
+    def visitScopedID(self, id_node):
+        yield id_node.object
+        if not isinstance(id_node.object, nodes.SuperID):  # that already is the method
+            self.emit(GET_FIELD, id_node.name)
+
+    def visitUnaryOp(self, unary_node):
+        yield unary_node.operand
+        if unary_node.evaluate is not None:
+            self.emit(UNARY_STATIC, unary_node.evaluate)
+        else:
+            self.emit(UNARY, unary_node)
+
+    def visitBinOp(self, bin_op_node):
+        yield bin_op_node.lhs
+        yield bin_op_node.rhs
+        if bin_op_node.evaluate is not None:
+            self.emit(BINARY_STATIC, bin_op_node.evaluate)
+        else:
+            self.emit(BINARY, bin_op_node)
+
+    def visitCall(self, call_node):
+        yield call_node.ident
+        for actual in call_node.actuals:
+            yield actual
+        self.emit(CALL, len(call_node.actuals))
+
+    def visitArray(self, array_node):
+        for value in array_node.values:
+            yield value
+        self.emit(BUILD_ARRAY, (len(array_node.values), array_node.type))
+
+    def visitIndex(self, index_node):
+        yield index_node.base
+        yield index_node.idx
+        self.emit(INDEX)
+
+    def visitAssignDecl(self, ad_node):
+        yield ad_node.rhs
+        self.declare(ad_node.lhs, ad_node.lhs.name)
+
+    def visitAssign(self, assign_node):
+        yield assign_node.rhs
+        if isinstance(assign_node.lhs, nodes.Index):
+            yield assign_node.lhs.base
+            yield assign_node.lhs.idx
+            self.emit(STORE_INDEX)
+        else:
+            self.store(assign_node.lhs, assign_node.lhs.name)
+
+    def visitSetStmt(self, set_node):
+        yield set_node.lhs.object
+        yield set_node.rhs
+        self.emit(SET_FIELD, set_node.lhs.name)
+
+    def visitIf(self, if_node):
+        ends = []
+        for branch in if_node.branch_seq:
+            yield branch.cond
+            skip = self.emit(JUMP_IF_FALSE)
+            yield from self.statement(branch.body)
+            ends.append(self.emit(JUMP))
+            self.patch(skip)
+        for end in ends:
+            self.patch(end)
+
+    def visitWhile(self, while_node):
+        start = self.label()
+        yield while_node.condition
+        done = self.emit(JUMP_IF_FALSE)
+        yield from self.statement(while_node.body)
+        self.emit(JUMP, start)
+        self.patch(done)
+
+    def visitReturn(self, return_node):
+        yield return_node.expr
+        self.emit(RETURN)
+
+    def visitFuncObj(self, fn_def_node):
+        self.emit(MAKE_FUNCTION, fn_def_node)
+        if fn_def_node.decorator is not None:
+            yield fn_def_node.decorator
+            self.emit(DECORATE)
+        if fn_def_node.ident:
+            self.declare(fn_def_node.ident, fn_def_node.ident.ident_token)
+
+    def visitClassObj(self, cls_obj_node):
+        if cls_obj_node.inheritance:
+            yield cls_obj_node.inheritance
+        else:
+            self.emit(CONST, None)
+        self.emit(MAKE_CLASS, cls_obj_node)
+
+    def visitImport(self, import_node):
+        self.emit(IMPORT, import_node)
+
+    def visitImportFrom(self, import_node):
+        self.emit(IMPORT_FROM, import_node)
+
+    def visitTryCatch(self, try_catch):
+        handler = self.emit(SETUP_TRY)
+        yield from self.statement(try_catch.try_.body)
+        self.emit(POP_TRY)
+        end = self.emit(JUMP)
+        self.patch(handler)
+        yield from self.statement(try_catch.catch.body)
+        self.patch(end)
+
+    def visitThrow(self, throw_node):
+        self.emit(THROW, throw_node.exception)
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
@@ -0,0 +1,144 @@
+"""
+Evaluates pure expressions repeated within a run of statements once, into a variable the
+repetitions then read.
+
+Runs are the simple statements of a block between compound ones (ifs, loops, try blocks...),
+whose expressions are evaluated in order. Two occurrences of an expression are the same value
+when nothing between them changes what it reads: an assignment to a variable it reads, a write
+to a field or array element when it reads those, or a call, after which fields, array elements,
+variables from outside the function and the ones its closures assign can all be different.
+
+The variable is declared right before the statement with the first occurrence, which only
+evaluates pure expressions before it, so it's still the first thing with an effect to run.
+An expression is only replaced when that saves evaluating nodes: a declaration and a read per
+occurrence cost about what evaluating a small expression twice does.
+"""
+
+from core import nodes
+from core.nodes.node import count_nodes, iter_nodes
+from core.visitors.effects import reads, expr_key
+from core.visitors.rewrite import Rewriter, child_slots, get_child, set_child, statements
+
+
+SIMPLE_STATEMENTS = (nodes.AssignDecl, nodes.Assign, nodes.SetStmt, nodes.ReturnStmt, nodes.Call)
+EXPRESSIONS = (nodes.BinOp, nodes.UnaryOp, nodes.ScopedID, nodes.Index)
+
+
+class CSEStats:
+    __slots__ = ('num_expressions', 'num_replaced', 'num_removed')
+
+    def __init__(self) -> None:
+        self.num_expressions = 0
+        self.num_replaced = 0
+        self.num_removed = 0  # nodes
+
+    def __str__(self) -> str:
+        return f'{self.num_replaced} occurrences of {self.num_expressions} expressions replaced'
+
+
+class Occurrence:
+    __slots__ = ('node', 'parent', 'field', 'stmt', 'after_call')
+
+    def __init__(self, node, parent, field, stmt: int, after_call: bool) -> None:
+        self.node = node
+        self.parent = parent
+        self.field = field
+        self.stmt = stmt  # index of its statement in the block
+        self.after_call = after_call  # if its statement calls something before evaluating it
+
+
+class CommonSubexpressionEliminator(Rewriter):
+    prefix = 'cse'
+
+    def __init__(self, interpreter) -> None:
+        super().__init__(interpreter)
+        self.stats = CSEStats()
+
+    def run(self, node: nodes.ASTNode):
+        self.walk(node)
+        return self.stats
+
+    def evaluation(self, stmt):
+        """Yields (parent, field, node) for what stmt evaluates, each after what it contains, i.e. in the order they finish."""
+        stack = [(None, None, stmt, False)]
+        while stack:
+            parent, field, node, visited = stack.pop()
+            if visited:
+                yield parent, field, node
+                continue
+            stack.append((parent, field, node, True))
+            if isinstance(node, (nodes.FuncObj, nodes.ClassObj)):
+                continue
+            stack += ((slot_parent, slot_field, get_child(slot_parent, slot_field), False)
+                      for slot_parent, slot_field in reversed(list(child_slots(node))))
+
+    def available(self, stmts):
+        """Returns the groups of occurrences of an expression with nothing changing its value in between."""
+        locals = self.interpreter.locals
+        open_groups, groups = {}, []
+        reads_of = {}  # key -> (names, memory)
+
+        def kill(changed):
+            for key in [key for key in open_groups if changed(*reads_of[key])]:
+                groups.append(open_groups.pop(key))
+
+        for i, stmt in enumerate(stmts):
+            if not isinstance(stmt, SIMPLE_STATEMENTS):
+                kill(lambda names, memory: True)
+                continue
+            called = False
+            for parent, field, node in self.evaluation(stmt):
+                if isinstance(node, EXPRESSIONS) and parent is not None:
+                    key = expr_key(node, locals)
+                    if key is not None:
+                        if key not in reads_of:
+                            reads_of[key] = reads(node)
+                        open_groups.setdefault(key, []).append(Occurrence(node, parent, field, i, called))
+                elif isinstance(node, nodes.Call):
+                    called = True
+                    captured = self.function.captured
+                    kill(lambda names, memory: memory or any(self.scopes.depth(name) != 0 or name in captured for name in names))
+            if isinstance(stmt, (nodes.AssignDecl, nodes.Assign)) and not isinstance(stmt.lhs, nodes.Index):
+                kill(lambda names, memory: stmt.lhs.name in names)
+            elif isinstance(stmt, (nodes.Assign, nodes.SetStmt)):
+                kill(lambda names, memory: memory)
+        groups += open_groups.values()
+        return [group for group in groups if len(group) > 1]
+
+    def rewrite_block(self, block):
+        stmts = statements(block)
+        groups = self.available(stmts)
+        if not groups:
+            return block
+
+        # the largest first, the ones in them are gone once they're replaced
+        sized = sorted(((count_nodes(group[0].node), group) for group in groups), key = lambda sized: -sized[0])
+        replaced = set()  # ids of the nodes in replaced occurrences
+        decls = {}  # statement index -> declarations to put before it
+        num_nodes = count_nodes(block)
+        for size, group in sized:
+            group = [occurrence for occurrence in group if id(occurrence.node) not in replaced]
+            while group and group[0].after_call:
+                group.pop(0)
+            if len(group) < 2 or (len(group) - 1) * (size - 1) <= 2:
+                continue
+            first = group[0]
+            decl = self.declare_temp(first.node.meta, first.node)
+            decls.setdefault(first.stmt, []).append(decl)
+            for occurrence in group:
+                replaced.update(id(node) for node in iter_nodes(occurrence.node))
+                if occurrence is not first:
+                    self.drop(occurrence.node)
+                set_child(occurrence.parent, occurrence.field, self.read_temp(occurrence.node.meta, decl.lhs.name))
+            self.stats.num_expressions += 1
+            self.stats.num_replaced += len(group)
+        if not decls:
+            return block
+
+        rewritten = []
+        for i, stmt in enumerate(stmts):
+            rewritten += decls.get(i, ())
+            rewritten.append(stmt)
+        block.nodes = type(block.nodes)(rewritten)
+        self.stats.num_removed += num_nodes - count_nodes(block)
+        return block
@@ -0,0 +1,128 @@
+"""
+What evaluating an expression can do, for the passes that move, duplicate or merge expressions.
+
+Pure expressions have no side effects: literals, variables, this, operators, and field and index
+reads. They can still raise, i.e. on a division by zero, and what they read can change between
+two evaluations, which is for each pass to rule out. Calls are never pure here, even to pure
+builtins, since whether a name is the builtin depends on the scopes at the call.
+"""
+
+from core import nodes
+from core.visitors.fold import make_literal
+
+
+def is_pure(node) -> bool:
+    """Returns if evaluating node can't have side effects."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (nodes.Literal, nodes.Var, nodes.ThisID)):
+            continue
+        elif isinstance(node, nodes.BinOp):
+            stack += (node.lhs, node.rhs)
+        elif isinstance(node, nodes.UnaryOp):
+            stack.append(node.operand)
+        elif isinstance(node, nodes.ScopedID) and not isinstance(node.object, nodes.SuperID):
+            stack.append(node.object)
+        elif isinstance(node, nodes.Index):
+            stack += (node.base, node.idx)
+        else:
+            return False
+    return True
+
+
+def is_trivial(node) -> bool:
+    """Returns if node is as cheap to evaluate as a variable holding its value."""
+    return isinstance(node, (nodes.Literal, nodes.Var, nodes.ThisID))
+
+
+def children(node):
+    """The operands of a pure expression, in the order they're evaluated."""
+    if isinstance(node, nodes.BinOp):
+        return (node.lhs, node.rhs)
+    elif isinstance(node, nodes.UnaryOp):
+        return (node.operand,)
+    elif isinstance(node, nodes.ScopedID):
+        return (node.object,)
+    elif isinstance(node, nodes.Index):
+        return (node.base, node.idx)
+    return ()
+
+
+def reads(node):
+    """Returns the names a pure expression reads and if it reads fields or array elements."""
+    names, memory = set(), False
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, nodes.Var):
+            names.add(node.ident_token)
+        elif isinstance(node, (nodes.ScopedID, nodes.Index)):
+            memory = True
+        stack += children(node)
+    return names, memory
+
+
+def expr_key(node, locals):
+    """
+    Returns a key equal for pure expressions that evaluate to the same value when nothing they
+    read changes in between, None for other nodes. Variables are told apart by where they
+    resolve, so expressions from different functions don't compare equal.
+    """
+    keys, stack = {}, [(node, False)]
+    while stack:
+        node, visited = stack.pop()
+        if isinstance(node, nodes.Literal):
+            keys[id(node)] = (type(node).__name__, node.value)
+        elif isinstance(node, nodes.Var):
+            keys[id(node)] = ('var', node.ident_token, locals.get(node))
+        elif isinstance(node, nodes.ThisID):
+            keys[id(node)] = ('this', locals.get(node.object))
+        elif not visited:
+            if not isinstance(node, (nodes.BinOp, nodes.UnaryOp, nodes.ScopedID, nodes.Index)):
+                return None
+            if isinstance(node, nodes.ScopedID) and isinstance(node.object, nodes.SuperID):
+                return None
+            stack.append((node, True))
+            stack += ((child, False) for child in children(node))
+        else:
+            operands = tuple(keys[id(child)] for child in children(node))
+            label = node.name if isinstance(node, nodes.ScopedID) else getattr(node, 'op_str', 'index')
+            keys[id(node)] = (type(node).__name__, label, operands)
+    return keys[id(node)]
+
+
+def copy_expr(node, locals):
+    """Returns a copy of a pure expression, resolved the same way as the original."""
+    copies, stack = {}, [(node, False)]
+    while stack:
+        node, visited = stack.pop()
+        if isinstance(node, nodes.Literal):
+            copies[id(node)] = make_literal(node.meta, node.value)
+        elif isinstance(node, nodes.Var):
+            copy = copies[id(node)] = nodes.Var(node.meta, node.ident_token)
+            if node in locals:
+                locals[copy] = locals[node]
+        elif isinstance(node, nodes.ThisID):
+            copy = copies[id(node)] = nodes.ThisID(node.meta, node.name, nodes.ID(node.object.meta, 'this'), node.components)
+            if node.object in locals:
+                locals[copy.object] = locals[node.object]
+        elif not visited:
+            stack.append((node, True))
+            stack += ((child, False) for child in children(node))
+        else:
+            operands = [copies[id(child)] for child in children(node)]
+            if isinstance(node, nodes.BinOp):
+                copy = nodes.BinOp(node.meta, operands[0], node.op_str, operands[1])
+                if node.operand_types:
+                    copy.set_operand_types(*node.operand_types)
+            elif isinstance(node, nodes.UnaryOp):
+                copy = nodes.UnaryOp(node.meta, node.op_str, operands[0])
+                if node.operand_type:
+                    copy.set_operand_type(node.operand_type)
+            elif isinstance(node, nodes.ScopedID):
+                copy = nodes.ScopedID(node.meta, node.name, operands[0], (operands[0], node.name))
+            else:
+                copy = nodes.Index(node.meta, *operands)
+            copies[id(node)] = copy
+    return copies[id(node)]
@@ -0,0 +1,319 @@
+"""
+Folds constant expressions once the program is resolved, so they aren't evaluated every time
+they run.
+
+- operations on literals are evaluated with the casts the interpreter would use
+- reads of const bindings initialized to a literal are replaced with the literal
+- calls to pure builtins, i.e. hex and bin, on literals are evaluated
+
+Anything that fails to evaluate, like a division by zero, is left for the interpreter to report
+when it runs. Every visit returns the node that takes the visited node's place, which is the node
+itself unless it was folded.
+
+Bodies still deferred when the program is built are folded once they're resolved, against the
+globals declared before them, like they would have been.
+"""
+
+import math
+
+from core import nodes
+from core.diagnostics import Diagnostic, ResolutionError, ERROR
+from core.nodes.node import count_nodes
+from core.runtime.builtins import BuiltinCallable
+from core.visitors.semantics import ScopeStack
+from core.visitors.visitor import Visitor
+
+
+# what names are bound to besides literals, builtins are bound to True by the ScopeStack
+VARIABLE = False
+CONSTANT = 'const'  # const whose value isn't known statically
+
+PURE_BUILTINS = {builtin.name: builtin for builtin in BuiltinCallable.registered.values() if builtin.pure}
+
+
+def make_literal(meta, value):
+    """Returns the literal node for value, None if it can't be written as one."""
+    if value is None:
+        return nodes.None_(meta)
+    elif type(value) is bool:
+        return nodes.BoolLit(meta, 'true' if value else 'false')
+    elif type(value) is int:
+        return nodes.Int(meta, value)
+    elif type(value) is float and math.isfinite(value):
+        return nodes.Float(meta, value)
+    elif type(value) is str:
+        return nodes.StrLit(meta, f'"{value}"')
+    return None
+
+
+class FoldStats:
+    __slots__ = ('num_operations', 'num_calls', 'num_propagated', 'num_removed')
+
+    def __init__(self) -> None:
+        self.num_operations = 0
+        self.num_calls = 0
+        self.num_propagated = 0
+        self.num_removed = 0  # nodes the folded expressions had beyond the literal replacing them
+
+    def __str__(self) -> str:
+        return f'{self.num_operations} operations, {self.num_calls} builtin calls and {self.num_propagated} const reads folded'
+
+
+class ConstantFolder(Visitor):
+    def __init__(self, interpreter) -> None:
+        super().__init__()
+        self.scopes = ScopeStack()
+        self.interpreter = interpreter
+        self.diagnostics = []
+        self.declared = None  # deferred function -> how many globals are bound before it, for the ones folded later
+        self.positions = None  # global -> how many were bound before it
+        self.visible = None  # globals the function folded later sees, None when they all are
+        self.stats = FoldStats()
+
+    def run(self, node: nodes.ASTNode):
+        self.walk(node)
+        return self.finish()
+
+    def run_deferred(self, root_node, fn_obj_node):
+        """Folds the body of a function of root_node deferred when it was built, once it's resolved."""
+        if self.declared is None:
+            self.declared = {}
+            for node in root_node.globals:
+                self.bind_global(node)
+            self.positions = {name: i for i, name in enumerate(self.scopes.top)}
+        self.visible = self.declared.get(fn_obj_node)
+        try:
+            self.drive(self.fold_function(fn_obj_node))
+        finally:
+            self.visible = None
+        return self.finish()
+
+    def finish(self):
+        errors = [diagnostic for diagnostic in self.diagnostics if diagnostic.severity == ERROR]
+        self.diagnostics = []
+        if errors:
+            raise ResolutionError(errors)
+        return self.stats
+
+    def bind_global(self, node):
+        """Binds a global the way visiting it does, without visiting the bodies, they're already folded or still deferred."""
+        if isinstance(node, nodes.NodeList):  # let with several identifiers
+            for decl in node:
+                self.bind_global(decl)
+        elif isinstance(node, nodes.AssignDecl):
+            self.bind_decl(node)
+        elif isinstance(node, nodes.FuncObj):
+            if node.ident:
+                self.scopes.bind(node.ident.ident_token, VARIABLE)
+            self.declared[node] = len(self.scopes.top)
+        elif isinstance(node, nodes.ClassObj):
+            self.scopes.bind(node.name, VARIABLE)
+            for method in node.body:
+                if isinstance(method, nodes.MethodObj):
+                    self.declared[method] = len(self.scopes.top)
+        elif isinstance(node, nodes.Import):
+            self.scopes.bind(node.name, VARIABLE)
+        elif isinstance(node, nodes.ImportFrom):
+            for name, alias in node.names:
+                self.scopes.bind(alias or name, VARIABLE)
+
+    def bind_decl(self, ad_node):
+        if ad_node.mutability == 'const':
+            self.scopes.bind(ad_node.lhs.name, ad_node.rhs if isinstance(ad_node.rhs, nodes.Literal) else CONSTANT)
+        else:
+            self.scopes.bind(ad_node.lhs.name, VARIABLE)
+
+    def lookup(self, name: str):
+        """Returns what name is bound to where it's read, like ScopeStack.lookup."""
+        if self.visible is not None and self.scopes.depth(name) is None and self.positions.get(name, 0) >= self.visible:
+            return None  # a global declared after the function being folded
+        return self.scopes.lookup(name)
+
+    def report(self, code: str, message: str, node, severity: str = ERROR):
+        self.diagnostics.append(Diagnostic(severity, code, message, node, self.scopes.function_name))
+
+    def replace(self, node, value):
+        literal = make_literal(node.meta, value)
+        if literal is not None:
+            self.stats.num_removed += count_nodes(node) - 1
+        return literal
+
+    def is_const(self, name: str) -> bool:
+        binding = self.lookup(name)
+        return binding is CONSTANT or isinstance(binding, nodes.Literal)
+
+    def fold_function(self, fn_obj_node):
+        if fn_obj_node in self.interpreter.deferred:
+            return  # folded once it's resolved, see run_deferred
+        with self.scopes.enter_new(fn_obj_node.name):
+            for formal in fn_obj_node.formals:
+                self.scopes.bind(formal.name, VARIABLE)
+            fn_obj_node.body = yield fn_obj_node.body
+
+    def visitRoot(self, root_node):
+        root_node.globals = yield root_node.globals
+        return root_node
+
+    def visitNodeList(self, node_list_node):
+        folded = list(node_list_node.nodes)
+        for i, node in enumerate(folded):
+            folded[i] = yield node
+        node_list_node.nodes = type(node_list_node.nodes)(folded)
+        return node_list_node
+
+    def visitAssignDecl(self, ad_node):
+        ad_node.rhs = yield ad_node.rhs
+        self.bind_decl(ad_node)
+        return ad_node
+
+    def visitAssign(self, assign_node):
+        assign_node.rhs = yield assign_node.rhs
+        if isinstance(assign_node.lhs, nodes.Index):
+            assign_node.lhs = yield assign_node.lhs
+        elif self.is_const(assign_node.lhs.name):
+            # propagated reads would otherwise keep the old value
+            self.report('const-assign', f'can not assign to const "{assign_node.lhs.name}"', assign_node)
+        return assign_node
+
+    def visitSetStmt(self, set_node):
+        set_node.rhs = yield set_node.rhs
+        set_node.lhs = yield set_node.lhs
+        return set_node
+
+    def visitVar(self, var_node):
+        binding = self.lookup(var_node.ident_token)
+        if not isinstance(binding, nodes.Literal):
+            return var_node
+        self.stats.num_propagated += 1
+        self.interpreter.locals.pop(var_node, None)  # never looked up anymore
+        return make_literal(var_node.meta, binding.value)
+
+    def visitScopedID(self, id_node):
+        id_node.object = yield id_node.object
+        return id_node
+
+    def visitThisID(self, this_id_node):
+        return this_id_node
+
+    def visitSuperID(self, super_id_node):
+        return super_id_node
+
+    def visitFuncObj(self, fn_obj_node):
+        if fn_obj_node.ident:
+            self.scopes.bind(fn_obj_node.ident.ident_token, VARIABLE)
+        yield from self.fold_function(fn_obj_node)
+        return fn_obj_node
+
+    def visitClassObj(self, cls_obj_node):
+        self.scopes.bind(cls_obj_node.name, VARIABLE)
+        if cls_obj_node.inheritance:
+            cls_obj_node.inheritance = yield cls_obj_node.inheritance
+        for method in cls_obj_node.body:
+            if isinstance(method, nodes.MethodObj):
+                yield from self.fold_function(method)
+        return cls_obj_node
+
+    def visitImport(self, import_node):
+        self.scopes.bind(import_node.name, VARIABLE)
+        return import_node
+
+    def visitImportFrom(self, import_node):
+        for name, alias in import_node.names:
+            self.scopes.bind(alias or name, VARIABLE)
+        return import_node
+
+    def visitIf(self, if_node):
+        for branch in if_node.branch_seq:
+            branch.cond = yield branch.cond
+            branch.body = yield branch.body
+        return if_node
+
+    def visitWhile(self, while_node):
+        while_node.condition = yield while_node.condition
+        while_node.body = yield while_node.body
+        return while_node
+
+    def visitReturn(self, return_node):
+        return_node.expr = yield return_node.expr
+        return return_node
+
+    def visitBinOp(self, bin_op_node):
+        bin_op_node.lhs = yield bin_op_node.lhs
+        bin_op_node.rhs = yield bin_op_node.rhs
+        lhs, rhs = bin_op_node.lhs, bin_op_node.rhs
+        if isinstance(lhs, nodes.Literal) and isinstance(rhs, nodes.Literal):
+            try:
+                evaluate = bin_op_node.specialize(bin_op_node.op_str, type(lhs.value), type(rhs.value))
+                literal = self.replace(bin_op_node, evaluate(lhs.value, rhs.value))
+            except (TypeError, ValueError, ArithmeticError):
+                literal = None
+            if literal is not None:
+                self.stats.num_operations += 1
+                return literal
+        if bin_op_node.evaluate is None and (bin_op_node.op_str, lhs.type, rhs.type) in bin_op_node.type_resolutions:
+            # operands folded to literals have static types the resolver didn't know about
+            bin_op_node.set_operand_types(lhs.type, rhs.type)
+        return bin_op_node
+
+    def visitUnaryOp(self, un_op_node):
+        un_op_node.operand = yield un_op_node.operand
+        operand = un_op_node.operand
+        if isinstance(operand, nodes.Literal):
+            try:
+                evaluate = un_op_node.specialize(un_op_node.op_str, type(operand.value))
+                literal = self.replace(un_op_node, evaluate(operand.value))
+            except (TypeError, ValueError, ArithmeticError):
+                literal = None
+            if literal is not None:
+                self.stats.num_operations += 1
+                return literal
+        if un_op_node.evaluate is None and (un_op_node.op_str, operand.type) in un_op_node.type_resolutions:
+            un_op_node.set_operand_type(operand.type)
+        return un_op_node
+
+    def visitCall(self, call_node):
+        call_node.ident = yield call_node.ident
+        call_node.actuals = yield call_node.actuals
+        ident = call_node.ident
+        if not isinstance(ident, nodes.Var) or ident.ident_token not in PURE_BUILTINS:
+            return call_node
+        if self.lookup(ident.ident_token) is not True:  # shadowed
+            return call_node
+        if not all(isinstance(actual, nodes.Literal) for actual in call_node.actuals):
+            return call_node
+        try:
+            literal = self.replace(call_node, PURE_BUILTINS[ident.ident_token](self.interpreter, *(actual.value for actual in call_node.actuals)))
+        except Exception:  # left for the interpreter to report
+            return call_node
+        if literal is None:
+            return call_node
+        self.stats.num_calls += 1
+        return literal
+
+    def visitLiteral(self, literal_node):
+        return literal_node
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
+
+    def visitArray(self, array_node):
+        array_node.values = yield array_node.values
+        return array_node
+
+    def visitIndex(self, index_node):
+        index_node.idx = yield index_node.idx
+        index_node.base = yield index_node.base
+        return index_node
+
+    def visitTryCatch(self, tc_node):
+        tc_node.try_.body = yield tc_node.try_.body
+        tc_node.catch.body = yield tc_node.catch.body
+        return tc_node
+
+    def visitThrow(self, throw_node):
+        return throw_node
@@ -0,0 +1,550 @@
+"""
+Inlines calls to small functions and methods, so they don't pay for a call, a frame and a
+return every time.
+
+A function can be inlined when its body is a single return of an expression over its formals and
+literals, i.e. "num sq(num x) { return x * x }", and methods may read this and its fields too.
+Calls to pure builtins and to other inlinable functions can be part of the expression, the calls
+in a body are inlined before deciding on it, so a function calling itself, directly or not, is
+never inlined. Expressions over the threshold's number of nodes are left as calls.
+
+A call is only inlined when its callee is known statically, which is the case for
+- global functions nothing assigns to and nothing decorates, called by their name
+- methods called on this, which no subclass of the class overrides, wherever it's declared, and
+  no field shadows
+
+and its arguments can't have side effects. They can still raise though, so each one has to be
+evaluated once and in order: the ones that aren't literals or variables are put in place of the
+formals when the expression reads each of them once, in the order they're passed, otherwise
+they're bound to temporaries declared right before the statement the call is in. That's only
+done when the statement evaluates nothing but variables and literals before them, the call is
+left as it is otherwise. Since the inlined expression only sees the arguments, the caller's
+closure and this are what they were.
+
+Bodies still deferred when the program is built are inlined into once they're resolved. What's
+known statically depends on every body though, what they assign and which classes they declare,
+so the first call considered walks all of them once.
+"""
+
+from collections import Counter
+
+from core import nodes
+from core.nodes.node import count_nodes, iter_nodes
+from core.visitors.effects import children, is_pure, is_trivial
+from core.visitors.fold import ConstantFolder, PURE_BUILTINS, make_literal
+from core.visitors.semantics import ScopeStack
+from core.visitors.visitor import Visitor
+
+
+INLINE_THRESHOLD = 24  # nodes in an inlined expression
+MAX_NESTING = 16  # callees analyzed while analyzing a callee, deeper ones aren't inlined
+
+INLINING = 'inlining'  # state of a function whose body is being inlined into, calling it is recursion
+
+
+def returns_expr(fn_obj) -> bool:
+    """If the body of fn_obj is a single return, the only kind that can be inlined."""
+    body = fn_obj.body
+    return len(body) == 1 and isinstance(body[0], nodes.ReturnStmt)
+
+
+def in_order(expr):
+    """Yields the nodes of an expression that can be inlined, in the order they're evaluated."""
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, nodes.Call):
+            stack += reversed(list(node.actuals))
+            stack.append(node.ident)
+        else:
+            stack += reversed(children(node))
+
+
+def leading_calls(stmt):
+    """
+    Returns the ids of the calls stmt evaluates the arguments of first, after nothing but
+    variables and literals, i.e. f in "let y = f(a[i])". Evaluating their arguments right before
+    stmt doesn't change what they're evaluated after.
+    """
+    if isinstance(stmt, (nodes.AssignDecl, nodes.Assign)):
+        stack = [stmt.rhs]
+    elif isinstance(stmt, nodes.SetStmt):
+        stack = [stmt.rhs, stmt.lhs.object]
+    elif isinstance(stmt, nodes.ReturnStmt):
+        stack = [stmt.expr]
+    elif isinstance(stmt, nodes.If):
+        stack = [next(iter(stmt.branch_seq)).cond]  # the only condition always evaluated
+    elif isinstance(stmt, nodes.Call):
+        stack = [stmt]
+    else:
+        return set()
+
+    leading = set()
+    while stack:
+        node = stack.pop()
+        if is_trivial(node):
+            continue
+        elif isinstance(node, nodes.Call) and (is_trivial(node.ident) or (isinstance(node.ident, nodes.ScopedID) and isinstance(node.ident.object, nodes.ThisID))):
+            leading.add(id(node))
+            stack.append(None)  # the call itself
+            stack += reversed(list(node.actuals))
+        elif isinstance(node, (nodes.BinOp, nodes.UnaryOp, nodes.ScopedID, nodes.Index)):
+            stack.append(None)  # the operation itself
+            stack += reversed(children(node))
+        else:
+            break  # everything after it is evaluated after something that can raise or have effects
+    return leading
+
+
+class InlineStats:
+    __slots__ = ('num_calls', 'num_functions', 'num_removed')
+
+    def __init__(self) -> None:
+        self.num_calls = 0
+        self.num_functions = 0
+        self.num_removed = 0  # nodes, negative when inlined expressions are larger than the calls
+
+    def __str__(self) -> str:
+        return f'{self.num_calls} calls to {self.num_functions} functions inlined'
+
+
+class Inliner(Visitor):
+    def __init__(self, interpreter, threshold: int = INLINE_THRESHOLD) -> None:
+        super().__init__()
+        self.interpreter = interpreter
+        self.threshold = threshold
+        self.scopes = ScopeStack()
+        self.root = None  # of the program, what's known statically is only collected from it once a call needs it
+        self.collected = False
+        self.cls = None  # class of the methods being visited, this is an instance of it or a subclass
+        self.functions = {}  # name -> global function
+        self.assigned = set()  # names assigned to, global functions of the same name could be anything
+        self.classes = {}  # name -> global class
+        self.owners = {}  # method -> its class
+        self.subclasses = {}  # class name -> the classes inheriting from it, wherever they're declared
+        self.unknown_bases = False  # if a class inherits from a name that could be any class, any method could be overridden
+        self.fields = set()  # names set on any object, they'd shadow methods of the same name
+        self.walked = set()  # functions whose calls were inlined
+        self.states = {}  # function -> if it can be inlined, or INLINING
+        self.nesting = 0
+        self.resolved = False  # if the body of the function visited is resolved, the temporaries declared in it have to be too
+        self.pending = None  # declarations to put before the statement visited, None outside of function bodies
+        self.leading = set()  # ids of the calls the statement visited evaluates the arguments of first
+        self.num_temps = 0
+        self.folder = ConstantFolder(interpreter)
+        self.inlined = set()
+        self.stats = InlineStats()
+
+    def run(self, node: nodes.ASTNode):
+        self.walk(node)
+        self.stats.num_functions = len(self.inlined)
+        return self.stats
+
+    def run_deferred(self, root_node, fn_obj_node):
+        """Inlines calls in the body of a function of root_node deferred when it was built, once it's resolved."""
+        self.root = root_node
+        self.inline_into(fn_obj_node)
+        self.stats.num_functions = len(self.inlined)
+        return self.stats
+
+    def collect_globals(self):
+        """Finds the global functions and classes, the candidates for what calls are known to call."""
+        if self.functions or self.classes:
+            return
+        for node in self.root.globals:
+            if isinstance(node, nodes.FuncObj) and node.ident and node.decorator is None:
+                self.functions[node.ident.ident_token] = node
+            elif isinstance(node, nodes.ClassObj):
+                self.classes[node.name] = node
+                for method in node.body:
+                    if isinstance(method, nodes.MethodObj):
+                        self.owners[method] = node
+
+    def collect(self):
+        """Finds what could change which function or method a call calls, it takes a walk over every body."""
+        if self.collected:
+            return
+        self.collected = True
+        self.collect_globals()
+        declared = set()  # names bound other than by global classes
+        classes = []  # all of them, nested ones included
+        for node in iter_nodes(self.root):
+            if isinstance(node, nodes.Assign) and not isinstance(node.lhs, nodes.Index):
+                self.assigned.add(node.lhs.name)
+            elif isinstance(node, nodes.SetStmt):
+                self.fields.add(node.lhs.name)
+            elif isinstance(node, nodes.AssignDecl):
+                declared.add(node.lhs.name)
+            elif isinstance(node, nodes.FuncObj):
+                declared.update(formal.name for formal in node.formals)
+                if node.ident:
+                    declared.add(node.ident.ident_token)
+            elif isinstance(node, nodes.ClassObj):
+                classes.append(node)
+        declared.update(cls.name for cls in classes if self.classes.get(cls.name) is not cls)
+        for cls in classes:
+            if not isinstance(cls.inheritance, nodes.Var):
+                continue  # none, or a class of another module
+            base = cls.inheritance.ident_token
+            if base in self.classes and base not in declared and base not in self.assigned:
+                self.subclasses.setdefault(base, []).append(cls)
+            else:
+                self.unknown_bases = True
+
+    @staticmethod
+    def own_method(cls, name: str):
+        for method in cls.body:
+            if isinstance(method, nodes.MethodObj) and method.name == name:
+                return method
+        return None
+
+    def resolve_method(self, cls, name: str):
+        """Returns the method this.name is in the methods of cls, None if it isn't known statically."""
+        if name == 'init':
+            return None
+        method, owner = None, cls
+        while owner is not None and method is None:
+            method = self.own_method(owner, name)
+            if not isinstance(owner.inheritance, nodes.Var):
+                break  # superclasses from other modules aren't known
+            owner = self.classes.get(owner.inheritance.ident_token)
+        if method is None or not returns_expr(method):
+            return None
+        self.collect()
+        if name in self.fields or self.unknown_bases:
+            return None
+        stack = list(self.subclasses.get(cls.name, ()))
+        while stack:
+            subclass = stack.pop()
+            if self.own_method(subclass, name):
+                return None
+            stack += self.subclasses.get(subclass.name, ())
+        return method
+
+    def callee(self, ident):
+        """Returns the function ident calls and the receiver for methods, None if it isn't known statically.
+
+        Only ones that return an expression are looked for, the others can't be inlined anyway and knowing
+        takes a walk over every body."""
+        if isinstance(ident, nodes.Var):
+            fn_obj = self.functions.get(ident.ident_token)
+            if fn_obj is None or self.scopes.depth(ident.ident_token) is not None or not returns_expr(fn_obj):
+                return None, None  # unknown, shadowed by a local, or not inlinable
+            self.collect()
+            return (None if ident.ident_token in self.assigned else fn_obj), None
+        elif isinstance(ident, nodes.ScopedID) and isinstance(ident.object, nodes.ThisID) and self.cls is not None:
+            return self.resolve_method(self.cls, ident.name), ident.object
+        return None, None
+
+    def inlined_expr(self, fn_obj):
+        """Returns the expression fn_obj's body returns, if it's one that can be inlined."""
+        if not returns_expr(fn_obj):
+            return None
+        expr = fn_obj.body[0].expr
+        formals = {formal.name for formal in fn_obj.formals}
+        is_method = fn_obj in self.owners
+        stack, num_nodes = [expr], 0
+        while stack:
+            node = stack.pop()
+            num_nodes += 1
+            if num_nodes > self.threshold:
+                return None
+            if isinstance(node, nodes.Literal):
+                continue
+            elif isinstance(node, nodes.Var):
+                if node.ident_token not in formals:
+                    return None
+            elif isinstance(node, nodes.BinOp):
+                stack += (node.lhs, node.rhs)
+            elif isinstance(node, nodes.UnaryOp):
+                stack.append(node.operand)
+            elif isinstance(node, nodes.ThisID):
+                if not is_method:
+                    return None
+            elif isinstance(node, nodes.ScopedID) and isinstance(node.object, nodes.ThisID):
+                stack.append(node.object)
+            elif (isinstance(node, nodes.Call) and isinstance(node.ident, nodes.Var)
+                    and node.ident.ident_token in PURE_BUILTINS and node.ident.ident_token not in formals):
+                stack += node.actuals
+            else:
+                return None
+        return expr
+
+    def inlinable(self, fn_obj) -> bool:
+        state = self.states.get(fn_obj)
+        if state is None:
+            if not returns_expr(fn_obj):
+                return False  # inlining calls in it can't make it inlinable, it's left for the walk
+            if self.nesting >= MAX_NESTING:
+                return False
+            self.nesting += 1
+            try:
+                self.inline_into(fn_obj)
+            finally:
+                self.nesting -= 1
+            state = self.states[fn_obj]
+        return state is True
+
+    def inline_into(self, fn_obj):
+        """Inlines the calls in the body of a global function or method."""
+        if fn_obj in self.walked:
+            return
+        self.collect_globals()
+        self.walked.add(fn_obj)
+        self.states[fn_obj] = INLINING
+        # they only see globals, and this for methods
+        scopes, cls, self.scopes, self.cls = self.scopes, self.cls, ScopeStack(), self.owners.get(fn_obj)
+        resolved, self.resolved = self.resolved, fn_obj not in self.interpreter.deferred
+        try:
+            with self.scopes.enter_new(fn_obj.name):
+                for formal in fn_obj.formals:
+                    self.scopes.bind(formal.name)
+                fn_obj.body = self.walk(fn_obj.body, True)
+        finally:
+            self.scopes, self.cls, self.resolved = scopes, cls, resolved
+        self.states[fn_obj] = self.inlined_expr(fn_obj) is not None
+
+    def copy_trivial(self, node, meta):
+        if isinstance(node, nodes.Literal):
+            return make_literal(meta, node.value)
+        elif isinstance(node, nodes.Var):
+            copy = nodes.Var(node.meta, node.ident_token)
+            resolved, copy_resolved = node, copy
+        else:
+            copy = nodes.ThisID(node.meta, node.name, nodes.ID(node.object.meta, 'this'), node.components)
+            resolved, copy_resolved = node.object, copy.object
+        locals = self.interpreter.locals
+        if resolved in locals:  # unresolved ones get resolved along with the rest of their function
+            locals[copy_resolved] = locals[resolved]
+        return copy
+
+    def clone(self, node, args, receiver, meta, moved):
+        """Copies the callee's expression with its formals replaced by the arguments and this by the receiver."""
+        if isinstance(node, nodes.Var):
+            if node.ident_token not in args:  # pure builtin
+                return nodes.Var(meta, node.ident_token)
+            arg = args[node.ident_token]
+            if id(arg) in moved:
+                return self.copy_trivial(arg, meta)
+            moved.add(id(arg))
+            return arg
+        elif isinstance(node, nodes.Literal):
+            return make_literal(meta, node.value)
+        elif isinstance(node, nodes.BinOp):
+            return nodes.BinOp(meta, self.clone(node.lhs, args, receiver, meta, moved), node.op_str, self.clone(node.rhs, args, receiver, meta, moved))
+        elif isinstance(node, nodes.UnaryOp):
+            return nodes.UnaryOp(meta, node.op_str, self.clone(node.operand, args, receiver, meta, moved))
+        elif isinstance(node, nodes.ThisID):
+            return self.copy_trivial(receiver, meta)
+        elif isinstance(node, nodes.ScopedID):
+            obj = self.clone(node.object, args, receiver, meta, moved)
+            return nodes.ScopedID(meta, node.name, obj, (obj, node.name))
+        return nodes.Call(meta, self.clone(node.ident, args, receiver, meta, moved), [self.clone(actual, args, receiver, meta, moved) for actual in node.actuals])
+
+    def declare_temp(self, meta, rhs):
+        name = f'$inline{self.num_temps}'
+        self.num_temps += 1
+        self.scopes.bind(name)
+        return nodes.AssignDecl(meta, nodes.ID(meta, name), rhs, None, None, None)
+
+    def read_temp(self, meta, name: str):
+        var_node = nodes.Var(meta, name)
+        if self.resolved:
+            self.interpreter.resolve(var_node, 0)  # declared in the function reading it
+        return var_node
+
+    def substitute(self, call_node, callee, receiver):
+        expr = self.inlined_expr(callee)
+        args = {formal.name: actual for formal, actual in zip(callee.formals, call_node.actuals)}
+        if not all(is_pure(arg) for arg in args.values()):
+            return call_node
+        reads = [node.ident_token for node in in_order(expr) if isinstance(node, nodes.Var)]
+        if any(name not in args and self.scopes.depth(name) is not None for name in reads):
+            return call_node  # a builtin the expression calls is shadowed here
+
+        decls = []
+        evaluated = [name for name, arg in args.items() if not is_trivial(arg)]
+        if [name for name in reads if name in evaluated] != evaluated:
+            # the expression would skip, repeat or reorder evaluating some, they're evaluated before the statement instead
+            if self.pending is None or id(call_node) not in self.leading:
+                return call_node
+            counts = Counter(reads)
+            for name in evaluated:
+                decl = self.declare_temp(args[name].meta, args[name])
+                decls.append(decl)
+                if counts[name]:
+                    args[name] = self.read_temp(args[name].meta, decl.lhs.name)
+
+        num_nodes = count_nodes(call_node)
+        inlined = self.folder.walk(self.clone(expr, args, receiver, call_node.meta, set()))
+        kept = {id(node) for root in [inlined, *decls] for node in iter_nodes(root)}
+        for node in iter_nodes(call_node):
+            if id(node) not in kept:
+                self.interpreter.locals.pop(node, None)
+        if decls:  # there are none in top level code, which has nowhere to put them
+            self.pending += decls
+        self.stats.num_calls += 1
+        self.stats.num_removed += num_nodes - len(kept)
+        self.inlined.add(callee)
+        return inlined
+
+    def visitRoot(self, root_node):
+        self.root = root_node
+        deferred = self.interpreter.deferred  # inlined into once they're resolved, see run_deferred
+        globals = list(root_node.globals)
+        for i, node in enumerate(globals):
+            if isinstance(node, nodes.FuncObj):
+                if node not in deferred:
+                    self.inline_into(node)
+            elif isinstance(node, nodes.ClassObj):
+                for method in node.body:
+                    if isinstance(method, nodes.MethodObj) and method not in deferred:
+                        self.inline_into(method)
+            else:
+                globals[i] = yield node
+        root_node.globals.nodes = type(root_node.globals.nodes)(globals)
+        return root_node
+
+    def visitNodeList(self, node_list_node, block = False):
+        # blocks of statements get the declarations of the temporaries their statements need
+        inlined = []
+        for node in node_list_node.nodes:
+            if not block:
+                inlined.append((yield node))
+            elif isinstance(node, nodes.NodeList):  # a group of statements, i.e. a let
+                inlined.append((yield node, True))
+            else:
+                pending, leading = self.pending, self.leading
+                self.pending, self.leading = [], leading_calls(node)
+                node = yield node
+                inlined += self.pending
+                inlined.append(node)
+                self.pending, self.leading = pending, leading
+        node_list_node.nodes = type(node_list_node.nodes)(inlined)
+        return node_list_node
+
+    def visitCall(self, call_node):
+        call_node.ident = yield call_node.ident
+        call_node.actuals = yield call_node.actuals
+        callee, receiver = self.callee(call_node.ident)
+        if callee is None or len(callee.formals) != len(call_node.actuals) or not self.inlinable(callee):
+            return call_node
+        return self.substitute(call_node, callee, receiver)
+
+    def visitAssignDecl(self, ad_node):
+        ad_node.rhs = yield ad_node.rhs
+        self.scopes.bind(ad_node.lhs.name)
+        return ad_node
+
+    def visitAssign(self, assign_node):
+        assign_node.rhs = yield assign_node.rhs
+        if isinstance(assign_node.lhs, nodes.Index):
+            assign_node.lhs = yield assign_node.lhs
+        return assign_node
+
+    def visitSetStmt(self, set_node):
+        set_node.rhs = yield set_node.rhs
+        set_node.lhs = yield set_node.lhs
+        return set_node
+
+    def visitVar(self, var_node):
+        return var_node
+
+    def visitScopedID(self, id_node):
+        id_node.object = yield id_node.object
+        return id_node
+
+    def visitThisID(self, this_id_node):
+        return this_id_node
+
+    def visitSuperID(self, super_id_node):
+        return super_id_node
+
+    def visitFuncObj(self, fn_obj_node):
+        # nested functions keep seeing the scopes around them
+        if fn_obj_node.ident:
+            self.scopes.bind(fn_obj_node.ident.ident_token)
+        resolved = self.resolved
+        if self.pending is None:  # in top level code, it's resolved unless it's deferred
+            self.resolved = fn_obj_node not in self.interpreter.deferred
+        with self.scopes.enter_new(fn_obj_node.name):
+            for formal in fn_obj_node.formals:
+                self.scopes.bind(formal.name)
+            fn_obj_node.body = yield fn_obj_node.body, True
+        self.resolved = resolved
+        return fn_obj_node
+
+    def visitClassObj(self, cls_obj_node):
+        # only global classes are known, this in the methods of nested ones could be anything
+        self.scopes.bind(cls_obj_node.name)
+        cls, self.cls = self.cls, None
+        for method in cls_obj_node.body:
+            if isinstance(method, nodes.MethodObj):
+                with self.scopes.enter_new(method.name):
+                    for formal in method.formals:
+                        self.scopes.bind(formal.name)
+                    method.body = yield method.body, True
+        self.cls = cls
+        return cls_obj_node
+
+    def visitImport(self, import_node):
+        self.scopes.bind(import_node.name)
+        return import_node
+
+    def visitImportFrom(self, import_node):
+        for name, alias in import_node.names:
+            self.scopes.bind(alias or name)
+        return import_node
+
+    def visitIf(self, if_node):
+        for branch in if_node.branch_seq:
+            branch.cond = yield branch.cond
+            branch.body = yield branch.body, True
+        return if_node
+
+    def visitWhile(self, while_node):
+        while_node.condition = yield while_node.condition
+        while_node.body = yield while_node.body, True
+        return while_node
+
+    def visitReturn(self, return_node):
+        return_node.expr = yield return_node.expr
+        return return_node
+
+    def visitBinOp(self, bin_op_node):
+        bin_op_node.lhs = yield bin_op_node.lhs
+        bin_op_node.rhs = yield bin_op_node.rhs
+        return bin_op_node
+
+    def visitUnaryOp(self, un_op_node):
+        un_op_node.operand = yield un_op_node.operand
+        return un_op_node
+
+    def visitLiteral(self, literal_node):
+        return literal_node
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
+
+    def visitArray(self, array_node):
+        array_node.values = yield array_node.values
+        return array_node
+
+    def visitIndex(self, index_node):
+        index_node.idx = yield index_node.idx
+        index_node.base = yield index_node.base
+        return index_node
+
+    def visitTryCatch(self, tc_node):
+        tc_node.try_.body = yield tc_node.try_.body, True
+        tc_node.catch.body = yield tc_node.catch.body, True
+        return tc_node
+
+    def visitThrow(self, throw_node):
+        return throw_node
@@ -2,10 +2,9 @@
 
 """
 
-from icecream import ic
-from pipe import traverse, where
-
 from core.visitors.visitor import Visitor
+from core.visitors.semantics import SemanticAnalyzer
+from core.visitors.slots import SlotAllocator
 from core import nodes
 from core.runtime.callables import *
 from core.runtime.literals import *
@@ -18,8 +17,15 @@ class Interpreter(Visitor):
         super().__init__()
         self.prev_envs = []
         self.globals = Environment('globals')
+        self.root = None  # Root of the program, set by Program
         self.locals = {}  # book calls these locals bc they didn't analyze things in global scope, might cause bugs
         self.env = self.globals
+        self.modules = {}  # file -> Root of every module the program imports, see Program.link
+        self.loaded = {}  # file -> InternalModule, modules run once, on their first import
+        self.deferred = {}  # function -> enclosing scopes, for bodies resolved on their first call
+        self.optimizers = {}  # deferred function -> DeferredPasses optimizing its body once it's resolved
+        self.returned = None  # value of the last return, its statement completes with RETURN
+        self.impurities = None  # function -> why it isn't pure, None when it is, see impurity
 
     def interpret(self, node: nodes.ASTNode):
         return node.accept(self)
@@ -27,9 +33,9 @@ class Interpreter(Visitor):
     def __call__(self, node):
         self.interpret(node)
 
-    def enter_scope(self, name, env = None):
+    def enter_scope(self, name, env, values):
         self.prev_envs.append(self.env)
-        self.env = Environment(name, env or self.env)
+        self.env = Frame(name, env, values)
         return self
 
     def exit_scope(self):
@@ -38,12 +44,47 @@ class Interpreter(Visitor):
     def resolve(self, expr, depth):
         self.locals[expr] = depth  # should type also be added here like {depth: depth, type: type}
 
+    def defer(self, fn_obj, enclosing):
+        self.deferred[fn_obj] = enclosing
+
+    def resolve_deferred(self, fn_obj):
+        enclosing = self.deferred.pop(fn_obj)
+        SemanticAnalyzer(self).resolve_deferred(fn_obj, enclosing)
+        optimizer = self.optimizers.pop(fn_obj, None)
+        if optimizer is not None:
+            optimizer.run(self, fn_obj, enclosing)
+        SlotAllocator(self.locals).allocate_deferred(fn_obj, enclosing)
+
+    def impurity(self, fn_obj):
+        """
+        Returns why fn_obj isn't pure, None when it is. The program and the modules it imports
+        are analyzed on the first call, only @cache needs to know.
+        """
+        if self.impurities is None:
+            from core.visitors.purity import PurityAnalyzer  # only programs using @cache need it
+            self.impurities = {}
+            for root in (self.root, *self.modules.values()):
+                if root is not None:
+                    self.impurities.update(PurityAnalyzer().analyze(root))
+        return self.impurities.get(fn_obj, 'is not part of the program')
+
     def look_up_var(self, node, name):
-        if node in self.locals:
-            dist = self.locals[node]
-            return self.env.getAt(dist, name)
+        resolution = self.locals.get(node)
+        if resolution is None:
+            return self.env.globals.get(name)
+        dist, slot = resolution
+        if dist == 0:
+            val = self.env.values[slot]
+            return val.value if type(val) is Cell else val
+        return self.env.getAt(dist, slot)
+
+    def declare(self, node, name, val):
+        """Sets what node declares, in its slot when it's in a function, else by name."""
+        resolution = self.locals.get(node)
+        if resolution is None:
+            self.env.define(name, val)
         else:
-            return self.globals.get(name)
+            self.env.assignAt(*resolution, val)
 
     def __enter__(self):
         return self
@@ -70,20 +111,43 @@ class Interpreter(Visitor):
         return self.interpret(super(nodes.None_, none_node))
 
     def visitUnaryOp(self, unary_node: nodes.UnaryOp):
-        value = unary_node.opd_cast(self.interpret(unary_node.operand))
-        return unary_node.res_cast(unary_node.op(value))
+        value = self.interpret(unary_node.operand)
+        evaluate = unary_node.evaluate
+        if evaluate is None:  # operand type wasn't known statically, specialized on the last one seen
+            opd_type, evaluate = unary_node.seen
+            if type(value) is not opd_type:
+                evaluate = unary_node.respecialize(type(value))
+        return evaluate(value)
 
     def visitBinOp(self, bin_op_node: nodes.BinOp):
-        lhs_value = bin_op_node.lhs_cast(self.interpret(bin_op_node.lhs))
-        rhs_value = bin_op_node.rhs_cast(self.interpret(bin_op_node.rhs))
-        return bin_op_node.res_cast(bin_op_node.op(lhs_value, rhs_value))
+        lhs_value = self.interpret(bin_op_node.lhs)
+        rhs_value = self.interpret(bin_op_node.rhs)
+        evaluate = bin_op_node.evaluate
+        if evaluate is None:  # operand types weren't known statically, specialized on the last ones seen
+            lhs_type, rhs_type, evaluate = bin_op_node.seen
+            if type(lhs_value) is not lhs_type or type(rhs_value) is not rhs_type:
+                evaluate = bin_op_node.respecialize(type(lhs_value), type(rhs_value))
+        return evaluate(lhs_value, rhs_value)
 
     def visitAssignDecl(self, ad_node):
         val = self.interpret(ad_node.rhs)
-        self.env.define(ad_node.lhs.name, val)
+        self.declare(ad_node.lhs, ad_node.lhs.name, val)
 
     def visitVar(self, id_node):
-        return self.look_up_var(id_node, id_node.ident_token)
+        resolution = self.locals.get(id_node)
+        if resolution is not None:  # like look_up_var, without a call for every variable
+            dist, slot = resolution
+            if dist == 0:
+                val = self.env.values[slot]
+                return val.value if type(val) is Cell else val
+            return self.env.getAt(dist, slot)
+        # globals and builtins are cached on the Var until a global is rebound, see Environment
+        globals_ = self.env.globals
+        version, val = id_node.cached
+        if version != globals_.version:
+            val = globals_.get(id_node.ident_token)
+            id_node.cached = (globals_.version, val)
+        return val
         # return self.env.get(id_node.name)  # pre-bind version
 
     def visitThisID(self, this_id_node):
@@ -101,47 +165,61 @@ class Interpreter(Visitor):
         instance.set(set_node.lhs.name, val)
 
     def visitSuperID(self, super_node):
-        dist = self.locals[super_node.object]
-        superclass = self.env.getAt(dist, 'super')
-
-        object_ = self.env.getAt(dist - 1, 'this')
+        superclass = self.env.getAt(*self.locals[super_node.object])
+        object_ = self.env.getAt(*self.locals[super_node])
         # add support for static cls vars
         method = superclass.find_method(super_node.name)
         return method.bind(object_)
 
     def visitAssign(self, assign_node):
-        lhs_val = self.interpret(assign_node.lhs)
         val = self.interpret(assign_node.rhs)
-        assign_node.lhs.type = assign_node.rhs.type  # is this necessary?
-        if assign_node.lhs in self.locals:
-
-
-            if isinstance(assign_node.lhs, nodes.Index):
-                array, idx = lhs_val
-                array[idx] = val
-                return val
-
-
-            dist = self.locals[assign_node.lhs]
-            self.env.assignAt(dist, assign_node.lhs.name, val)
+        if isinstance(assign_node.lhs, nodes.Index):
+            array = self.interpret(assign_node.lhs.base)
+            array[int(self.interpret(assign_node.lhs.idx))] = val
+        elif assign_node.lhs in self.locals:
+            self.env.assignAt(*self.locals[assign_node.lhs], val)
         else:
-            self.globals.assign(assign_node.lhs.name, val)
+            self.env.globals.assign(assign_node.lhs.name, val)
         # self.env.assign(assign_node.name, val)  # old way before resolver
         return val
 
+    def import_module(self, import_node):
+        if import_node.file in self.loaded:
+            return self.loaded[import_node.file]
+        module = InternalModule('.'.join(import_node.module), Environment(import_node.file))
+        self.loaded[import_node.file] = module  # before running it, so import cycles terminate
+        self.prev_envs.append(self.env)
+        self.env = module.env
+        try:
+            self.interpret(self.modules[import_node.file].globals)
+        finally:
+            self.exit_scope()
+        return module
+
+    def visitImport(self, import_node):
+        self.env.define(import_node.name, self.import_module(import_node))
+
+    def visitImportFrom(self, import_node):
+        module = self.import_module(import_node)
+        for name, alias in import_node.names:
+            self.env.define(alias or name, module.get(name))
+
     def visitNodeList(self, node_list_node):
-        return [self.interpret(node) for node in node_list_node]
-            
+        # statements complete with None, unless they returned, see Completion
+        for node in node_list_node:
+            if self.interpret(node) is RETURN:
+                return RETURN
 
     def visitIf(self, if_node: nodes.If):
         for branch in if_node.branch_seq:  # TODO add truthiness here!
             val = self.interpret(branch.cond)
             if not val: continue
-            self.interpret(branch.body)
+            return self.interpret(branch.body)
 
     def visitWhile(self, while_node: nodes.While):
         while self.interpret(while_node.condition):
-            self.interpret(while_node.body)
+            if self.interpret(while_node.body) is RETURN:
+                return RETURN
 
     def visitCall(self, call_node: nodes.Call):
         fn = self.interpret(call_node.ident)
@@ -155,14 +233,14 @@ class Interpreter(Visitor):
             superclass = self.interpret(cls_obj_node.inheritance)
             assert isinstance(superclass, InternalClass)
 
-        self.env.define(cls_obj_node.name, None)
+        self.declare(cls_obj_node, cls_obj_node.name, None)
 
         if cls_obj_node.inheritance:
-            self.env = Environment('base', self.env)
-            self.env.define('super', superclass)
+            self.env = Frame('base', self.env, [superclass])
 
         methods = {}
         for method in cls_obj_node.body:
+            if not isinstance(method, nodes.MethodObj): continue  # static cls vars aren't supported yet
             internal_method = InternalFunction(method, self.env, method.name == 'init')
             methods[method.name] = internal_method
         klass = InternalClass(cls_obj_node.name, superclass, methods)
@@ -170,10 +248,10 @@ class Interpreter(Visitor):
         if superclass:
             self.env = self.env.enclosing
 
-        self.env.assign(cls_obj_node.name, klass)
+        self.declare(cls_obj_node, cls_obj_node.name, klass)
     
     def visitRoot(self, root_node):
-        res = list(self.interpret(root_node.globals) | traverse | where(lambda c: c is not None))
+        res = [val for val in map(self.interpret, root_node.globals) if val is not None]
         if not len(res):
             print('Error: did not recieve exit code from "main"')
             raise RuntimeError(1)
@@ -183,14 +261,23 @@ class Interpreter(Visitor):
         return res[0]
 
     def visitFuncObj(self, fn_def_node: nodes.FuncObj):
-        fn = InternalFunction(fn_def_node, self.env, False)
+        closure = self.env
+        if fn_def_node.captures is not None:
+            # a closure only keeps what it captures, see SemanticAnalyzer.capture
+            closure = Frame('closure', self.env.globals, [self.env.cell(depth, slot) for _, depth, slot in fn_def_node.captures])
+        fn = InternalFunction(fn_def_node, closure, False)
+        if fn_def_node.decorator is not None:
+            decorator = self.interpret(fn_def_node.decorator)
+            assert isinstance(decorator, InternalCallable)
+            fn = decorator(self, fn)
         if fn_def_node.ident:  # trying to say "if def func and not anon func"
-            self.env.define(fn_def_node.ident.ident_token, fn)
+            self.declare(fn_def_node.ident, fn_def_node.ident.ident_token, fn)
             return
         return fn
 
     def visitReturn(self, return_node):
-        raise ReturnInterrupt(self.interpret(return_node.expr))
+        self.returned = self.interpret(return_node.expr)
+        return RETURN
 
 
     def visitPrimitiveType(self, obj_type_node):
@@ -200,26 +287,17 @@ class Interpreter(Visitor):
         raise NotImplementedError
 
     def visitIndex(self, index_node):
-        idx = int(self.interpret(index_node.idx))
-
-        if index_node in self.locals:
-            dist = self.locals[index_node]
-            array = self.env.getAt(dist, index_node.name)
-            return array, idx
-        else:
-            array = self.interpret(index_node.base)
-
-        
-        return array[idx]
+        array = self.interpret(index_node.base)
+        return array[int(self.interpret(index_node.idx))]
 
     def visitArray(self, array_node):
-        return InternalArray(array_node.values, array_node.type)
+        return InternalArray([self.interpret(value) for value in array_node.values], array_node.type)
 
     def visitTryCatch(self, try_catch):
         try:
-            self.interpret(try_catch.try_.body)
+            return self.interpret(try_catch.try_.body)
         except try_catch.catch.exception as err:
-            self.interpret(try_catch.catch.body)
+            return self.interpret(try_catch.catch.body)
 
     def visitThrow(self, throw_node):
         raise throw_node.exception
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Moves expressions that evaluate to the same value on every iteration of a loop out of it, so
+they're evaluated once per loop rather than once per iteration.
+
+An expression is loop invariant when it's pure and nothing in the loop can change what it reads:
+no variable it reads is assigned in the loop, fields and array elements are only read if the
+loop sets none, and when the loop calls anything, neither of them nor variables from outside
+the function are read. Invariant expressions are computed into variables before the loop, which
+every occurrence in the loop then reads.
+
+An expression is only moved if every iteration evaluates it before doing anything else, so
+moving it can't make it raise in a loop that wouldn't have, or before something the loop would
+have done first. That's the case in the loop's condition and in the leading statements of its
+body that only assign locals. The loop becomes
+
+    if <condition> { let $licm0 = <invariant>; while <condition> { ... } }
+
+which is why its condition must be pure, as it's evaluated once more. Loops from for statements
+are whiles by then, they're moved out of the same way.
+"""
+
+from core import nodes
+from core.nodes.node import count_nodes, iter_nodes
+from core.visitors.effects import is_pure, is_trivial, children, reads, expr_key, copy_expr
+from core.visitors.rewrite import Rewriter, child_slots, get_child, set_child, statements
+
+
+class LICMStats:
+    __slots__ = ('num_loops', 'num_hoisted', 'num_removed')
+
+    def __init__(self) -> None:
+        self.num_loops = 0
+        self.num_hoisted = 0
+        self.num_removed = 0  # nodes, negative when the loops grew
+
+    def __str__(self) -> str:
+        return f'{self.num_hoisted} expressions moved out of {self.num_loops} loops'
+
+
+class LoopInvariantMover(Rewriter):
+    prefix = 'licm'
+
+    def __init__(self, interpreter) -> None:
+        super().__init__(interpreter)
+        self.stats = LICMStats()
+
+    def run(self, node: nodes.ASTNode):
+        self.walk(node)
+        return self.stats
+
+    def changed(self, while_node):
+        """Returns the names the loop assigns, if it writes to fields or arrays and if it calls anything."""
+        names, writes, calls = set(), False, False
+        for node in iter_nodes(while_node):
+            if isinstance(node, nodes.Assign) and isinstance(node.lhs, nodes.Index):
+                writes = True
+            elif isinstance(node, (nodes.Assign, nodes.AssignDecl)):
+                names.add(node.lhs.name)
+            elif isinstance(node, nodes.SetStmt):
+                writes = True
+            elif isinstance(node, nodes.Call):
+                calls = True
+            elif isinstance(node, nodes.FuncObj) and node.ident:
+                names.add(node.ident.ident_token)
+            elif isinstance(node, nodes.ClassObj):
+                names.add(node.name)
+        return names, writes, calls
+
+    def leading(self, while_node):
+        """Yields the pure expressions every iteration evaluates before doing anything else."""
+        yield from children(while_node.condition)  # an invariant condition as a whole is no cheaper in a variable
+        if self.function.tries:
+            return  # a catch could see which locals the iteration assigned before raising
+        for stmt in statements(while_node.body):
+            if isinstance(stmt, nodes.AssignDecl) or (isinstance(stmt, nodes.Assign) and isinstance(stmt.lhs, nodes.Var)
+                                                      and self.scopes.depth(stmt.lhs.name) == 0):
+                if not is_pure(stmt.rhs):
+                    return
+                yield stmt.rhs
+                continue
+            if isinstance(stmt, nodes.ReturnStmt) and is_pure(stmt.expr):
+                yield stmt.expr
+            elif isinstance(stmt, nodes.Call) and all(is_pure(actual) for actual in stmt.actuals):
+                yield from stmt.actuals
+            return
+
+    def invariants(self, expr, changed):
+        """Yields the largest invariant expressions in a pure expression that are worth a variable."""
+        names, writes, calls = changed
+        stack = [expr]
+        while stack:
+            node = stack.pop()
+            if is_trivial(node):
+                continue
+            read, memory = reads(node)
+            if not (read & names or (memory and (writes or calls))
+                    or (calls and any(self.scopes.depth(name) != 0 or name in self.function.captured for name in read))):
+                yield node
+            else:
+                stack += children(node)
+
+    def replace(self, while_node, temps):
+        """Replaces every occurrence of the hoisted expressions in the loop with their variables."""
+        locals = self.interpreter.locals
+        stack = [while_node]
+        while stack:
+            node = stack.pop()
+            for parent, field in child_slots(node):
+                child = get_child(parent, field)
+                key = expr_key(child, locals) if isinstance(child, (nodes.BinOp, nodes.UnaryOp, nodes.ScopedID, nodes.Index)) else None
+                if key in temps:
+                    decl = temps[key]
+                    if decl.rhs is not child:
+                        self.drop(child)
+                    set_child(parent, field, self.read_temp(child.meta, decl.lhs.name))
+                elif not isinstance(child, (nodes.FuncObj, nodes.ClassObj)):
+                    stack.append(child)
+
+    def visitWhile(self, while_node):
+        while_node.condition = yield while_node.condition
+        while_node.body = yield from self.block(while_node.body)
+        if self.function is None or not is_pure(while_node.condition):
+            return while_node
+
+        locals = self.interpreter.locals
+        changed = self.changed(while_node)
+        hoisted = {}
+        for expr in self.leading(while_node):
+            for invariant in self.invariants(expr, changed):
+                hoisted.setdefault(expr_key(invariant, locals), invariant)
+        if not hoisted:
+            return while_node
+
+        num_nodes = count_nodes(while_node)
+        guard = copy_expr(while_node.condition, locals)
+        temps = {key: self.declare_temp(invariant.meta, invariant) for key, invariant in hoisted.items()}
+        self.replace(while_node, temps)
+        meta = while_node.meta
+        body = nodes.NodeList(meta, [*temps.values(), while_node], 'body')
+        if_node = nodes.If(meta, [nodes.Branch(meta, guard, body, 'if')])
+        self.stats.num_loops += 1
+        self.stats.num_hoisted += len(temps)
+        self.stats.num_removed += num_nodes - count_nodes(if_node)
+        return if_node
@@ -0,0 +1,194 @@
+"""
+Runs the optimization passes over a resolved program, the ones its optimization level picks.
+
+-O0  none, the program runs as it was resolved
+-O1  constant folding and dead code elimination
+-O2  also inlining, loop-invariant code motion and common subexpression elimination
+
+Every pass is a Visitor rewriting the tree in place, whose run returns its stats. The manager
+times each one, and when verifying, checks the tree after each one: every node is where a node
+is expected, and resolving the tree again resolves every variable the same way the passes left
+it. A pass breaking either is reported by name, instead of as whatever goes wrong once the
+program runs.
+
+Passes leave the bodies still deferred when the program is built alone, nothing in them is
+resolved yet. DeferredPasses runs them over each one right after it's resolved, with their
+run_deferred, so lazily resolved programs only optimize the functions they call.
+"""
+
+import time
+
+from core import nodes
+from core.diagnostics import Diagnostic, ResolutionError, ERROR
+from core.nodes.node import iter_nodes
+from core.visitors.cse import CommonSubexpressionEliminator
+from core.visitors.fold import ConstantFolder
+from core.visitors.inline import Inliner
+from core.visitors.licm import LoopInvariantMover
+from core.visitors.prune import DeadCodeEliminator
+from core.visitors.semantics import SemanticAnalyzer
+
+
+OPT_LEVELS = {
+    0: (),
+    1: ('constant folding', 'dead code'),
+    2: ('constant folding', 'inlining', 'loop invariants', 'common subexpressions', 'dead code'),
+}
+DEFAULT_OPT_LEVEL = 2
+
+# name -> makes the pass for (interpreter, module), None when it doesn't apply
+PASSES = {
+    'constant folding': lambda interpreter, module: ConstantFolder(interpreter),
+    # programs importing a module can replace its functions and extend its classes
+    'inlining': lambda interpreter, module: None if module else Inliner(interpreter),
+    'loop invariants': lambda interpreter, module: LoopInvariantMover(interpreter),
+    'common subexpressions': lambda interpreter, module: CommonSubexpressionEliminator(interpreter),
+    'dead code': lambda interpreter, module: DeadCodeEliminator(interpreter, prune_globals = not module),
+}
+
+# where each kind of node keeps the nodes it's made of, lists are NodeLists
+SHAPES = {
+    nodes.BinOp: ('lhs', 'rhs'),
+    nodes.UnaryOp: ('operand',),
+    nodes.Call: ('ident', 'actuals'),
+    nodes.ScopedID: ('object',),
+    nodes.Index: ('base', 'idx'),
+    nodes.AssignDecl: ('lhs', 'rhs'),
+    nodes.Assign: ('lhs', 'rhs'),
+    nodes.SetStmt: ('lhs', 'rhs'),
+    nodes.ReturnStmt: ('expr',),
+    nodes.While: ('condition', 'body'),
+    nodes.Branch: ('cond', 'body'),
+}
+
+
+def check_shapes(root, diagnostics):
+    """Reports the nodes below root that aren't where a node is expected, returns all of them."""
+    reachable = set()
+    for node in iter_nodes(root):
+        reachable.add(node)
+        if isinstance(node, nodes.NodeList):
+            parts = [('nodes', part) for part in node.nodes]
+        else:
+            parts = [(field, getattr(node, field)) for kind, fields in SHAPES.items() if isinstance(node, kind) for field in fields]
+        for field, part in parts:
+            if not isinstance(part, nodes.ASTNode):
+                diagnostics.append(Diagnostic(ERROR, 'malformed', f'{type(node).__name__}.{field} is {part!r}', node))
+    return reachable
+
+
+def check_resolutions(resolved, locals, reachable, diagnostics):
+    """Reports the nodes the passes left resolved differently than resolving again does."""
+    for node in resolved.keys() | locals.keys():
+        if node not in reachable:
+            diagnostics.append(Diagnostic(ERROR, 'stale-resolution', f'{node!r} is resolved but no longer in the tree', node))
+        elif node not in locals:
+            diagnostics.append(Diagnostic(ERROR, 'unresolved', f'{node!r} resolves to {resolved[node]} scopes out but has no resolution', node))
+        elif resolved.get(node) != locals[node]:
+            diagnostics.append(Diagnostic(ERROR, 'misresolved', f'{node!r} resolves to {resolved.get(node)} scopes out, not {locals[node]}', node))
+
+
+class VerificationError(ResolutionError):
+    def __init__(self, pass_name: str, diagnostics) -> None:
+        super().__init__(diagnostics)
+        self.args = (f'tree broken by the {pass_name} pass:\n{self.args[0]}',)
+        self.pass_name = pass_name
+
+
+class PassManager:
+    def __init__(self, interpreter, opt_level: int = DEFAULT_OPT_LEVEL, module: bool = False, strict: bool = False, verify: bool = False) -> None:
+        self.interpreter = interpreter
+        self.passes = OPT_LEVELS[opt_level]
+        self.module = module
+        self.strict = strict  # how the program was resolved, verifying resolves it the same way
+        self.verify = verify
+
+    def run(self, ast):
+        """Runs the passes over ast, returns (name, stats, seconds) for each one that ran."""
+        results = []
+        for name in self.passes:
+            opt_pass = PASSES[name](self.interpreter, self.module)
+            if opt_pass is None:
+                continue
+            start = time.perf_counter()
+            stats = opt_pass.run(ast)
+            results.append((name, stats, time.perf_counter() - start))
+            if self.verify:
+                diagnostics = self.check(ast)
+                if diagnostics:
+                    raise VerificationError(name, diagnostics)
+        return results
+
+    def check(self, ast):
+        diagnostics = []
+        reachable = check_shapes(ast, diagnostics)
+
+        # resolving again, every variable has to resolve the way the passes left it
+        resolved = Resolutions()
+        try:
+            SemanticAnalyzer(resolved, lazy = not self.strict).resolve(ast)
+        except ResolutionError as err:
+            diagnostics += err.diagnostics
+        check_resolutions(resolved.locals, self.interpreter.locals, reachable, diagnostics)
+        for fn_obj in resolved.deferred.keys() ^ self.interpreter.deferred.keys():
+            diagnostics.append(Diagnostic(ERROR, 'deferred', f'{fn_obj!r} is deferred only by {"the passes" if fn_obj in self.interpreter.deferred else "resolving again"}', fn_obj))
+        return diagnostics
+
+
+class DeferredPasses:
+    """
+    Runs the passes of opt_level over the bodies of root's functions that were deferred when it
+    was built, as the interpreter resolves each one. The passes are made on the first, for the
+    interpreter resolving it, which for modules is the importing program's, and kept for the
+    rest: what they find out about the program, like which globals are consts and which calls
+    can be inlined, is only found once.
+    """
+
+    def __init__(self, root, opt_level: int = DEFAULT_OPT_LEVEL, module: bool = False, verify: bool = False) -> None:
+        self.root = root
+        self.names = OPT_LEVELS[opt_level]
+        self.module = module
+        self.verify = verify
+        self.passes = None  # (name, pass) of the ones that apply
+
+    def run(self, interpreter, fn_obj, enclosing):
+        """Runs the passes over fn_obj's body, which interpreter just resolved in the enclosing scopes."""
+        if self.passes is None:
+            self.passes = []
+            for name in self.names:
+                opt_pass = PASSES[name](interpreter, self.module)
+                if opt_pass is not None:
+                    self.passes.append((name, opt_pass))
+        for name, opt_pass in self.passes:
+            opt_pass.run_deferred(self.root, fn_obj)
+            if self.verify:
+                diagnostics = self.check(interpreter, fn_obj, enclosing)
+                if diagnostics:
+                    raise VerificationError(name, diagnostics)
+
+    def check(self, interpreter, fn_obj, enclosing):
+        # like PassManager.check, for the body alone
+        diagnostics = []
+        reachable = check_shapes(fn_obj, diagnostics)
+        resolved = Resolutions()
+        try:
+            SemanticAnalyzer(resolved).resolve_deferred(fn_obj, enclosing)
+        except ResolutionError as err:
+            diagnostics += err.diagnostics
+        locals = {node: interpreter.locals[node] for node in reachable if node in interpreter.locals}
+        check_resolutions(resolved.locals, locals, reachable, diagnostics)
+        return diagnostics
+
+
+class Resolutions:
+    """What the resolver records into, when only its resolutions are needed."""
+
+    def __init__(self) -> None:
+        self.locals = {}
+        self.deferred = {}
+
+    def resolve(self, expr, depth):
+        self.locals[expr] = depth
+
+    def defer(self, fn_obj, enclosing):
+        self.deferred[fn_obj] = enclosing
@@ -0,0 +1,299 @@
+"""
+Removes code that can never run once constants are folded, so it isn't cached or kept around.
+
+- statements after a return or throw in the same block
+- branches whose condition is a false literal, and the ones after a true literal
+- loops whose condition is a false literal
+- global functions and classes nothing reachable from main refers to
+
+Modules keep all of their globals, the programs importing them decide what's used. The
+resolutions of removed code are dropped with it. Statement visits return the node replacing the
+visited one, or a list of statements to splice in its place.
+
+Bodies still deferred when the program is built are pruned once they're resolved. Until then
+only the names they read matter, and only once something reachable refers to their function.
+"""
+
+from core import nodes
+from core.nodes.node import count_nodes, iter_nodes
+from core.visitors.visitor import Visitor
+
+
+class PruneStats:
+    __slots__ = ('num_functions', 'num_classes', 'num_statements', 'num_branches', 'num_walked', 'unresolved')
+
+    def __init__(self) -> None:
+        self.num_functions = 0
+        self.num_classes = 0
+        self.num_statements = 0
+        self.num_branches = 0  # including loops that never run
+        self.num_walked = 0  # nodes removed, besides the bodies in unresolved
+        self.unresolved = []  # bodies removed before they were resolved, they're only walked to count them when asked
+
+    @property
+    def num_removed(self) -> int:  # nodes
+        return self.num_walked + sum(count_nodes(body) for body in self.unresolved)
+
+    def __str__(self) -> str:
+        return (f'{self.num_functions} functions, {self.num_classes} classes, {self.num_statements} statements '
+                f'and {self.num_branches} branches removed')
+
+
+def terminates(node) -> bool:
+    """Returns if running node always ends in a return or a throw."""
+    if isinstance(node, (nodes.ReturnStmt, nodes.Throw)):
+        return True
+    elif isinstance(node, nodes.NodeList):
+        return bool(len(node)) and terminates(node[-1])
+    elif isinstance(node, nodes.If):
+        branches = node.branch_seq
+        # without an unconditional last branch, none of them might run
+        return (isinstance(branches[-1].cond, nodes.Literal) and bool(branches[-1].cond.value)
+                and all(terminates(branch.body) for branch in branches))
+    return False
+
+
+def names_read(node):
+    """Returns the names a body reads or assigns, what visiting it would add to uses."""
+    names = set()
+    for inner in iter_nodes(node):
+        if isinstance(inner, nodes.Var):
+            names.add(inner.ident_token)
+        elif isinstance(inner, nodes.Assign) and not isinstance(inner.lhs, nodes.Index):
+            names.add(inner.lhs.name)
+    return names
+
+
+def defined_name(node):
+    if isinstance(node, nodes.FuncObj) and node.ident:
+        return node.ident.ident_token
+    elif isinstance(node, nodes.ClassObj):
+        return node.name
+    return None
+
+
+class DeadCodeEliminator(Visitor):
+    def __init__(self, interpreter, prune_globals: bool = True) -> None:
+        super().__init__()
+        self.interpreter = interpreter
+        self.prune_globals = prune_globals
+        self.uses = set()  # names read by the global being visited
+        self.unvisited = []  # bodies of the global being visited that are still deferred
+        self.stats = PruneStats()
+
+    def run(self, node: nodes.ASTNode):
+        self.walk(node)
+        return self.stats
+
+    def run_deferred(self, root_node, fn_obj_node):
+        """Prunes the body of a function of root_node deferred when it was built, once it's resolved."""
+        self.walk(fn_obj_node.body)
+        return self.stats
+
+    def drop(self, node):
+        # nothing in a deferred body is resolved, it's left out of the walk
+        deferred = self.interpreter.deferred
+        unresolved = [fn_obj for fn_obj in (node.body if isinstance(node, nodes.ClassObj) else (node,)) if fn_obj in deferred]
+        for fn_obj in unresolved:
+            del deferred[fn_obj]
+            self.stats.unresolved.append(fn_obj.body)
+        for dropped in iter_nodes(node, skip = [fn_obj.body for fn_obj in unresolved]):
+            self.interpreter.locals.pop(dropped, None)
+            self.stats.num_walked += 1
+
+    def statements(self, stmts):
+        """Visits a block's statements, returns the ones that can run."""
+        kept = []
+        for i, stmt in enumerate(stmts):
+            stmt = yield stmt
+            kept.extend(stmt if isinstance(stmt, list) else (stmt,))
+            if kept and terminates(kept[-1]):
+                for unreachable in stmts[i + 1:]:
+                    self.stats.num_statements += 1
+                    self.drop(unreachable)
+                break
+        return kept
+
+    def prune(self, globals, uses, unvisited):
+        """Returns the globals reachable from the statements that run at the top level."""
+        definitions = {}
+        for i, node in enumerate(globals):
+            name = defined_name(node)
+            if name is not None:
+                definitions[name] = i
+        reachable = {i for i, node in enumerate(globals) if defined_name(node) is None}
+        stack = list(reachable)
+        while stack:
+            i = stack.pop()
+            for body in unvisited[i]:
+                uses[i] |= names_read(body)
+            for name in uses[i]:
+                i = definitions.get(name)
+                if i is not None and i not in reachable:
+                    reachable.add(i)
+                    stack.append(i)
+
+        kept = []
+        for i, node in enumerate(globals):
+            if i in reachable:
+                kept.append(node)
+                continue
+            if isinstance(node, nodes.ClassObj):
+                self.stats.num_classes += 1
+            else:
+                self.stats.num_functions += 1
+            self.drop(node)
+        return kept
+
+    def visitRoot(self, root_node):
+        globals, uses, unvisited = [], [], []
+        for node in root_node.globals:
+            self.uses, self.unvisited = set(), []
+            node = yield node
+            for stmt in node if isinstance(node, list) else (node,):
+                globals.append(stmt)
+                uses.append(self.uses)
+                unvisited.append(self.unvisited)
+        if self.prune_globals:
+            globals = self.prune(globals, uses, unvisited)
+        root_node.globals.nodes = type(root_node.globals.nodes)(globals)
+        return root_node
+
+    def visitNodeList(self, node_list_node):
+        node_list_node.nodes = type(node_list_node.nodes)((yield from self.statements(node_list_node.nodes)))
+        return node_list_node
+
+    def drop_branch(self, branch):
+        self.stats.num_branches += 1
+        self.drop(branch)
+
+    def visitIf(self, if_node):
+        kept = []
+        branches = iter(if_node.branch_seq)
+        for branch in branches:
+            yield branch.cond
+            if isinstance(branch.cond, nodes.Literal) and not branch.cond.value:
+                self.drop_branch(branch)
+                continue
+            yield branch.body
+            kept.append(branch)
+            if isinstance(branch.cond, nodes.Literal):
+                break  # always taken
+        for branch in branches:  # the ones after an always taken branch
+            self.drop_branch(branch)
+        if not kept:
+            return []
+        elif isinstance(kept[0].cond, nodes.Literal):
+            return list(kept[0].body)
+        if_node.branch_seq = kept
+        return if_node
+
+    def visitWhile(self, while_node):
+        yield while_node.condition
+        if isinstance(while_node.condition, nodes.Literal) and not while_node.condition.value:
+            self.drop_branch(while_node)
+            return []
+        yield while_node.body
+        return while_node
+
+    def visitAssignDecl(self, ad_node):
+        yield ad_node.rhs
+        return ad_node
+
+    def visitAssign(self, assign_node):
+        yield assign_node.rhs
+        if isinstance(assign_node.lhs, nodes.Index):
+            yield assign_node.lhs
+        else:
+            self.uses.add(assign_node.lhs.name)
+        return assign_node
+
+    def visitSetStmt(self, set_node):
+        yield set_node.rhs
+        yield set_node.lhs
+        return set_node
+
+    def visitReturn(self, return_node):
+        yield return_node.expr
+        return return_node
+
+    def visitVar(self, var_node):
+        self.uses.add(var_node.ident_token)
+        return var_node
+
+    def visitScopedID(self, id_node):
+        yield id_node.object
+        return id_node
+
+    def visitThisID(self, this_id_node):
+        return this_id_node
+
+    def visitSuperID(self, super_id_node):
+        return super_id_node
+
+    def visitFuncObj(self, fn_obj_node):
+        if fn_obj_node.decorator is not None:
+            yield fn_obj_node.decorator
+        if fn_obj_node in self.interpreter.deferred:
+            self.unvisited.append(fn_obj_node.body)
+        else:
+            yield fn_obj_node.body
+        return fn_obj_node
+
+    def visitClassObj(self, cls_obj_node):
+        if cls_obj_node.inheritance:
+            yield cls_obj_node.inheritance
+        for method in cls_obj_node.body:
+            if method in self.interpreter.deferred:
+                self.unvisited.append(method.body)
+            elif isinstance(method, nodes.MethodObj):
+                yield method.body
+        return cls_obj_node
+
+    def visitImport(self, import_node):
+        return import_node
+
+    def visitImportFrom(self, import_node):
+        return import_node
+
+    def visitBinOp(self, bin_op_node):
+        yield bin_op_node.lhs
+        yield bin_op_node.rhs
+        return bin_op_node
+
+    def visitUnaryOp(self, un_op_node):
+        yield un_op_node.operand
+        return un_op_node
+
+    def visitCall(self, call_node):
+        yield call_node.ident
+        yield call_node.actuals
+        return call_node
+
+    def visitLiteral(self, literal_node):
+        return literal_node
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
+
+    def visitArray(self, array_node):
+        yield array_node.values
+        return array_node
+
+    def visitIndex(self, index_node):
+        yield index_node.idx
+        yield index_node.base
+        return index_node
+
+    def visitTryCatch(self, tc_node):
+        yield tc_node.try_.body
+        yield tc_node.catch.body
+        return tc_node
+
+    def visitThrow(self, throw_node):
+        return throw_node
@@ -0,0 +1,259 @@
+"""
+Finds which functions are pure: calling one has no effects and its result only depends on its
+arguments, so calls with the same arguments can share a result. That's what @cache relies on,
+decorating a function that isn't pure with it is an error. Only @cache needs to know, so the
+program is analyzed the first time it decorates a function, see Interpreter.impurity, and
+programs that never use it never pay for the analysis.
+
+A function isn't pure when its body
+- calls a builtin that isn't pure, i.e. print, input or shell
+- sets a field, or an element of an array it didn't make
+- assigns a variable from outside of it, global or captured
+- reads a variable from outside of it that can change, only functions, classes and literals
+  nothing assigns to are fixed
+- calls a function that isn't pure, or one that isn't known statically: methods, instances of
+  classes, whatever a decorator returned and names bound to anything but a function
+
+Calls between functions are followed to a fixpoint, so functions calling each other are pure
+unless one of them does one of the above. Functions nested in a function are on their own,
+the function is only as pure as the ones it calls. Bodies are analyzed as written rather than
+as resolved, so this works the same whether they're resolved lazily or not.
+"""
+
+from core import nodes
+from core.nodes.node import iter_nodes
+from core.visitors.fold import PURE_BUILTINS
+from core.visitors.semantics import ScopeStack
+from core.visitors.visitor import Visitor
+
+
+class Effects:
+    __slots__ = ('impurity', 'callees')
+
+    def __init__(self) -> None:
+        self.impurity = None  # why the function isn't pure, None while nothing says so
+        self.callees = set()  # functions it calls, it's only pure if they are
+
+
+def caches(decorator, scopes) -> bool:
+    """Returns if decorator is the cache builtin, as @cache or @cache(maxsize)."""
+    ident = decorator.ident if isinstance(decorator, nodes.Call) else decorator
+    return isinstance(ident, nodes.Var) and ident.ident_token == 'cache' and scopes.lookup('cache') is True
+
+
+class PurityAnalyzer(Visitor):
+    def __init__(self) -> None:
+        super().__init__()
+        self.scopes = ScopeStack()  # names are bound to the node declaring them, builtins to True
+        self.function = None  # Effects of the function being visited
+        self.effects = {}  # function -> Effects
+        self.assigned = set()  # names assigned anywhere, what they're bound to can change
+
+    def analyze(self, node: nodes.ASTNode):
+        """Returns function -> why it isn't pure, None when it is, for every function in the tree."""
+        self.walk(node)
+        self.propagate()
+        return {fn_obj: effects.impurity for fn_obj, effects in self.effects.items()}
+
+    def propagate(self):
+        """Makes the callers of functions that aren't pure impure too, until none changes."""
+        callers = {}
+        for fn_obj, effects in self.effects.items():
+            for callee in effects.callees:
+                callers.setdefault(callee, []).append(fn_obj)
+        stack = [fn_obj for fn_obj, effects in self.effects.items() if effects.impurity is not None]
+        while stack:
+            callee = stack.pop()
+            for caller in callers.get(callee, ()):
+                effects = self.effects[caller]
+                if effects.impurity is None:
+                    effects.impurity = f'calls "{callee.name}", which is not pure'
+                    stack.append(caller)
+
+    def impure(self, reason: str):
+        if self.function is not None and self.function.impurity is None:
+            self.function.impurity = reason
+
+    def local(self, name: str) -> bool:
+        return self.scopes.depth(name) == 0 and self.scopes.lookup(name) is not None
+
+    def fixed(self, name: str) -> bool:
+        """Returns if name is bound to the same value for as long as it's in scope."""
+        binding = self.scopes.lookup(name)
+        if binding is True:  # builtin
+            return True
+        if name in self.assigned:
+            return False
+        return (isinstance(binding, (nodes.FuncObj, nodes.ClassObj))
+                or isinstance(binding, nodes.AssignDecl) and isinstance(binding.rhs, nodes.Literal))
+
+    def callee(self, name: str):
+        """Returns the function calling name calls, None if it isn't known statically."""
+        binding = self.scopes.lookup(name)
+        if isinstance(binding, nodes.AssignDecl):  # i.e. let f = (num x) -> num {...}
+            binding = binding.rhs
+        if not isinstance(binding, nodes.FuncObj) or name in self.assigned:
+            return None
+        if binding.decorator is not None and not caches(binding.decorator, self.scopes):
+            return None  # bound to whatever the decorator returned
+        return binding
+
+    def bind_global(self, node):
+        if isinstance(node, nodes.NodeList):  # let with several identifiers
+            for decl in node:
+                self.bind_global(decl)
+        elif isinstance(node, nodes.AssignDecl):
+            self.scopes.bind(node.lhs.name, node)
+        elif isinstance(node, nodes.FuncObj) and node.ident:
+            self.scopes.bind(node.ident.ident_token, node)
+        elif isinstance(node, nodes.ClassObj):
+            self.scopes.bind(node.name, node)
+        elif isinstance(node, nodes.Import):
+            self.scopes.bind(node.name, node)
+        elif isinstance(node, nodes.ImportFrom):
+            for name, alias in node.names:
+                self.scopes.bind(alias or name, node)
+
+    def visit_function(self, fn_obj_node):
+        function, self.function = self.function, self.effects.setdefault(fn_obj_node, Effects())
+        with self.scopes.enter_new(fn_obj_node.name):
+            for formal in fn_obj_node.formals:
+                self.scopes.bind(formal.name, formal)
+            yield fn_obj_node.body
+        self.function = function
+
+    def visitRoot(self, root_node):
+        for node in iter_nodes(root_node):
+            if isinstance(node, nodes.Assign) and not isinstance(node.lhs, nodes.Index):
+                self.assigned.add(node.lhs.name)
+        # globals are looked up when they're called, functions can call the ones defined after them
+        for node in root_node.globals:
+            self.bind_global(node)
+        yield root_node.globals
+
+    def visitNodeList(self, node_list_node):
+        for node in node_list_node:
+            yield node
+
+    def visitAssignDecl(self, ad_node):
+        yield ad_node.rhs
+        self.scopes.bind(ad_node.lhs.name, ad_node)
+
+    def visitAssign(self, assign_node):
+        yield assign_node.rhs
+        lhs = assign_node.lhs
+        if isinstance(lhs, nodes.Index):
+            yield lhs.base
+            yield lhs.idx
+            array = self.scopes.lookup(lhs.base.ident_token) if isinstance(lhs.base, nodes.Var) and self.local(lhs.base.ident_token) else None
+            made_here = isinstance(array, nodes.AssignDecl) and isinstance(array.rhs, nodes.Array) and array.lhs.name not in self.assigned
+            if not made_here:
+                self.impure('sets elements of an array it did not make')
+        elif not self.local(lhs.name):
+            self.impure(f'assigns "{lhs.name}", which is not its own')
+
+    def visitSetStmt(self, set_node):
+        yield set_node.rhs
+        yield set_node.lhs.object
+        self.impure(f'sets the field "{set_node.lhs.name}"')
+
+    def visitVar(self, var_node):
+        name = var_node.ident_token
+        if not self.local(name) and not self.fixed(name):
+            self.impure(f'reads "{name}", which can change')
+
+    def visitScopedID(self, id_node):
+        yield id_node.object
+
+    def visitThisID(self, this_id_node):
+        pass  # the instance is an argument of the method
+
+    def visitSuperID(self, super_id_node):
+        pass
+
+    def visitCall(self, call_node):
+        ident = call_node.ident
+        if isinstance(ident, nodes.Var):
+            name = ident.ident_token
+            if self.scopes.lookup(name) is True:
+                if name not in PURE_BUILTINS:
+                    self.impure(f'calls "{name}"')
+            else:
+                callee = self.callee(name)
+                if callee is None:
+                    self.impure(f'calls "{name}", which is not known statically')
+                elif self.function is not None:
+                    self.function.callees.add(callee)
+        else:
+            yield ident
+            self.impure(f'calls "{ident.name}", which is not known statically' if isinstance(ident, nodes.ScopedID)
+                        else 'calls a function that is not known statically')
+        yield call_node.actuals
+
+    def visitFuncObj(self, fn_obj_node):
+        if fn_obj_node.decorator is not None:
+            yield fn_obj_node.decorator
+        if fn_obj_node.ident:
+            self.scopes.bind(fn_obj_node.ident.ident_token, fn_obj_node)
+        yield from self.visit_function(fn_obj_node)
+
+    def visitClassObj(self, cls_obj_node):
+        self.scopes.bind(cls_obj_node.name, cls_obj_node)
+        if cls_obj_node.inheritance:
+            yield cls_obj_node.inheritance
+        with self.scopes.enter_new(cls_obj_node.name):
+            self.scopes.bind('this', cls_obj_node)
+            for method in cls_obj_node.body:
+                if isinstance(method, nodes.MethodObj):
+                    yield from self.visit_function(method)
+
+    def visitImport(self, import_node):
+        self.scopes.bind(import_node.name, import_node)
+
+    def visitImportFrom(self, import_node):
+        for name, alias in import_node.names:
+            self.scopes.bind(alias or name, import_node)
+
+    def visitIf(self, if_node):
+        for branch in if_node.branch_seq:
+            yield branch.cond
+            yield branch.body
+
+    def visitWhile(self, while_node):
+        yield while_node.condition
+        yield while_node.body
+
+    def visitReturn(self, return_node):
+        yield return_node.expr
+
+    def visitBinOp(self, bin_op_node):
+        yield bin_op_node.lhs
+        yield bin_op_node.rhs
+
+    def visitUnaryOp(self, un_op_node):
+        yield un_op_node.operand
+
+    def visitLiteral(self, literal_node):
+        pass
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
+
+    def visitArray(self, array_node):
+        yield array_node.values
+
+    def visitIndex(self, index_node):
+        yield index_node.base
+        yield index_node.idx
+
+    def visitTryCatch(self, tc_node):
+        yield tc_node.try_.body
+        yield tc_node.catch.body
+
+    def visitThrow(self, throw_node):
+        pass
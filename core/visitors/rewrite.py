@@ -0,0 +1,273 @@
+"""
+Base for the optimization passes that rewrite statements inside function bodies.
+
+Every visit visits the node's children, puts what their visits return in their place and returns
+the node, so a pass only overrides the visits of the nodes it rewrites, and rewrite_block for
+blocks of statements. Scopes are tracked the way the resolver tracks them, and `function`
+describes the function being visited, it's None for top level code, which passes leave alone.
+Bodies still deferred when the program is built are rewritten once they're resolved, see
+run_deferred.
+
+Passes introduce variables of their own as "$<pass><n>", which can't clash with the program's.
+"""
+
+from core import nodes
+from core.nodes.node import iter_nodes
+from core.visitors.semantics import ScopeStack
+from core.visitors.visitor import Visitor
+
+
+class Function:
+    __slots__ = ('captured', 'tries')
+
+    def __init__(self, captured: set) -> None:
+        self.captured = captured  # names the functions nested in it assign to, any call might change them
+        self.tries = 0  # try blocks around the node being visited
+
+
+def assigned_in_nested(fn_obj_node):
+    names = set()
+    for node in iter_nodes(fn_obj_node.body):
+        if isinstance(node, nodes.FuncObj):
+            names.update(inner.lhs.name for inner in iter_nodes(node.body) if isinstance(inner, nodes.Assign) and not isinstance(inner.lhs, nodes.Index))
+    return names
+
+
+def child_slots(node):
+    """
+    Yields (parent, field) for the statements and expressions node evaluates, in the order it
+    evaluates them. Assignment targets aren't included, only what's evaluated to find them,
+    and neither are the bodies of functions and classes.
+    """
+    if isinstance(node, nodes.NodeList):
+        yield from ((node, i) for i in range(len(node.nodes)))
+    elif isinstance(node, nodes.BinOp):
+        yield from ((node, 'lhs'), (node, 'rhs'))
+    elif isinstance(node, nodes.UnaryOp):
+        yield node, 'operand'
+    elif isinstance(node, nodes.ScopedID):
+        yield node, 'object'
+    elif isinstance(node, nodes.Index):
+        yield from ((node, 'base'), (node, 'idx'))
+    elif isinstance(node, nodes.Call):
+        yield from ((node, 'ident'), (node, 'actuals'))
+    elif isinstance(node, nodes.Array):
+        yield node, 'values'
+    elif isinstance(node, (nodes.AssignDecl, nodes.Assign)):
+        yield node, 'rhs'
+        if isinstance(node.lhs, nodes.Index):
+            yield from ((node.lhs, 'base'), (node.lhs, 'idx'))
+    elif isinstance(node, nodes.SetStmt):
+        yield from ((node.lhs, 'object'), (node, 'rhs'))
+    elif isinstance(node, nodes.ReturnStmt):
+        yield node, 'expr'
+    elif isinstance(node, nodes.While):
+        yield from ((node, 'condition'), (node, 'body'))
+    elif isinstance(node, nodes.If):
+        for branch in node.branch_seq:
+            yield from ((branch, 'cond'), (branch, 'body'))
+    elif isinstance(node, nodes.TryCatch):
+        yield from ((node.try_, 'body'), (node.catch, 'body'))
+
+
+def get_child(parent, field):
+    return parent.nodes[field] if isinstance(field, int) else getattr(parent, field)
+
+
+def set_child(parent, field, child):
+    if isinstance(field, int):
+        children = list(parent.nodes)
+        children[field] = child
+        parent.nodes = type(parent.nodes)(children)
+        return
+    setattr(parent, field, child)
+    if isinstance(parent, nodes.ScopedID) and field == 'object':
+        parent.components = (child, parent.name)
+
+
+def statements(block):
+    """Returns the statements of a block, with the groups of statements in it spliced in."""
+    flat, stack = [], list(reversed(block.nodes))
+    while stack:
+        stmt = stack.pop()
+        if isinstance(stmt, nodes.NodeList):
+            stack += reversed(stmt.nodes)
+        else:
+            flat.append(stmt)
+    return flat
+
+
+class Rewriter(Visitor):
+    prefix = 'tmp'  # of the variables the pass introduces
+
+    def __init__(self, interpreter) -> None:
+        super().__init__()
+        self.interpreter = interpreter
+        self.scopes = ScopeStack()
+        self.function = None
+        self.num_temps = 0
+
+    def run_deferred(self, root_node, fn_obj_node):
+        """Rewrites the body of a function of root_node deferred when it was built, once it's resolved."""
+        self.drive(self.visit_function(fn_obj_node))
+        return self.stats
+
+    def declare_temp(self, meta, rhs):
+        """Returns the declaration of a new variable of the function being visited, initialized to rhs."""
+        name = f'${self.prefix}{self.num_temps}'
+        self.num_temps += 1
+        self.scopes.bind(name)
+        return nodes.AssignDecl(meta, nodes.ID(meta, name), rhs, None, None, None)
+
+    def read_temp(self, meta, name: str):
+        var_node = nodes.Var(meta, name)
+        self.interpreter.resolve(var_node, 0)  # declared in the function reading it
+        return var_node
+
+    def drop(self, node):
+        for dropped in iter_nodes(node):
+            self.interpreter.locals.pop(dropped, None)
+
+    def rewrite_block(self, block):
+        """Returns what takes the place of a block of statements once its statements are visited."""
+        return block
+
+    def block(self, block):
+        block = yield block
+        return self.rewrite_block(block) if self.function else block
+
+    def visit_function(self, fn_obj_node):
+        if fn_obj_node in self.interpreter.deferred:
+            return  # none of it is resolved yet
+        function = self.function
+        self.function = Function(assigned_in_nested(fn_obj_node))
+        with self.scopes.enter_new(fn_obj_node.name):
+            for formal in fn_obj_node.formals:
+                self.scopes.bind(formal.name)
+            fn_obj_node.body = yield from self.block(fn_obj_node.body)
+        self.function = function
+
+    def visitRoot(self, root_node):
+        root_node.globals = yield root_node.globals
+        return root_node
+
+    def visitNodeList(self, node_list_node):
+        rewritten = list(node_list_node.nodes)
+        for i, node in enumerate(rewritten):
+            rewritten[i] = yield node
+        node_list_node.nodes = type(node_list_node.nodes)(rewritten)
+        return node_list_node
+
+    def visitAssignDecl(self, ad_node):
+        ad_node.rhs = yield ad_node.rhs
+        self.scopes.bind(ad_node.lhs.name)
+        return ad_node
+
+    def visitAssign(self, assign_node):
+        assign_node.rhs = yield assign_node.rhs
+        if isinstance(assign_node.lhs, nodes.Index):
+            assign_node.lhs = yield assign_node.lhs
+        return assign_node
+
+    def visitSetStmt(self, set_node):
+        set_node.rhs = yield set_node.rhs
+        set_node.lhs = yield set_node.lhs
+        return set_node
+
+    def visitVar(self, var_node):
+        return var_node
+
+    def visitScopedID(self, id_node):
+        obj = yield id_node.object
+        if obj is not id_node.object:
+            set_child(id_node, 'object', obj)
+        return id_node
+
+    def visitThisID(self, this_id_node):
+        return this_id_node
+
+    def visitSuperID(self, super_id_node):
+        return super_id_node
+
+    def visitFuncObj(self, fn_obj_node):
+        if fn_obj_node.ident:
+            self.scopes.bind(fn_obj_node.ident.ident_token)
+        yield from self.visit_function(fn_obj_node)
+        return fn_obj_node
+
+    def visitClassObj(self, cls_obj_node):
+        self.scopes.bind(cls_obj_node.name)
+        for method in cls_obj_node.body:
+            if isinstance(method, nodes.MethodObj):
+                yield from self.visit_function(method)
+        return cls_obj_node
+
+    def visitImport(self, import_node):
+        self.scopes.bind(import_node.name)
+        return import_node
+
+    def visitImportFrom(self, import_node):
+        for name, alias in import_node.names:
+            self.scopes.bind(alias or name)
+        return import_node
+
+    def visitIf(self, if_node):
+        for branch in if_node.branch_seq:
+            branch.cond = yield branch.cond
+            branch.body = yield from self.block(branch.body)
+        return if_node
+
+    def visitWhile(self, while_node):
+        while_node.condition = yield while_node.condition
+        while_node.body = yield from self.block(while_node.body)
+        return while_node
+
+    def visitReturn(self, return_node):
+        return_node.expr = yield return_node.expr
+        return return_node
+
+    def visitBinOp(self, bin_op_node):
+        bin_op_node.lhs = yield bin_op_node.lhs
+        bin_op_node.rhs = yield bin_op_node.rhs
+        return bin_op_node
+
+    def visitUnaryOp(self, un_op_node):
+        un_op_node.operand = yield un_op_node.operand
+        return un_op_node
+
+    def visitCall(self, call_node):
+        call_node.ident = yield call_node.ident
+        call_node.actuals = yield call_node.actuals
+        return call_node
+
+    def visitLiteral(self, literal_node):
+        return literal_node
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
+
+    def visitArray(self, array_node):
+        array_node.values = yield array_node.values
+        return array_node
+
+    def visitIndex(self, index_node):
+        index_node.idx = yield index_node.idx
+        index_node.base = yield index_node.base
+        return index_node
+
+    def visitTryCatch(self, tc_node):
+        if self.function:
+            self.function.tries += 1
+        tc_node.try_.body = yield from self.block(tc_node.try_.body)
+        if self.function:
+            self.function.tries -= 1
+        tc_node.catch.body = yield from self.block(tc_node.catch.body)
+        return tc_node
+
+    def visitThrow(self, throw_node):
+        return throw_node
@@ -1,9 +1,19 @@
 """
+Resolves every variable reference to the number of scopes between it and its declaration, for
+the interpreter to look it up directly. Globals aren't resolved, they're looked up at runtime.
 
+Functions nested in functions are flat closures: they don't keep the scopes around them, only
+the variables they reference from them, in a scope of their own right outside of theirs. Those
+are listed in their captures, and references from inside them resolve through that scope.
+
+Resolution takes time linear in the size of the AST: ScopeStack indexes the scopes declaring
+each name as they're entered and left, so finding the innermost declaration doesn't depend on
+how deeply the reference is nested. Problems are collected as Diagnostics and raised together
+once the pass is done.
 """
 
-from icecream import ic
 from core import nodes
+from core.diagnostics import Diagnostic, ResolutionError, ERROR
 from core.visitors.visitor import Visitor
 
 # multiple inheritance, either disallow ambiguous calls or MRO from left to right of inheritance call
@@ -11,10 +21,11 @@ class ScopeStack:
     def __init__(self) -> None:
         self.scopes = [{}]
         self.names = ['globals']
+        self.index = {}  # name -> indices of the scopes declaring it, innermost last
 
         from core.runtime.builtins import BuiltinCallable
-        for builtin in BuiltinCallable.registered:
-            self.top[builtin.name] = True
+        for name in BuiltinCallable.registered:
+            self.bind(name)
         # add builtins to global here
 
     @property
@@ -27,9 +38,40 @@ class ScopeStack:
         return self
 
     def leave_scope(self):
-        self.scopes.pop()
+        for name in self.scopes.pop():
+            indices = self.index[name]
+            indices.pop()
+            if not indices:
+                del self.index[name]
         self.names.pop()
 
+    def bind(self, name: str, defined: bool = True):
+        """Declares name in the innermost scope, it's only usable once defined."""
+        scope = self.top
+        if name not in scope:
+            self.index.setdefault(name, []).append(len(self.scopes) - 1)
+        scope[name] = defined
+
+    def depth(self, name: str):
+        """Returns how many scopes out name is declared, None if it's a global or undeclared."""
+        indices = self.index.get(name)
+        if not indices or indices[-1] == 0:
+            return None
+        return len(self.scopes) - 1 - indices[-1]
+
+    def lookup(self, name: str):
+        """Returns what the innermost declaration of name is bound to, None if it isn't declared."""
+        indices = self.index.get(name)
+        return self.scopes[indices[-1]][name] if indices else None
+
+    @property
+    def function_name(self):
+        # innermost named scope, for diagnostics
+        for name in reversed(self.names[1:]):
+            if name:
+                return str(name)
+        return None
+
     def __enter__(self) -> None:
         return self
 
@@ -50,153 +92,216 @@ class ScopeStack:
 
 
 class SemanticAnalyzer(Visitor):
-    def __init__(self, interpreter) -> None:
+    def __init__(self, interpreter, lazy: bool = False) -> None:
         super().__init__()
         self.scopes = ScopeStack()
         self.interpreter = interpreter
+        self.diagnostics = []
+        self.closures = []  # (scope index, name -> depth it's captured from) of the closures being resolved, innermost last
+        # lazy analyzers leave the bodies of global functions and methods to the interpreter,
+        # which resolves each one on its first call, see resolve_deferred
+        self.lazy = lazy
 
     def resolve(self, node: nodes.ASTNode):
-        node.accept(self)
-
-    def declare(self, name):
-        assert isinstance(name, str)
-        assert name not in self.scopes.top, ic(name)
-        self.scopes.top[name] = False
-
-    def define(self, name: nodes.ASTNode):
-        assert isinstance(name, str)
-        self.scopes.top[name] = True
+        # visits yield the nodes they resolve next, see Visitor.walk
+        self.walk(node)
+        self.raise_errors()
+
+    def report(self, code: str, message: str, node, severity: str = ERROR):
+        self.diagnostics.append(Diagnostic(severity, code, message, node, self.scopes.function_name))
+
+    def raise_errors(self):
+        errors = [diagnostic for diagnostic in self.diagnostics if diagnostic.severity == ERROR]
+        if errors:
+            raise ResolutionError(errors)
+
+    def defer(self, fn_obj_node):
+        # the scopes a body sees are its class's at most, which are tiny and fixed by now
+        enclosing = [(dict(scope), name) for scope, name in zip(self.scopes.scopes[1:], self.scopes.names[1:])]
+        self.interpreter.defer(fn_obj_node, enclosing)
+
+    def resolve_deferred(self, fn_obj_node, enclosing):
+        """Resolves the body of a function deferred by a lazy analyzer as if it hadn't been."""
+        for scope, name in enclosing:
+            self.scopes.enter_new(name)
+            for bound, defined in scope.items():
+                self.scopes.bind(bound, defined)
+        for body in self.resolve_function(fn_obj_node):
+            self.walk(body)
+        self.raise_errors()
+
+    def declare(self, name: str, node = None):
+        if name in self.scopes.top:
+            self.report('redeclared', f'"{name}" is already declared in this scope', node)
+        self.scopes.bind(name, False)
+
+    def define(self, name: str):
+        self.scopes.bind(name)
 
     def resolve_local(self, node: nodes.ASTNode, node_name):
-        # ic(node, node_name)
-        for i, (scope, name) in enumerate(list(zip(self.scopes.scopes, self.scopes.names))[::-1][:-1]):
-            assert name != 'globals'  # hopefully no one names their function globals until this gets fixed
-            if node_name in scope:
-                self.interpreter.resolve(node, i)
+        indices = self.scopes.index.get(node_name)
+        if indices and indices[-1]:  # not a global
+            self.interpreter.resolve(node, self.capture(node_name, indices[-1], len(self.scopes) - 1))
+
+    def capture(self, name: str, declared: int, top: int) -> int:
+        """
+        Returns how many scopes out of top the variable declared in scope declared is at runtime.
+        Every closure in between captures it, the outermost from where it's declared and each of
+        the others from the closure around it.
+        """
+        closures = []  # innermost first, up to the first one that already captures it
+        for index, captures in reversed(self.closures):
+            if index <= declared:
                 break
-        else:
-            pass
+            closures.append((index, captures))
+            if name in captures:
+                break
+        source, through = declared, 0  # through is 1 once source is a closure, whose captures are a scope further out
+        for index, captures in reversed(closures):
+            if name not in captures:
+                captures[name] = index - 1 - source + through
+            source, through = index, 1
+        return top - source + through
 
     def resolve_function(self, node: nodes.ASTNode):
-        with self.scopes.enter_new(node.ident):
+        with self.scopes.enter_new(node.name):
+            # functions in functions are closures, methods see their class's scopes instead
+            closure = len(self.scopes) > 2 and not isinstance(node, nodes.MethodObj)
+            if closure:
+                captures = {}
+                self.closures.append((len(self.scopes) - 1, captures))
             for formal in node.formals:
-                self.declare(formal)
-                self.define(formal)
-            self.resolve(node.body)
+                self.declare(formal.name, formal)
+                self.define(formal.name)
+            yield node.body
+            if closure:
+                self.closures.pop()
+                node.captures = tuple(captures.items())
 
     def visitRoot(self, root_node):
-        assert self.scopes
-        self.resolve(root_node.globals)
+        yield root_node.globals
 
     def visitAssignDecl(self, ad_node):
         # I think this is equiv to varStmt from book
-        self.declare(ad_node.lhs)
-        self.resolve(ad_node.rhs)  # can skip if enable plain decl wo assign
-        self.define(ad_node.lhs)
+        self.declare(ad_node.lhs.name, ad_node)
+        yield ad_node.rhs  # can skip if enable plain decl wo assign
+        self.define(ad_node.lhs.name)
 
     def visitVar(self, id_node):
         # I think this is varExpr from book
-        if id_node.ident_token in self.scopes.top and not self.scopes.top[id_node.ident_token]:
-            raise ValueError('Variable can not reference itself in initializer.')
+        if self.scopes.top.get(id_node.ident_token) is False:
+            self.report('self-reference', f'"{id_node.ident_token}" can not reference itself in its initializer', id_node)
         self.resolve_local(id_node, id_node.ident_token)
 
-    def visitSuperID(self, super_node):
-        pass
-
     def visitScopedID(self, id_node):
-        self.resolve(id_node.object)
+        yield id_node.object
 
     def visitThisID(self, this_id_node):
         self.resolve_local(this_id_node.object, 'this')
 
     def visitSuperID(self, super_id):
         self.resolve_local(super_id.object, 'super')
+        self.resolve_local(super_id, 'this')  # what the superclass's method is bound to
 
     def visitSetStmt(self, set_node):
-        self.resolve(set_node.rhs)
-        self.resolve(set_node.lhs.object)
+        yield set_node.rhs
+        yield set_node.lhs.object
         # print(f'Set type for {set_node.lhs.object} in {self.scopes.top}')
 
 
     def visitAssign(self, assign_node):
         # should add type define to scopes?
-        self.resolve(assign_node.rhs)
-        self.resolve_local(assign_node.lhs, assign_node.lhs.name)
-        # self.resolve(assign_node.lhs)
+        yield assign_node.rhs
+        if isinstance(assign_node.lhs, nodes.Index):
+            yield assign_node.lhs
+        else:
+            self.resolve_local(assign_node.lhs, assign_node.lhs.name)
 
     def visitFuncObj(self, fn_obj_node):
+        if fn_obj_node.decorator is not None:  # evaluated where the function is defined, before it is
+            yield fn_obj_node.decorator
         if fn_obj_node.ident:
-            self.declare(fn_obj_node.ident.ident_token)
+            self.declare(fn_obj_node.ident.ident_token, fn_obj_node)
             self.define(fn_obj_node.ident.ident_token)
-        self.resolve_function(fn_obj_node)
+        if self.lazy and len(self.scopes) == 1:
+            self.defer(fn_obj_node)
+            return
+        yield from self.resolve_function(fn_obj_node)
 
     def visitClassObj(self, cls_obj_node: nodes.ClassObj):
-        self.declare(cls_obj_node)
-        self.define(cls_obj_node)
+        lazy = self.lazy and len(self.scopes) == 1
+        for decorated in (cls_obj_node, *cls_obj_node.body):
+            if getattr(decorated, 'decorator', None) is not None:
+                self.report('unsupported-decorator', f'only functions can be decorated, not "{decorated.name}"', decorated)
+        self.declare(cls_obj_node.name, cls_obj_node)
+        self.define(cls_obj_node.name)
         if cls_obj_node.inheritance:
-            self.resolve(cls_obj_node.inheritance)
+            yield cls_obj_node.inheritance
 
         if cls_obj_node.inheritance:
             self.scopes.enter_new('super')
-            self.scopes.top['super'] = True
-
+            self.scopes.bind('super')
 
-        for method in cls_obj_node.body:
-            if isinstance(method, nodes.MethodObj):
-                try:
-                    self.declare(method)  # might be bad
-                    self.define(method)
-                except AssertionError: pass
 
         with self.scopes.enter_new(cls_obj_node.name):
 
-            self.scopes.top['this'] = True
+            self.scopes.bind('this')
 
             for method in cls_obj_node.body:
                 if isinstance(method, nodes.MethodObj):
                     # self.declare(method)  # might be bad
                     # self.define(method)
                     # self.set_type(method, method.type)
-                    self.resolve_function(method)
+                    if lazy:
+                        self.defer(method)
+                    else:
+                        yield from self.resolve_function(method)
         
         if cls_obj_node.inheritance:
             self.scopes.leave_scope()
 
             
 
+    def visitImport(self, import_node):
+        self.declare(import_node.name, import_node)
+        self.define(import_node.name)
+
+    def visitImportFrom(self, import_node):
+        for name, alias in import_node.names:
+            self.declare(alias or name, import_node)
+            self.define(alias or name)
+
     def visitNodeList(self, node_list_node):
         for node in node_list_node:
-            self.resolve(node)
+            yield node
 
     def visitIf(self, if_node):
         for branch in if_node.branch_seq:
-            self.resolve(branch.cond)
-            self.resolve(branch.body)
+            yield branch.cond
+            yield branch.body
 
     def visitReturn(self, return_node):
-        self.resolve(return_node.expr)
+        yield return_node.expr
 
     def visitWhile(self, while_node):
-        self.resolve(while_node.condition)
-        self.resolve(while_node.body)
+        yield while_node.condition
+        yield while_node.body
 
     def visitBinOp(self, bin_op_node):
-        self.resolve(bin_op_node.lhs)
-        self.resolve(bin_op_node.rhs)
-        bin_op_node.lhs_cast, bin_op_node.rhs_cast, bin_op_node.res_cast = \
-            bin_op_node.type_resolutions[bin_op_node.op_str, bin_op_node.lhs.type, bin_op_node.rhs.type]
-        bin_op_node.type = bin_op_node.res_cast
+        yield bin_op_node.lhs
+        yield bin_op_node.rhs
+        # operand types are only known statically for literals and other ops, the rest get specialized at runtime
+        if (bin_op_node.op_str, bin_op_node.lhs.type, bin_op_node.rhs.type) in bin_op_node.type_resolutions:
+            bin_op_node.set_operand_types(bin_op_node.lhs.type, bin_op_node.rhs.type)
 
     def visitUnaryOp(self, un_op_node):
-        self.resolve(un_op_node.operand)
-        # need to implement theses
-        un_op_node.opd_cast, un_op_node.res_cast = \
-            un_op_node.type_resolutions[un_op_node.op_str, un_op_node.operand.type]
+        yield un_op_node.operand
+        if (un_op_node.op_str, un_op_node.operand.type) in un_op_node.type_resolutions:
+            un_op_node.set_operand_type(un_op_node.operand.type)
 
     def visitCall(self, call_node):
-        ic(call_node, call_node.ident, call_node.actuals)
-        self.resolve(call_node.ident)  # Var
-        self.resolve(call_node.actuals)
+        yield call_node.ident  # Var
+        yield call_node.actuals
 
     def visitLiteral(self, literal_node):
         raise NotImplementedError
@@ -223,24 +328,22 @@ class SemanticAnalyzer(Visitor):
         raise NotImplementedError
 
     def visitArray(self, array_node):
-        pass
+        yield array_node.values
 
     def visitIndex(self, index_node):
-        self.resolve(index_node.idx)
-        self.resolve(index_node.base)
-        index_node.type = self.get_type(index_node.name)
-        self.resolve_local(index_node.base, index_node.name)
-    
+        yield index_node.idx
+        yield index_node.base
+
     def visitTryCatch(self, tc_node):
-        self.resolve(tc_node.try_)
-        self.resolve(tc_node.catch)
+        yield tc_node.try_
+        yield tc_node.catch
 
     def visitTry(self, try_node):
-        self.resolve(try_node.body)
+        yield try_node.body
 
     def visitCatch(self, catch_node):
         # will need to resolve exception(s) in future
-        self.resolve(catch_node.body)
+        yield catch_node.body
 
     def visitThrow(self, throw_node):
         # will need to resolve exception in future
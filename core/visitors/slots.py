@@ -0,0 +1,170 @@
+"""
+Lays out the frames functions are called in: every variable a function declares, its formals
+first, gets a slot, an index into the list of values its frame keeps, so variables are looked
+up by indexing rather than by hashing their name in every scope. Globals aren't laid out, they
+stay in the globals' Environment, looked up by name.
+
+The resolutions of the Interpreter go from node -> depth to node -> (depth, slot), and the
+declarations in functions are resolved to their slot in their own frame, (0, slot). That's done
+once the optimization passes are done, which declare temporaries of their own and compare the
+depths they left with resolving again. Bodies resolved on their function's first call are laid
+out then, see allocate_deferred.
+
+The frames between a variable and its declaration are the scopes SemanticAnalyzer counted: the
+function's own, the one of the variables a closure captured, in the order it lists them, the one
+of a method's this and the one of a subclass's super.
+"""
+
+from core import nodes
+from core.visitors.visitor import Visitor
+
+
+class SlotAllocator(Visitor):
+    def __init__(self, locals, deferred = ()) -> None:
+        super().__init__()
+        self.locals = locals  # node -> depth, the resolutions, laid out in place
+        self.deferred = deferred  # functions whose bodies aren't resolved yet, they're laid out with them
+        self.frames = []  # name -> slot, of the frames around the node visited, innermost last
+
+    def allocate(self, node):
+        self.walk(node)
+
+    def allocate_deferred(self, fn_obj_node, enclosing):
+        """Lays out the body of a function once it's resolved, enclosing is what resolving it started from."""
+        if isinstance(fn_obj_node, nodes.MethodObj):
+            self.walk(fn_obj_node, [{name: slot for slot, name in enumerate(scope)} for scope, _ in enclosing])
+        else:  # global, there are no frames around it
+            self.walk(fn_obj_node)
+
+    def declare(self, node, name: str):
+        if self.frames:
+            frame = self.frames[-1]
+            self.locals[node] = (0, frame.setdefault(name, len(frame)))
+
+    def resolve(self, node, name: str):
+        depth = self.locals.get(node)
+        if depth is not None:
+            self.locals[node] = (depth, self.frames[-1 - depth][name])
+
+    def layout(self, fn_obj_node, frames):
+        outer = self.frames
+        frame = {formal.name: slot for slot, formal in enumerate(fn_obj_node.formals)}
+        self.frames = frames + [frame]
+        yield fn_obj_node.body
+        fn_obj_node.frame_size = len(frame)
+        self.frames = outer
+
+    def visitRoot(self, root_node):
+        yield root_node.globals
+
+    def visitNodeList(self, node_list_node):
+        for node in node_list_node:
+            yield node
+
+    def visitAssignDecl(self, ad_node):
+        self.declare(ad_node.lhs, ad_node.lhs.name)
+        yield ad_node.rhs
+
+    def visitVar(self, id_node):
+        self.resolve(id_node, id_node.ident_token)
+
+    def visitThisID(self, this_id_node):
+        self.resolve(this_id_node.object, 'this')
+
+    def visitSuperID(self, super_id):
+        self.resolve(super_id.object, 'super')
+        self.resolve(super_id, 'this')
+
+    def visitScopedID(self, id_node):
+        yield id_node.object
+
+    def visitSetStmt(self, set_node):
+        yield set_node.rhs
+        yield set_node.lhs.object
+
+    def visitAssign(self, assign_node):
+        yield assign_node.rhs
+        if isinstance(assign_node.lhs, nodes.Index):
+            yield assign_node.lhs
+        else:
+            self.resolve(assign_node.lhs, assign_node.lhs.name)
+
+    def visitFuncObj(self, fn_obj_node):
+        if fn_obj_node.decorator is not None:
+            yield fn_obj_node.decorator
+        if fn_obj_node.ident:
+            self.declare(fn_obj_node.ident, fn_obj_node.ident.ident_token)
+        if fn_obj_node in self.deferred:
+            return
+        frames = self.frames
+        if fn_obj_node.captures is not None:
+            # the closure's own frame holds what it captures, where from is laid out in the frames around it
+            fn_obj_node.captures = tuple((name, depth, self.frames[-1 - depth][name]) for name, depth in fn_obj_node.captures)
+            frames = [{name: slot for slot, (name, _, _) in enumerate(fn_obj_node.captures)}]
+        yield from self.layout(fn_obj_node, frames)
+
+    def visitMethodObj(self, method_node, frames):
+        yield from self.layout(method_node, frames)
+
+    def visitClassObj(self, cls_obj_node):
+        self.declare(cls_obj_node, cls_obj_node.name)
+        if cls_obj_node.inheritance:
+            yield cls_obj_node.inheritance
+        frames = self.frames + ([{'super': 0}] if cls_obj_node.inheritance else []) + [{'this': 0}]
+        for method in cls_obj_node.body:
+            if isinstance(method, nodes.MethodObj) and method not in self.deferred:
+                yield method, frames
+
+    def visitImport(self, import_node):
+        pass  # only globals import
+
+    def visitImportFrom(self, import_node):
+        pass
+
+    def visitIf(self, if_node):
+        for branch in if_node.branch_seq:
+            yield branch.cond
+            yield branch.body
+
+    def visitWhile(self, while_node):
+        yield while_node.condition
+        yield while_node.body
+
+    def visitReturn(self, return_node):
+        yield return_node.expr
+
+    def visitBinOp(self, bin_op_node):
+        yield bin_op_node.lhs
+        yield bin_op_node.rhs
+
+    def visitUnaryOp(self, un_op_node):
+        yield un_op_node.operand
+
+    def visitCall(self, call_node):
+        yield call_node.ident
+        yield call_node.actuals
+
+    def visitLiteral(self, literal_node):
+        pass
+
+    visitInt = visitFloat = visitStrLit = visitBoolLit = visitNone = visitLiteral
+
+    def visitArray(self, array_node):
+        yield array_node.values
+
+    def visitIndex(self, index_node):
+        yield index_node.idx
+        yield index_node.base
+
+    def visitTryCatch(self, tc_node):
+        yield tc_node.try_.body
+        yield tc_node.catch.body
+
+    def visitThrow(self, throw_node):
+        pass
+
+    def visitPrimitiveType(self, obj_type_node):
+        raise NotImplementedError
+
+    def visitFuncType(self, fn_sig_node):
+        raise NotImplementedError
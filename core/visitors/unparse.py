@@ -1,92 +1,311 @@
 """
+Turns an AST back into source code. Sugar the transformer removed stays removed, i.e. for loops
+come back as the let + while they desugar to, and unless/until as negated if/while.
 
+Visits write their code to the output in order and are generators driven by Visitor.walk,
+yielding (child, depth) where the child's code goes. Nothing is built by concatenating the code
+of children, so deeply nested programs neither hit the recursion limit nor get copied per level.
 """
 
-from core.nodes.stmts import AssignDecl, If
 from core.visitors.visitor import Visitor
 from core import nodes
-# TODO: change "node.accept(self..." to "self.unparse(node..."
+
+
+INDENT = '\t'
+
+# binding strength of operators, matching the grammar's precedence climbing
+PRECEDENCE = {
+    'or': 1, 'and': 2,
+    '==': 3, '!=': 3, '<': 3, '<=': 3, '>': 3, '>=': 3,
+    '+': 4, '-': 4,
+    '*': 5, '/': 5,
+}
+COMPARISON_PRECEDENCE = 3
+UNARY_PRECEDENCE = 6
+ATOM_PRECEDENCE = 7
+
+
+def precedence(node):
+    if isinstance(node, nodes.BinOp):
+        return PRECEDENCE[node.op_str]
+    elif isinstance(node, nodes.UnaryOp):
+        return UNARY_PRECEDENCE
+    return ATOM_PRECEDENCE
+
 
 class Unparser(Visitor):
     def __init__(self) -> None:
         super().__init__()
+        self.out = []
 
-    def unparse(self, node: nodes.ASTNode, depth: int):
-        return node.accept(self, depth)
+    def unparse(self, node: nodes.ASTNode, depth: int = 0):
+        self.out = []
+        self.walk(node, depth)
+        return ''.join(self.out)
 
-    def visitRoot(self, print_root, depth):
-        return '\n'.join(self.unparse(glbl, depth) for glbl in print_root.globals)
+    def emit(self, *code):
+        self.out.extend(code)
 
-    def visitPrint(self, print_node, depth):
-        return depth * '\t' + f'print({self.unparse(print_node.expr, depth)})'
+    def block(self, body, depth):
+        if not len(body):
+            self.emit('{}')
+            return
+        self.emit('{')
+        for stmt in body:
+            self.emit('\n', (depth + 1) * INDENT)
+            yield stmt, depth + 1
+        self.emit('\n', depth * INDENT, '}')
 
-    def visitID(self, id_node, depth):
-        return str(id_node.name)
+    def separated(self, nodes_, depth, separator = ', '):
+        for i, node in enumerate(nodes_):
+            if i:
+                self.emit(separator)
+            yield node, depth
+
+    def type_name(self, type_, depth):
+        # formals are typed by python type for primitives and by their type node otherwise
+        if isinstance(type_, nodes.ASTNode):
+            yield type_, depth
+        else:
+            self.emit(nodes.PrimitiveType.inv_data_types[type_])
+
+    def formals(self, formals, depth):
+        for i, formal in enumerate(formals):
+            if i:
+                self.emit(', ')
+            yield from self.type_name(formal.type, depth)
+            self.emit(' ', formal.name)
+
+    def tree(self, tree, depth):
+        # rules without nodes yet are kept as parse trees, i.e. generics
+        if tree.data == 'generics':
+            self.emit(f'template<{", ".join(str(name) for name in tree.children)}>')
+        elif tree.data == 'finally_':
+            self.emit('finally ')
+            yield from self.block(tree.children[0], depth)
+        else:
+            raise NotImplementedError(f'can not unparse "{tree.data}"')
 
-    def visitAssignDecl(self, ad_node: AssignDecl, depth):
-        return depth * '\t' + f'let {self.unparse(ad_node.lhs, depth)} = {self.unparse(ad_node.rhs, depth)}'
+    def prefix(self, obj_node, depth):
+        if obj_node.decorator is not None:
+            self.emit('@')
+            yield obj_node.decorator, depth
+            self.emit(' ')
+        if obj_node.generics:
+            yield from self.tree(obj_node.generics, depth)
+            self.emit(' ')
+
+    def visitRoot(self, root_node, depth):
+        # the last global is the call to main the transformer adds
+        yield from self.separated(root_node.globals[:-1], depth, '\n\n')
+        self.emit('\n')
+
+    def visitNodeList(self, node_list_node, depth):
+        # lists of statements, i.e. from "let a, b = 1, 2" or a desugared for loop
+        yield from self.separated(node_list_node, depth, '\n' + depth * INDENT)
+
+    # statements
+    def visitAssignDecl(self, ad_node, depth):
+        self.emit('let ')
+        for mod in (ad_node.mutability, ad_node.scope, ad_node.execution):
+            if mod:
+                self.emit(str(mod), ' ')
+        yield ad_node.lhs, depth
+        self.emit(' = ')
+        yield ad_node.rhs, depth
 
     def visitAssign(self, assign_node, depth):
-        return depth * '\t' + f'{assign_node.lhs.accept(self, depth)} = {assign_node.rhs.accept(self, depth)}'
+        yield assign_node.lhs, depth
+        self.emit(' = ')
+        yield assign_node.rhs, depth
 
-    def visitBinOp(self, bin_op_node, depth):
-        return f'({bin_op_node.lhs.accept(self, depth)} {bin_op_node.op_str} {bin_op_node.rhs.accept(self, depth)})'
+    def visitSetStmt(self, set_node, depth):
+        yield set_node.lhs, depth
+        self.emit(' = ')
+        yield set_node.rhs, depth
 
-    def visitCall(self, call_node, depth):
-        id_unparsed = call_node.name.accept(self, depth)
-        actuals_unparsed = ", ".join(formal.accept(self, depth) for formal in call_node.actuals)
-        return f'{id_unparsed}({actuals_unparsed})'
+    def visitIf(self, if_node, depth):
+        for i, branch in enumerate(if_node.branch_seq):
+            if branch.branch_type == 'else':
+                self.emit(' else ')
+            else:
+                self.emit(' else if ' if i else 'if ')
+                yield branch.cond, depth
+                self.emit(' ')
+            yield from self.block(branch.body, depth)
+
+    def visitWhile(self, while_node, depth):
+        self.emit('while ')
+        yield while_node.condition, depth
+        self.emit(' ')
+        yield from self.block(while_node.body, depth)
+        if while_node.else_block:
+            self.emit(' else ')
+            yield from self.block(while_node.else_block, depth)
 
     def visitReturn(self, return_node, depth):
-        return depth * '\t' + f'return {return_node.expr.accept(self, depth)}'
+        self.emit('return ')
+        yield return_node.expr, depth
 
-    def visitIf(self, if_node: If, depth):
-        res = ''
-        for branch in if_node.branch_seq:
-            res += depth * '\t' + branch.branch_type
-            res += ' ' + branch.cond.accept(self, depth)
-            res += ' {\n' + '\n'.join([stmt.accept(self, depth + 1) for stmt in branch.body])
-            res += '\n' + (depth * '\t') + '}\n'
+    def visitTryCatch(self, tc_node, depth):
+        yield tc_node.try_, depth
+        self.emit(' ')
+        yield tc_node.catch, depth
+        if tc_node.finally_:
+            self.emit(' ')
+            yield from self.tree(tc_node.finally_, depth)
 
-        return res
+    def visitTry(self, try_node, depth):
+        self.emit('try ')
+        yield from self.block(try_node.body, depth)
 
-    def visitWhile(self, while_node, depth):
-        indent_offset = depth * '\t'
+    def visitCatch(self, catch_node, depth):
+        self.emit('catch ')
+        if isinstance(catch_node.exception, type):
+            self.emit(catch_node.exception.__name__)
+        else:
+            yield catch_node.exception, depth
+        if catch_node.alias:
+            self.emit(' as ', str(catch_node.alias))
+        self.emit(' ')
+        yield from self.block(catch_node.body, depth)
+
+    def visitThrow(self, throw_node, depth):
+        self.emit('throw ')
+        yield throw_node.exception, depth
 
-        body_unparsed = ('\n' + indent_offset).join(stmt.accept(self, depth + 1) for stmt in while_node.body)
-        return indent_offset + f'while {while_node.condition.accept(self, depth)} {{\n{body_unparsed}\n{indent_offset}}}'
+    def visitImport(self, import_node, depth):
+        self.emit('import ', '.'.join(import_node.module))
+        if import_node.alias:
+            self.emit(' as ', import_node.alias)
 
+    def visitImportFrom(self, import_node, depth):
+        self.emit('from ', '.'.join(import_node.module), ' import ')
+        self.emit(', '.join(f'{name} as {alias}' if alias else name for name, alias in import_node.names))
+
+    # definitions
+    def visitFuncObj(self, fn_obj_node, depth):
+        if fn_obj_node.ident is None:
+            self.emit('(')
+            yield from self.formals(fn_obj_node.formals, depth)
+            self.emit(') -> ')
+            yield fn_obj_node.ret_type, depth
+        else:
+            if fn_obj_node.decorator is not None and not isinstance(fn_obj_node, nodes.MethodObj):
+                # on its own line, a fn return type right after it would read as a call
+                self.emit('@')
+                yield fn_obj_node.decorator, depth
+                self.emit('\n', depth * INDENT)
+            yield fn_obj_node.ret_type, depth
+            self.emit(' ', fn_obj_node.name, '(')
+            yield from self.formals(fn_obj_node.formals, depth)
+            self.emit(')')
+        self.emit(' ')
+        yield from self.block(fn_obj_node.body, depth)
+
+    def visitMethodObj(self, method_node, depth):
+        yield from self.prefix(method_node, depth)
+        for mod in (method_node.mutability_mod, method_node.scope_mod):
+            if mod:
+                self.emit(str(mod), ' ')
+        yield from self.visitFuncObj(method_node, depth)
+
+    def visitClassObj(self, cls_obj_node, depth):
+        yield from self.prefix(cls_obj_node, depth)
+        self.emit('class ', cls_obj_node.name)
+        if cls_obj_node.inheritance:
+            self.emit('(')
+            yield cls_obj_node.inheritance, depth
+            self.emit(')')
+        self.emit(' ')
+        yield from self.block(cls_obj_node.body, depth)
+
+    # types
     def visitPrimitiveType(self, obj_type_node, depth):
-        return obj_type_node.inv_data_types[obj_type_node.type]
+        self.emit(obj_type_node.primitive_token)
+
+    def visitFuncType(self, fn_type_node, depth):
+        self.emit('([')
+        for i, formal_type in enumerate(fn_type_node.formal_types):
+            if i:
+                self.emit(', ')
+            yield from self.type_name(formal_type, depth)
+        self.emit('] -> ')
+        yield fn_type_node.ret_type, depth
+        self.emit(')')
+
+    def visitClassType(self, cls_type_node, depth):
+        self.emit(cls_type_node.ret_type)
+
+    # expressions
+    def operand(self, node, min_precedence, depth):
+        parenthesize = precedence(node) < min_precedence
+        if parenthesize:
+            self.emit('(')
+        yield node, depth
+        if parenthesize:
+            self.emit(')')
+
+    def visitBinOp(self, bin_op_node, depth):
+        # operators are left associative and comparisons don't chain, so only the lhs may bind as loosely
+        op_precedence = PRECEDENCE[bin_op_node.op_str]
+        yield from self.operand(bin_op_node.lhs, op_precedence + (op_precedence == COMPARISON_PRECEDENCE), depth)
+        self.emit(' ', bin_op_node.op_str, ' ')
+        yield from self.operand(bin_op_node.rhs, op_precedence + 1, depth)
+
+    def visitUnaryOp(self, un_op_node, depth):
+        self.emit(un_op_node.op_str)
+        yield from self.operand(un_op_node.operand, UNARY_PRECEDENCE, depth)
 
-    def visitFnObj(self, fn_def_node, depth):
-        base_depth_str = depth * '\t'
-        ret_type_unparsed = base_depth_str + fn_def_node.type.ret_type.accept(self, depth)
-        formals_unparsed = ', '.join(nodes.PrimitiveType.inv_data_types[formal.type] + ' ' + formal.accept(self, depth) for formal in fn_def_node.formals)
-        body_unparsed = '\n'.join(stmt.accept(self, depth + 1) for stmt in fn_def_node.body)
+    def visitCall(self, call_node, depth):
+        yield call_node.ident, depth
+        self.emit('(')
+        yield from self.separated(call_node.actuals, depth)
+        self.emit(')')
+
+    def visitVar(self, var_node, depth):
+        self.emit(str(var_node.name))
+
+    def visitID(self, id_node, depth):
+        self.emit(str(id_node.name))
+
+    def visitScopedID(self, id_node, depth):
+        yield id_node.object, depth
+        self.emit('.', str(id_node.name))
 
-        return f'({formals_unparsed}) -> {ret_type_unparsed} {{\n{body_unparsed}\n{base_depth_str}}}'
+    def visitThisID(self, this_id_node, depth):
+        self.emit('this')
 
-    def visitFnType(self, fn_sig_node, depth):
-        return f'fn[{", ".join([f_type.accept(self, depth) for f_type in fn_sig_node.formal_types])} -> {fn_sig_node.ret_type.accept(self, depth)}]'
+    def visitSuperID(self, super_id_node, depth):
+        self.emit('super')
 
+    def visitArray(self, array_node, depth):
+        self.emit('[')
+        yield from self.separated(array_node.values, depth)
+        self.emit(']')
+
+    def visitIndex(self, index_node, depth):
+        yield index_node.base, depth
+        self.emit('[')
+        yield index_node.idx, depth
+        self.emit(']')
+
+    # literals
     def visitLiteral(self, literal_node, depth):
         raise NotImplementedError
 
-    def visitNumLit(self, num_lit_node, depth):
-        return str(num_lit_node.value)
+    def visitFloat(self, float_node, depth):
+        self.emit(repr(float_node.value))
+
+    def visitInt(self, int_node, depth):
+        self.emit(repr(int_node.value))
 
     def visitStrLit(self, str_lit_node, depth):
-        return '"' + str_lit_node.value + '"'
+        quote = "'" if '"' in str_lit_node.value else '"'
+        self.emit(quote, str_lit_node.value, quote)
 
     def visitBoolLit(self, bool_lit_node, depth):
-        return str(bool_lit_node.value)
+        self.emit('true' if bool_lit_node.value else 'false')
 
     def visitNone(self, none_node, depth):
-        return str(none_node.value)
-
-    def visitNodeList(self, node_list_node, depth):
-        res = ''
-        for node in node_list_node:
-            res += self.unparse(node, depth)
-        return res
\ No newline at end of file
+        self.emit('none')
@@ -3,12 +3,45 @@
 """
 
 from abc import ABCMeta, abstractmethod
+from types import GeneratorType
 
 
 class Visitor(metaclass = ABCMeta):
     def __init__(self) -> None:
         pass
 
+    def walk(self, node, *args):
+        """
+        Visits node without recursing on the C stack, so nesting depth isn't bounded by the
+        recursion limit. Visits written as generators yield the child to visit next, or a
+        (child, *args) tuple, and are sent back the child's result; their return value is the
+        result of the visit. Plain visits work as usual.
+        """
+        return self.drive(node.accept(self, *args))
+
+    def drive(self, visit):
+        """Runs a visit that's already started to completion the way walk does, i.e. a generator helper of the visits."""
+        if not isinstance(visit, GeneratorType):
+            return visit
+
+        stack = [visit]
+        value = None
+        while stack:
+            try:
+                request = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                continue
+            child, *child_args = request if isinstance(request, tuple) else (request,)
+            result = child.accept(self, *child_args)
+            if isinstance(result, GeneratorType):
+                stack.append(result)
+                value = None
+            else:
+                value = result
+        return value
+
     @abstractmethod
     def visitRoot(self, root_node, *args, **kwargs):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
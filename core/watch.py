@@ -0,0 +1,225 @@
+"""
+Incremental reparsing for --watch.
+
+The source is split into chunks of top level definitions, each ending on the first line break
+at depth 0 after a closing brace. Chunks whose text didn't change keep their AST and their
+resolutions, only new or edited chunks are parsed, transformed and resolved, and the root is
+rebuilt from the chunks in order.
+
+This works bc only names declared inside a definition are resolved and given slots, globals are
+looked up at runtime, so a definition's resolutions only depend on which global names exist.
+"""
+
+import re
+import sys
+import os
+import time
+from collections import Counter
+
+from core import nodes
+from core.nodes.node import Position
+from core.parser import STRING_OR_COMMENT, build_ast, parse
+from core.program import Program, DEFAULT_ENGINE
+from core.transformer import ASTBuilder
+from core.visitors.semantics import SemanticAnalyzer
+from core.visitors.slots import SlotAllocator
+
+
+CHUNK_RE = re.compile(STRING_OR_COMMENT + r'|[{}\n]')
+
+
+def split_definitions(src: str):
+    """
+    Splits src into chunks of whole top level definitions. Returns them with whatever is left
+    after the last one, joined they give back src.
+    """
+    chunks = []
+    start, depth, closed = 0, 0, False
+    for match in CHUNK_RE.finditer(src):
+        token = match.group()
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            closed = closed or depth == 0
+        elif token == '\n' and depth == 0 and closed:
+            chunks.append(src[start:match.end()])
+            start, closed = match.end(), False
+    return chunks, src[start:]
+
+
+def declared_names(global_node):
+    if isinstance(global_node, nodes.NodeList):  # let with several identifiers
+        return [name for node in global_node for name in declared_names(node)]
+    elif isinstance(global_node, nodes.AssignDecl):
+        return [global_node.lhs.name]
+    elif isinstance(global_node, nodes.ImportFrom):
+        return [alias or name for name, alias in global_node.names]
+    return [global_node.name]
+
+
+class Resolutions(dict):
+    """Stands in for the interpreter while resolving a chunk, so its resolutions can be dropped with it."""
+
+    def resolve(self, expr, depth):
+        self[expr] = depth
+
+
+class Chunk:
+    __slots__ = ('text', 'complete', 'line', 'num_lines', 'globals', 'metas', 'names', 'resolutions')
+
+    def __init__(self, text: str, complete: bool, line: int, parser) -> None:
+        self.text = text
+        self.complete = complete  # false for trailing text that didn't end a definition
+        self.line = line
+        self.num_lines = text.count('\n')
+        parse_tree = parse(parser, text)
+        self.metas = [subtree.meta for subtree in parse_tree.iter_subtrees() if not subtree.meta.empty]
+        self.shift(line - 1)
+        builder = ASTBuilder()
+        self.globals = [builder.transform(global_tree) for global_tree in parse_tree.children]
+        self.names = [name for global_node in self.globals for name in declared_names(global_node)]
+        self.resolutions = None
+
+    def move_to(self, line: int) -> None:
+        self.shift(line - self.line)
+        self.line = line
+
+    def shift(self, num_lines: int) -> None:
+        if num_lines:
+            for meta in self.metas:
+                meta.line += num_lines
+                meta.end_line += num_lines
+
+    def resolve(self, global_names) -> None:
+        resolutions = Resolutions()
+        analyzer = SemanticAnalyzer(resolutions)
+        for name in global_names:
+            analyzer.scopes.bind(name)
+        for global_node in self.globals:
+            analyzer.resolve(global_node)
+            SlotAllocator(resolutions).allocate(global_node)
+        self.resolutions = resolutions
+
+
+class WatchSession:
+    def __init__(self, parser) -> None:
+        self.parser = parser
+        self.chunks = []
+        self.resolutions = {}
+        self.num_reparsed = 0
+
+    def update(self, src: str) -> Program:
+        """Returns the program for src, reusing every definition that didn't change since the last update."""
+        old_chunks = self.chunks
+
+        # chunks at the start and end of the file that are still there are kept without rescanning them
+        pos, num_prefix = 0, 0
+        while num_prefix < len(old_chunks):
+            chunk = old_chunks[num_prefix]
+            if not src.startswith(chunk.text, pos) or not (chunk.complete or pos + len(chunk.text) == len(src)):
+                break
+            pos += len(chunk.text)
+            num_prefix += 1
+        end, num_suffix = len(src), 0
+        while num_prefix + num_suffix < len(old_chunks):
+            chunk = old_chunks[-1 - num_suffix]
+            if end - len(chunk.text) < pos or not src.startswith(chunk.text, end - len(chunk.text)):
+                break
+            end -= len(chunk.text)
+            num_suffix += 1
+
+        texts, tail = split_definitions(src[pos:end])
+        if tail and num_suffix:  # the edit left a definition open, rescan up to the end
+            end, num_suffix = len(src), 0
+            texts, tail = split_definitions(src[pos:])
+        suffix = old_chunks[len(old_chunks) - num_suffix:]
+
+        # the edited region may still contain known definitions, i.e. when they're reordered
+        unchanged = {}
+        for chunk in old_chunks[num_prefix:len(old_chunks) - num_suffix]:
+            unchanged.setdefault((chunk.text, chunk.complete), []).append(chunk)
+
+        chunks, new_chunks = old_chunks[:num_prefix], []
+        line = chunks[-1].line + chunks[-1].num_lines if chunks else 1
+        for text, complete in [(text, True) for text in texts] + ([(tail, False)] if tail else []):
+            if unchanged.get((text, complete)):
+                chunk = unchanged[text, complete].pop(0)
+                chunk.move_to(line)
+            else:
+                try:
+                    chunk = Chunk(text, complete, line, self.parser)
+                except Exception:
+                    return self.reparse(src)  # the chunk might only parse in context
+                new_chunks.append(chunk)
+            chunks.append(chunk)
+            line += chunk.num_lines
+        for chunk in suffix:
+            chunk.move_to(line)
+            chunks.append(chunk)
+            line += chunk.num_lines
+
+        if new_chunks:
+            num_declarations = Counter(name for chunk in chunks for name in chunk.names)
+            for chunk in new_chunks:
+                own = Counter(chunk.names)
+                chunk.resolve(name for name, count in num_declarations.items() if count > own[name])
+
+        # nothing changes until every new chunk resolved, so a bad edit keeps the last good state
+        for chunks_left in unchanged.values():
+            for chunk in chunks_left:
+                for expr in chunk.resolutions:
+                    del self.resolutions[expr]
+        for chunk in new_chunks:
+            self.resolutions.update(chunk.resolutions)
+        self.chunks = chunks
+        self.num_reparsed = len(new_chunks)
+
+        root_meta = Position(1, 1, line, 1)
+        return Program(ASTBuilder.make_root(root_meta, [node for chunk in chunks for node in chunk.globals]), self.resolutions)
+
+    def reparse(self, src: str) -> Program:
+        # falls back to a full parse, the next update starts over from scratch
+        program = build_ast(parse(self.parser, src))
+        self.chunks, self.resolutions = [], {}
+        self.num_reparsed = None
+        return program
+
+
+def watch(src_f: str, parser, interval: float = 0.2, unparse: bool = False, loader = None, engine: str = DEFAULT_ENGINE) -> None:
+    """Reruns src_f whenever it's saved, until interrupted."""
+    session = WatchSession(parser)
+    last_mtime = None
+    try:
+        while True:
+            try:
+                mtime = os.stat(src_f).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is None or mtime == last_mtime:
+                time.sleep(interval)
+                continue
+            last_mtime = mtime
+
+            with open(src_f, 'r') as f:
+                src = f.read()
+            start = time.perf_counter()
+            try:
+                program = session.update(src)
+                if loader:  # only modules that changed since the last run miss its cache
+                    program.link(loader.load(program, src_f))
+            except Exception as err:
+                print(f'[watch] {type(err).__name__}: {err}', file = sys.stderr, flush = True)
+                continue
+            reparsed = 'all' if session.num_reparsed is None else f'{session.num_reparsed}/{len(session.chunks)}'
+            print(f'[watch] reparsed {reparsed} definitions in {1000 * (time.perf_counter() - start):.1f} ms', file = sys.stderr, flush = True)
+
+            if unparse:
+                print(program.unparsed())
+            try:
+                exit_code = program.interpret(engine)
+            except (Exception, SystemExit) as err:
+                exit_code = f'{type(err).__name__}: {err}'
+            print(f'[watch] exited with {exit_code}', file = sys.stderr, flush = True)
+    except KeyboardInterrupt:
+        pass
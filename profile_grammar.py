@@ -0,0 +1,180 @@
+"""
+Profiles the grammar under the Earley parser over a corpus of programs.
+
+Reports
+- ambiguities: where a program has more than one derivation, grouped by the rules the
+  alternatives were derived with, with the first place each one was seen
+- cost per rule: the Earley items each rule created, i.e. the derivations the parser explored
+  for it, and the parse time attributed to it, each step's time being split between rules by
+  their share of that step's items
+- operator conflicts: LALR(1) conflicts on terminals that are also binary operators or open
+  blocks, i.e. templating with "<...>" or dict literals in expressions, which read the same as
+  comparisons or as the block after a condition
+
+Pass --grammar to profile a draft grammar before it replaces grammar/grammar.lark.
+
+usage: python profile_grammar.py [paths ...] [--grammar GRAMMAR] [--top 15]
+"""
+
+import os.path as osp, os
+import argparse
+import time
+from collections import Counter
+
+import lark
+from lark.common import ParserConf
+from lark.parsers.lalr_analysis import LALR_Analyzer
+
+from core.parser import GRAMMAR_F_PATH, PARSER_OPTIONS, Source
+
+
+ROOT_PATH = osp.dirname(osp.realpath(__file__))
+TEST_PATH = osp.join(ROOT_PATH, 'tests')
+LANG_EXT = '.lang'
+BLOCK_TERMINALS = ('LBRACE',)
+
+
+def get_cmd_line_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='*', default=[TEST_PATH], help='.lang files or directories of them, tests/ by default')
+    parser.add_argument('--grammar', default=GRAMMAR_F_PATH, help='grammar to profile')
+    parser.add_argument('--top', type=int, default=15, help='rules to list by cost')
+    return parser.parse_args()
+
+
+def find_sources(paths):
+    for path in paths:
+        if osp.isdir(path):
+            for f_name in sorted(os.listdir(path)):
+                if f_name.endswith(LANG_EXT):
+                    yield osp.join(path, f_name)
+        else:
+            yield path
+
+
+def rule_name(rule):
+    origin = rule.origin.name
+    return f'{origin} -> {rule.alias}' if rule.alias else origin
+
+
+class EarleyProfile:
+    """Counts the items every rule creates and splits the time of each parse step between them."""
+
+    def __init__(self, grammar_f_path: str) -> None:
+        self.parser = lark.Lark.open(grammar_f_path, parser = 'earley', ambiguity = 'explicit', **PARSER_OPTIONS)
+        self.items = Counter()
+        self.seconds = Counter()
+        self.ambiguities = Counter()
+        self.examples = {}
+        self.num_steps = 0
+
+        earley = self.parser.parser.parser
+        predict_and_complete = earley.predict_and_complete
+        self._last = None
+
+        def profiled(i, to_scan, columns, *args):
+            predict_and_complete(i, to_scan, columns, *args)
+            now = time.perf_counter()
+            # the step since the last call covers scanning into this column and completing it
+            step_items = Counter(rule_name(item.rule) for item in columns[i])
+            step_items.update(rule_name(item.rule) for item in to_scan)
+            total = sum(step_items.values())
+            for name, count in step_items.items():
+                self.seconds[name] += (now - self._last) * count / total
+            self.items.update(step_items)
+            self.num_steps += 1
+            self._last = time.perf_counter()
+
+        earley.predict_and_complete = profiled
+
+    def parse(self, src_f: str, raw_src: str):
+        self._last = time.perf_counter()
+        parse_tree = self.parser.parse(Source(raw_src).text)
+        for subtree in parse_tree.iter_subtrees():
+            if subtree.data != '_ambig':
+                continue
+            key = ' | '.join(sorted({str(alt.data) if isinstance(alt, lark.Tree) else repr(alt) for alt in subtree.children}))
+            self.ambiguities[key] += len(subtree.children) - 1
+            # _ambig nodes don't get positions, their alternatives do
+            lines = [alt.meta.line for alt in subtree.children if isinstance(alt, lark.Tree) and not alt.meta.empty]
+            self.examples.setdefault(key, f'{src_f}:{lines[0]}' if lines else src_f)
+
+
+def operator_conflicts(parser):
+    """
+    Returns LALR(1) conflicts as (terminal, reducible rules, items that shift), only keeping the
+    ones on a binary operator or on a terminal that opens blocks.
+    """
+    contested = {sym.name for rule in parser.rules if rule.alias == 'bin_op' for sym in rule.expansion if sym.is_term}
+    contested.update(BLOCK_TERMINALS)
+
+    analyzer = LALR_Analyzer(ParserConf(parser.rules, None, [PARSER_OPTIONS['start']]))
+    analyzer.compute_lr0_states()
+    analyzer.compute_reads_relations()
+    analyzer.compute_includes_lookback()
+    analyzer.compute_lookaheads()
+
+    conflicts = []
+    for itemset in analyzer.lr0_itemsets:
+        for la, rules in itemset.lookaheads.items():
+            shifts = la in itemset.transitions
+            if la.name in contested and (len(rules) > 1 or shifts):
+                shifting = sorted(repr(rp) for rp in itemset.closure if not rp.is_satisfied and rp.next == la)
+                conflicts.append((la.name, sorted(rule_name(rule) for rule in rules), shifting))
+    return conflicts
+
+
+def main():
+    args = get_cmd_line_args()
+    profile = EarleyProfile(args.grammar)
+    patterns = {term.name: term.pattern.value for term in profile.parser.terminals}
+
+    num_srcs, failed, parse_seconds = 0, [], 0
+    for src_f in find_sources(args.paths):
+        with open(src_f, 'r') as f:
+            raw_src = f.read()
+        start = time.perf_counter()
+        try:
+            profile.parse(src_f, raw_src)
+        except lark.exceptions.LarkError as err:
+            failed.append(f'{src_f}: {type(err).__name__}')
+            continue
+        parse_seconds += time.perf_counter() - start
+        num_srcs += 1
+
+    print(f'EARLEY PROFILE ({num_srcs} programs, {1000 * parse_seconds:.1f} ms, {profile.num_steps} steps)')
+    print('=====================================================')
+    for failure in failed:
+        print(f'could not parse {failure}')
+
+    print('\nAMBIGUITIES')
+    print('-----------')
+    if not profile.ambiguities:
+        print('none')
+    for key, count in profile.ambiguities.most_common():
+        print(f'{count:>6}x  {key}  (first in {profile.examples[key]})')
+
+    print('\nCOST PER RULE')
+    print('-------------')
+    total_items = sum(profile.items.values()) or 1
+    print(f'{"rule":<32}{"items":>10}{"share":>8}{"ms":>10}')
+    for name, seconds in profile.seconds.most_common(args.top):
+        items = profile.items[name]
+        print(f'{name:<32}{items:>10}{100 * items / total_items:>7.1f}%{1000 * seconds:>10.1f}')
+
+    print('\nOPERATOR CONFLICTS')
+    print('------------------')
+    conflicts = operator_conflicts(profile.parser)
+    if not conflicts:
+        print('none')
+    for terminal, reductions, shifting in conflicts:
+        kind = 'reduce/reduce' if len(reductions) > 1 else 'shift/reduce'
+        print(f'{kind} on "{patterns.get(terminal, terminal)}"')
+        for name in reductions:
+            print(f'    reduce {name}')
+        for item in shifting:
+            print(f'    shift  {item}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 """
 
 import os.path as osp, os
+import sys
 from tqdm.contrib.concurrent import thread_map
 
 from icecream import ic
@@ -13,6 +14,8 @@ ROOT_PATH = osp.dirname(osp.realpath(__file__))
 TEST_PATH = osp.join(ROOT_PATH, 'tests')
 
 def main():
+    # anything on the command line is passed on to every run, i.e. --engine=vm
+    flags = ' '.join(sys.argv[1:])
     files = os.listdir(TEST_PATH)
     tests = list(filter(lambda f: f.endswith('.lang'), files))
 
@@ -24,7 +27,7 @@ def main():
     def run_test(test):
         true_file = test.replace('.lang', '.out')  #  > tests/{test.replace(".lang", ".out")}
         if true_file in files:
-            res = run_in_shell(f'python . tests/{test}').strip()
+            res = run_in_shell(f'python . tests/{test} {flags}').strip()
             with open(f'tests/{true_file}', 'r') as f:
                 truth = f.read().strip()
             